@@ -0,0 +1,222 @@
+import threading
+import time
+
+import numpy as np
+
+from database import get_db
+
+DIMENSIONS = {
+    "faculty": "Fakulta",
+    "mobility_type": "Typ mobility",
+    "status": "Stav",
+    "month": "Mesiac",
+    "university": "Univerzita",
+}
+MISSING_VALUE = "Nezadané"
+DEFAULT_REFRESH_SECONDS = 30
+DEFAULT_FULL_RELOAD_SECONDS = 600
+
+
+class Dictionary:
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        if value is None or value == "":
+            value = MISSING_VALUE
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values):
+        return [self.codes[value] for value in values if value in self.codes]
+
+
+class AnalyticsCube:
+
+    def __init__(self, document_keys, refresh_seconds=DEFAULT_REFRESH_SECONDS,
+                 full_reload_seconds=DEFAULT_FULL_RELOAD_SECONDS):
+        self.document_keys = list(document_keys)
+        self.key_index = {key: i for i, key in enumerate(self.document_keys)}
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.dictionaries = {dim: Dictionary() for dim in DIMENSIONS}
+        self.columns = {dim: np.empty(0, dtype=np.int32) for dim in DIMENSIONS}
+        self.documents = np.zeros((0, len(self.document_keys)), dtype=bool)
+        self.row_by_id = {}
+        self.last_app_rowid = 0
+        self.last_doc_id = 0
+        self.last_decision_ts = 0
+        self.last_event_seq = 0
+        self.refreshed_at = 0
+        self.reloaded_at = 0
+
+    def _needs_reload(self, cursor):
+        # Deleted documents and changed faculties leave the watermarks alone;
+        # the change feed tells when the cube has to be rebuilt.
+        if not self.last_event_seq:
+            cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_events")
+            self.last_event_seq = cursor.fetchone()[0]
+            return False
+        cursor.execute("""
+            SELECT COALESCE(MAX(seq), ?) AS seq,
+                   COALESCE(MAX((entity = 'document' AND action = 'delete')
+                                OR (entity = 'user' AND action = 'update'
+                                    AND json_type(data, '$.faculty') IS NOT NULL)), 0) AS stale
+            FROM change_events WHERE seq > ?
+        """, (self.last_event_seq, self.last_event_seq))
+        row = cursor.fetchone()
+        self.last_event_seq = row["seq"]
+        return bool(row["stale"])
+
+    def _load_applications(self, cursor):
+        cursor.execute("""
+            SELECT a.rowid AS rid, a.id, un.name AS university, mt.name AS mobility_type, a.status,
+                   strftime('%Y-%m', a.created_ts, 'unixepoch', 'localtime') AS month,
+                   u.faculty,
+                   MAX(COALESCE(a.approved_ts, 0), COALESCE(a.rejected_ts, 0)) AS decided_ts
+            FROM applications a
+            LEFT JOIN universities un ON un.id = a.university_id
+            LEFT JOIN mobility_types mt ON mt.id = a.mobility_type_id
+            LEFT JOIN users u ON u.email = a.student_email
+            WHERE a.rowid > ? OR a.approved_ts >= ? OR a.rejected_ts >= ?
+        """, (self.last_app_rowid, self.last_decision_ts, self.last_decision_ts))
+        rows = cursor.fetchall()
+
+        new_codes = {dim: [] for dim in DIMENSIONS}
+        for row in rows:
+            codes = {dim: self.dictionaries[dim].encode(row[dim]) for dim in DIMENSIONS}
+            index = self.row_by_id.get(row["id"])
+            if index is None:
+                self.row_by_id[row["id"]] = len(self.row_by_id)
+                for dim in DIMENSIONS:
+                    new_codes[dim].append(codes[dim])
+            else:
+                for dim in DIMENSIONS:
+                    self.columns[dim][index] = codes[dim]
+            self.last_app_rowid = max(self.last_app_rowid, row["rid"])
+            self.last_decision_ts = max(self.last_decision_ts, row["decided_ts"])
+
+        added = len(new_codes["status"])
+        if added:
+            for dim in DIMENSIONS:
+                self.columns[dim] = np.concatenate([self.columns[dim], np.asarray(new_codes[dim], dtype=np.int32)])
+            self.documents = np.vstack([self.documents, np.zeros((added, len(self.document_keys)), dtype=bool)])
+
+    def _load_documents(self, cursor):
+        cursor.execute("""
+            SELECT d.id, d.application_id, t.key AS document_key, a.rowid AS app_rid
+            FROM documents d
+            JOIN document_types t ON t.id = d.document_type_id
+            LEFT JOIN applications a ON a.id = d.application_id
+            WHERE d.id > ?
+            ORDER BY d.id
+        """, (self.last_doc_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        app_rows = []
+        key_cols = []
+        for row in rows:
+            index = self.row_by_id.get(row["application_id"])
+            if index is None and row["app_rid"] is not None and row["app_rid"] > self.last_app_rowid:
+                # Committed after the applications were read; pick it up next time.
+                break
+            column = self.key_index.get(row["document_key"])
+            # A document of an application that is gone is skipped for good,
+            # otherwise it would hold back every later document.
+            if index is not None and column is not None:
+                app_rows.append(index)
+                key_cols.append(column)
+            self.last_doc_id = row["id"]
+        self.documents[app_rows, key_cols] = True
+
+    def refresh(self, full=False):
+        with self.lock:
+            now = time.time()
+            if not full and now - self.refreshed_at < self.refresh_seconds:
+                return
+            if full or now - self.reloaded_at >= self.full_reload_seconds:
+                self._reset()
+                self.reloaded_at = now
+
+            conn = get_db()
+            try:
+                cursor = conn.cursor()
+                if self._needs_reload(cursor):
+                    self._reset()
+                    self.reloaded_at = now
+                    self._needs_reload(cursor)
+                self._load_applications(cursor)
+                self._load_documents(cursor)
+                cursor.execute("SELECT COUNT(*) FROM applications")
+                live_count = cursor.fetchone()[0]
+            finally:
+                conn.close()
+            self.refreshed_at = now
+            stale = live_count != len(self.row_by_id)
+
+        # Deleted applications cannot be detected from watermarks alone.
+        if stale and not full:
+            self.refresh(full=True)
+
+    def values(self, dim):
+        return sorted(self.dictionaries[dim].values)
+
+    def query(self, group_by=(), filters=None):
+        group_by = [dim for dim in group_by if dim in DIMENSIONS]
+        with self.lock:
+            size = len(self.row_by_id)
+            mask = np.ones(size, dtype=bool)
+            for dim, allowed in (filters or {}).items():
+                if dim in DIMENSIONS and allowed:
+                    mask &= np.isin(self.columns[dim], self.dictionaries[dim].lookup(allowed))
+
+            key = np.zeros(size, dtype=np.int64)
+            for dim in group_by:
+                key = key * len(self.dictionaries[dim].values) + self.columns[dim]
+            uniq, inverse, counts = np.unique(key[mask], return_inverse=True, return_counts=True)
+            present = self.documents[mask]
+            per_key = [np.bincount(inverse, weights=present[:, i], minlength=len(uniq))
+                       for i in range(len(self.document_keys))]
+            documents = np.bincount(inverse, weights=present.sum(axis=1), minlength=len(uniq))
+            labels = {dim: list(self.dictionaries[dim].values) for dim in group_by}
+
+        required = len(self.document_keys) or 1
+        results = []
+        for i, combined in enumerate(uniq):
+            row = {}
+            remainder = int(combined)
+            for dim in reversed(group_by):
+                row[dim] = labels[dim][remainder % len(labels[dim])]
+                remainder //= len(labels[dim])
+            row["applications"] = int(counts[i])
+            row["documents"] = int(documents[i])
+            row["completion"] = float(documents[i]) / (counts[i] * required)
+            row["document_rates"] = {
+                key: float(per_key[j][i]) / counts[i] for j, key in enumerate(self.document_keys)
+            }
+            results.append(row)
+        results.sort(key=lambda row: [row[dim] for dim in group_by])
+        return results
+
+
+_cube = None
+_cube_lock = threading.Lock()
+
+
+def get_cube(document_keys, refresh_seconds=DEFAULT_REFRESH_SECONDS):
+    global _cube
+    with _cube_lock:
+        if _cube is None:
+            _cube = AnalyticsCube(document_keys, refresh_seconds=refresh_seconds)
+    _cube.refresh()
+    return _cube
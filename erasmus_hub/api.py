@@ -0,0 +1,262 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import time
+from functools import wraps
+
+from flask import Blueprint, current_app, jsonify, request, session
+from werkzeug.exceptions import HTTPException
+
+import change_feed
+from database import get_db, to_epoch
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Rows are only served once their updated_ts is this old, so a transaction
+# that commits slightly after stamping a row cannot slip behind a cursor.
+DEFAULT_SETTLE_SECONDS = 2
+# Anything bound as an SQLite INTEGER has to fit in 64 bits.
+MAX_INTEGER = 2 ** 63 - 1
+
+logger = logging.getLogger(__name__)
+
+RESOURCES = {
+    "applications": {
+        "key": "id",
+        "source": "application_details",
+        "fields": [
+            "id", "student_email", "student_name", "university", "mobility_type", "status", "progress",
+            "submitted_ts", "approved_ts", "approved_by", "rejected_ts", "rejected_by", "rejection_reason",
+            "created_ts", "updated_ts",
+        ],
+    },
+    "documents": {
+        "key": "id",
+        "source": "document_details",
+        "fields": [
+            "id", "application_id", "document_key", "document_label", "filename", "status",
+            "uploaded_ts", "updated_ts",
+        ],
+    },
+    "announcements": {
+        "key": "id",
+        "fields": ["id", "title", "content", "priority", "author_email", "author_name", "created_ts", "updated_ts"],
+    },
+    "users": {
+        "key": "id",
+        "fields": ["id", "email", "role", "name", "faculty", "created_ts", "updated_ts"],
+    },
+}
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({"error": error.message}), error.status
+
+
+@api.errorhandler(HTTPException)
+def handle_http_error(error):
+    return jsonify({"error": error.description}), error.code
+
+
+@api.errorhandler(Exception)
+def handle_unexpected_error(error):
+    logger.exception("unhandled error in %s", request.path)
+    return jsonify({"error": "internal server error"}), 500
+
+
+def is_api_request():
+    # Routing errors (unknown path, wrong method) never reach the blueprint's
+    # handlers, so the app-level handlers ask this before answering in HTML.
+    return request.path == api.url_prefix or request.path.startswith(api.url_prefix + "/")
+
+
+def _is_integer(value, minimum=0):
+    return isinstance(value, int) and not isinstance(value, bool) and minimum <= value <= MAX_INTEGER
+
+
+def api_auth_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user = session.get("user")
+        if user and user.get("role") == "admin":
+            return f(*args, **kwargs)
+        header = request.headers.get("Authorization", "")
+        if header.startswith("Bearer "):
+            token = header[len("Bearer "):].strip()
+            for allowed in current_app.config["API_TOKENS"]:
+                if hmac.compare_digest(token, allowed):
+                    return f(*args, **kwargs)
+        return jsonify({"error": "authentication required"}), 401
+    return decorated_function
+
+
+def encode_cursor(updated_ts, key):
+    raw = json.dumps([updated_ts, key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_ts, key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ApiError("invalid cursor")
+    if not _is_integer(updated_ts):
+        raise ApiError("invalid cursor")
+    if not (isinstance(key, str) or _is_integer(key, -MAX_INTEGER - 1)):
+        raise ApiError("invalid cursor")
+    return updated_ts, key
+
+
+def _parse_args(resource):
+    fields = resource["fields"]
+    selected = fields
+    if request.args.get("fields"):
+        selected = [field.strip() for field in request.args["fields"].split(",") if field.strip()]
+        unknown = [field for field in selected if field not in fields]
+        if unknown:
+            raise ApiError("unknown fields: " + ", ".join(unknown))
+
+    since_ts = None
+    if request.args.get("updated_since"):
+        value = request.args["updated_since"]
+        try:
+            since_ts = int(value) if value.isdecimal() else to_epoch(value)
+        except (ValueError, OverflowError):
+            since_ts = None
+        if not _is_integer(since_ts):
+            raise ApiError("updated_since must be an epoch timestamp or ISO 8601 date")
+
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    after = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+    return selected, since_ts, limit, after
+
+
+def _where(key, since_ts, settled_ts, after):
+    clauses = ["updated_ts <= ?"]
+    params = [settled_ts]
+    if since_ts is not None:
+        clauses.append("updated_ts >= ?")
+        params.append(since_ts)
+    if after is not None:
+        clauses.append(f"(updated_ts, {key}) > (?, ?)")
+        params.extend(after)
+    return " WHERE " + " AND ".join(clauses), params
+
+
+def _etag(name, cursor, since_ts, settled_ts, after):
+    where, params = _where(RESOURCES[name]["key"], since_ts, settled_ts, after)
+    cursor.execute(f"SELECT COUNT(*), MAX(updated_ts) FROM {name}{where}", params)
+    count, max_updated = cursor.fetchone()
+    digest = hashlib.sha1(f"{name}:{count}:{max_updated}:{request.query_string.decode()}".encode()).hexdigest()
+    return digest[:20]
+
+
+def _list(name):
+    resource = RESOURCES[name]
+    key = resource["key"]
+    selected, since_ts, limit, after = _parse_args(resource)
+    settled_ts = int(time.time()) - current_app.config["API_SETTLE_SECONDS"]
+
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        etag = _etag(name, cursor, since_ts, settled_ts, after)
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        columns = list(dict.fromkeys(selected + [key, "updated_ts"]))
+        where, params = _where(key, since_ts, settled_ts, after)
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {resource.get('source', name)}{where} "
+            f"ORDER BY updated_ts, {key} LIMIT ?",
+            params + [limit + 1],
+        )
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["updated_ts"], rows[-1][key]) if rows else request.args.get("cursor")
+    response = jsonify({
+        "data": [{field: row[field] for field in selected} for row in rows],
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+    })
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@api.route("/applications")
+@api_auth_required
+def list_applications():
+    return _list("applications")
+
+
+@api.route("/documents")
+@api_auth_required
+def list_documents():
+    return _list("documents")
+
+
+@api.route("/announcements")
+@api_auth_required
+def list_announcements():
+    return _list("announcements")
+
+
+@api.route("/users")
+@api_auth_required
+def list_users():
+    return _list("users")
+
+
+@api.route("/changes")
+@api_auth_required
+def list_changes():
+    try:
+        after = int(request.args.get("after", 0))
+        limit = int(request.args.get("limit", change_feed.DEFAULT_READ_LIMIT))
+    except ValueError:
+        raise ApiError("after and limit must be integers")
+    if not _is_integer(after):
+        raise ApiError("after must be a non-negative integer")
+    if not 1 <= limit <= change_feed.MAX_READ_LIMIT:
+        raise ApiError(f"limit must be between 1 and {change_feed.MAX_READ_LIMIT}")
+    entities = [entity for entity in request.args.get("entity", "").split(",") if entity]
+    events = change_feed.read(after, limit=limit, entities=entities)
+    return jsonify({
+        "data": events,
+        "next_after": events[-1]["seq"] if events else after,
+        "has_more": len(events) == limit,
+    })
+
+
+def init_app(app):
+    app.config.setdefault("API_TOKENS", [])
+    app.config.setdefault("API_SETTLE_SECONDS", DEFAULT_SETTLE_SECONDS)
+    app.register_blueprint(api)
@@ -1,18 +1,104 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session, send_from_directory
+from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file, jsonify
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
 import os
+import io
+import tempfile
+import time
+import click
 from datetime import datetime, timedelta
 from uuid import uuid4
 
-from database import init_db, migrate_from_json, get_db
+from database import init_db, migrate_from_json, get_db, sync_document_types
 from models import User, Application, Document, Comment, Announcement
+import uploads_gc
+import upload_store
+import analytics
+import sql_trace
+import warmup
+import static_assets
+import api
+import bulk_import
+import change_feed
+import backup
+import archive
+import university_index
+import throttle
+import notifications
+import chunked_upload
+import review_queue
+import student_summary
+import bulk_delete
+import profiler
 
 app = Flask(__name__)
+warmup.init_bytecode_cache(
+    app, os.environ.get("ERASMUS_JINJA_CACHE_DIR", os.path.join(app.root_path, ".jinja_cache"))
+)
 app.config["SECRET_KEY"] = "change-me-in-production"
 app.config["UPLOAD_FOLDER"] = os.path.join("static", "uploads")
 app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(hours=24)
+app.config["UPLOAD_GC_BATCH_SIZE"] = uploads_gc.DEFAULT_BATCH_SIZE
+app.config["UPLOAD_GC_GRACE_SECONDS"] = uploads_gc.DEFAULT_GRACE_SECONDS
+app.config["ANALYTICS_REFRESH_SECONDS"] = analytics.DEFAULT_REFRESH_SECONDS
+app.config["SQL_SLOW_QUERY_MS"] = float(os.environ.get("ERASMUS_SLOW_QUERY_MS", sql_trace.DEFAULT_SLOW_QUERY_MS))
+app.config["SQL_SLOW_QUERY_LOG"] = os.environ.get("ERASMUS_SLOW_QUERY_LOG")
+app.config["SQL_QUERY_BUDGETS"] = {}
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("ERASMUS_COMPRESS_MIN_SIZE", static_assets.DEFAULT_COMPRESS_MIN_SIZE))
+app.config["COMPRESS_LEVEL"] = int(os.environ.get("ERASMUS_COMPRESS_LEVEL", static_assets.DEFAULT_COMPRESS_LEVEL))
+app.config["IMPORT_CHUNK_SIZE"] = bulk_import.DEFAULT_CHUNK_SIZE
+app.config["IMPORT_WORKERS"] = None
+app.config["IMPORT_WEB_MAX_ROWS"] = int(os.environ.get("ERASMUS_IMPORT_WEB_MAX_ROWS", bulk_import.DEFAULT_WEB_MAX_ROWS))
+app.config["BACKUP_DIR"] = os.environ.get("ERASMUS_BACKUP_DIR", "backups")
+app.config["ARCHIVE_CHUNK_SIZE"] = archive.DEFAULT_CHUNK_SIZE
+app.config["ARCHIVE_KEEP_YEARS"] = archive.DEFAULT_KEEP_YEARS
+app.config["PARTNER_UNIVERSITIES"] = university_index.load_partners(os.environ.get("ERASMUS_PARTNER_UNIVERSITIES_FILE"))
+app.config["UNIVERSITY_INDEX_REFRESH_SECONDS"] = university_index.DEFAULT_REFRESH_SECONDS
+app.config["THROTTLE_ENABLED"] = os.environ.get("ERASMUS_THROTTLE", "1") == "1"
+app.config["THROTTLE_LIMITS"] = throttle.limits_from_env()
+app.config["TRUSTED_PROXIES"] = int(os.environ.get("ERASMUS_TRUSTED_PROXIES", "0"))
+app.config["NOTIFY_BACKEND"] = os.environ.get("ERASMUS_NOTIFY_BACKEND", "console")
+app.config["NOTIFY_SENDER"] = os.environ.get("ERASMUS_NOTIFY_SENDER", notifications.DEFAULT_SENDER)
+app.config["NOTIFY_BASE_URL"] = os.environ.get("ERASMUS_BASE_URL")
+app.config["NOTIFY_RATE_PER_SECOND"] = float(
+    os.environ.get("ERASMUS_NOTIFY_RATE_PER_SECOND", notifications.DEFAULT_RATE_PER_SECOND)
+)
+app.config["NOTIFY_COALESCE_SECONDS"] = int(
+    os.environ.get("ERASMUS_NOTIFY_COALESCE_SECONDS", notifications.DEFAULT_COALESCE_SECONDS)
+)
+app.config["SMTP_HOST"] = os.environ.get("ERASMUS_SMTP_HOST", "localhost")
+app.config["SMTP_PORT"] = int(os.environ.get("ERASMUS_SMTP_PORT", 25))
+app.config["SMTP_USERNAME"] = os.environ.get("ERASMUS_SMTP_USERNAME")
+app.config["SMTP_PASSWORD"] = os.environ.get("ERASMUS_SMTP_PASSWORD")
+app.config["SMTP_USE_TLS"] = os.environ.get("ERASMUS_SMTP_USE_TLS", "0") == "1"
+app.config["MAX_UPLOAD_SIZE"] = int(os.environ.get("ERASMUS_MAX_UPLOAD_SIZE", chunked_upload.DEFAULT_MAX_SIZE))
+app.config["CHUNKED_UPLOAD_DIR"] = os.environ.get("ERASMUS_CHUNKED_UPLOAD_DIR", "upload_chunks")
+app.config["REVIEW_LEASE_SECONDS"] = int(os.environ.get("ERASMUS_REVIEW_LEASE_SECONDS", review_queue.DEFAULT_LEASE_SECONDS))
+app.config["COMMENTS_PAGE_SIZE"] = 20
+app.config["BULK_DELETE_BATCH_SIZE"] = int(os.environ.get("ERASMUS_BULK_DELETE_BATCH_SIZE", bulk_delete.DEFAULT_BATCH_SIZE))
+app.config["BULK_DELETE_PAUSE_MS"] = int(os.environ.get("ERASMUS_BULK_DELETE_PAUSE_MS", bulk_delete.DEFAULT_PAUSE_MS))
+app.config["PROFILER_ENABLED"] = os.environ.get("ERASMUS_PROFILER", "1") == "1"
+app.config["PROFILE_DIR"] = os.environ.get("ERASMUS_PROFILE_DIR", "profiles")
+app.config["PROFILE_KEEP"] = int(os.environ.get("ERASMUS_PROFILE_KEEP", profiler.DEFAULT_KEEP))
+app.config["API_TOKENS"] = [token for token in os.environ.get("ERASMUS_API_TOKENS", "").split(",") if token]
+
+# First, so a profiled request also covers the other before/after hooks.
+profiler.init_app(app)
+sql_trace.init_app(app)
+static_assets.init_app(app)
+api.init_app(app)
+throttle.init_app(app)
+notifications.init_app(app)
+chunked_upload.init_app(app)
+review_queue.init_app(app)
+bulk_delete.init_app(app)
+
+if app.config["TRUSTED_PROXIES"]:
+    # Behind a reverse proxy remote_addr is the proxy itself, which would put
+    # every client into one throttle bucket; take the client from X-Forwarded-For.
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"], x_proto=app.config["TRUSTED_PROXIES"])
 
 if not os.path.isdir(app.config["UPLOAD_FOLDER"]):
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
@@ -20,6 +106,9 @@ if not os.path.isdir(app.config["UPLOAD_FOLDER"]):
 init_db()
 migrate_from_json()
 
+if os.environ.get("ERASMUS_WARMUP") == "1":
+    warmup.warm_up(app)
+
 
 def login_required(f):
     @wraps(f)
@@ -74,6 +163,9 @@ DOCUMENT_REQUIREMENTS = [
 ]
 
 
+sync_document_types(DOCUMENT_REQUIREMENTS)
+
+
 @app.context_processor
 def inject_current_user():
     return {"current_user": session.get("user")}
@@ -92,6 +184,11 @@ def login():
         password = request.form.get("password", "")
         role = request.form.get("role")
 
+        retry_after = throttle.check([("login_ip", request.remote_addr), ("login_account", email)])
+        if retry_after:
+            flash(f"Príliš veľa pokusov o prihlásenie. Skúste to znova o {retry_after} s.", "danger")
+            return render_template("login.html"), 429, {"Retry-After": str(retry_after)}
+
         user = User.get_by_email(email)
         if user and User.verify_password(user, password) and user["role"] == role:
             session["user"] = {
@@ -135,6 +232,11 @@ def register():
             flash("Používateľ s týmto e‑mailom už existuje.", "danger")
             return render_template("register.html")
 
+        retry_after = throttle.check([("register_ip", request.remote_addr)])
+        if retry_after:
+            flash(f"Príliš veľa registrácií. Skúste to znova o {retry_after} s.", "danger")
+            return render_template("register.html"), 429, {"Retry-After": str(retry_after)}
+
         if User.create(email, password, role, full_name, faculty):
             session["user"] = {
                 "name": full_name,
@@ -161,23 +263,15 @@ def logout():
 @role_required("student")
 def student_dashboard():
     user = session.get("user")
-    user_apps = Application.get_by_student(user["email"])
+    summary = student_summary.get(user["email"])
     tab = request.args.get("tab", "home")
-
-    for app in user_apps:
-        app["documents"] = Document.get_by_application(app["id"])
-
-    total_documents = sum(len(app.get("documents", [])) for app in user_apps)
-    total_required = len(DOCUMENT_REQUIREMENTS) * len(user_apps) if user_apps else len(DOCUMENT_REQUIREMENTS)
-    unread_messages = 0
-    
-    pending_apps = len([a for a in user_apps if a["status"] == "Podaná"])
-    approved_apps = len([a for a in user_apps if a["status"] == "Schválená"])
+    user_apps = Application.get_with_document_counts(student_email=user["email"]) if summary["applications_total"] else []
     
+    latest_app = next((a for a in user_apps if a["id"] == summary["latest_application_id"]), None)
     latest_docs_by_key: dict[str, dict] = {}
-    if user_apps:
-        latest = user_apps[0]
-        for d in latest.get("documents", []):
+    if latest_app and tab == "documents":
+        latest_app["documents"] = Document.get_by_application(latest_app["id"])
+        for d in latest_app["documents"]:
             latest_docs_by_key[d["document_key"]] = d
     
     all_announcements = Announcement.get_all()
@@ -186,14 +280,16 @@ def student_dashboard():
     return render_template(
         "student_dashboard.html",
         applications=user_apps,
+        latest_app=latest_app,
         required_documents=DOCUMENT_REQUIREMENTS,
         docs_by_key=latest_docs_by_key,
         active_tab=tab,
-        total_documents=total_documents,
-        total_required=total_required,
+        summary=summary,
+        total_documents=summary["documents_total"],
+        total_required=summary["documents_required"] or len(DOCUMENT_REQUIREMENTS),
         unread_messages=0,
-        pending_apps=pending_apps,
-        approved_apps=approved_apps,
+        pending_apps=summary["applications_pending"],
+        approved_apps=summary["applications_approved"],
         latest_announcements=latest_announcements,
         all_announcements=all_announcements,
     )
@@ -210,9 +306,33 @@ def student_view_application(app_id):
         return redirect(url_for("student_dashboard"))
     
     application["documents"] = Document.get_by_application(app_id)
-    application["comments"] = Comment.get_by_application(app_id)
+    application["comments"], next_cursor = Comment.get_page(
+        app_id, app.config["COMMENTS_PAGE_SIZE"], request.args.get("comments_before")
+    )
     
-    return render_template("student_view_application.html", application=application, required_documents=DOCUMENT_REQUIREMENTS)
+    return render_template(
+        "student_view_application.html",
+        application=application,
+        required_documents=DOCUMENT_REQUIREMENTS,
+        next_comments_cursor=next_cursor,
+    )
+
+
+@app.route("/applications/<app_id>/comments")
+@role_required("student", "admin")
+def application_comments(app_id):
+    user = session.get("user")
+    application = Application.get_by_id(app_id)
+    if not application or (user["role"] == "student" and application["student_email"] != user["email"]):
+        return "", 404
+    comments, next_cursor = Comment.get_page(app_id, app.config["COMMENTS_PAGE_SIZE"], request.args.get("before"))
+    return render_template(
+        "comments_page.html",
+        application=application,
+        comments=comments,
+        next_comments_cursor=next_cursor,
+        comment_class="bg-light" if user["role"] == "student" else "",
+    )
 
 
 @app.route("/student/announcements")
@@ -256,6 +376,25 @@ def student_profile():
     return render_template("student_profile.html", user_data=user_data, active_tab="profile")
 
 
+def _unique_filename(filename):
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}_{secure_filename(filename)}"
+
+
+def _attach_document(app_id, req, unique_filename):
+    existing_docs = Document.get_by_application(app_id)
+    existing_doc = next((d for d in existing_docs if d["document_key"] == req["key"]), None)
+    
+    if existing_doc:
+        # The old file goes only once the row points at the new one.
+        Document.replace_file(existing_doc["id"], unique_filename)
+        try:
+            upload_store.remove(app.config["UPLOAD_FOLDER"], existing_doc["filename"])
+        except OSError:
+            pass
+    else:
+        Document.add_to_application(app_id, req["key"], req["label"], unique_filename)
+
+
 @app.route("/student/application/<app_id>/update-documents", methods=["GET", "POST"])
 @role_required("student")
 def update_application_documents(app_id):
@@ -276,42 +415,12 @@ def update_application_documents(app_id):
             field_name = f"doc_{req['key']}"
             f = request.files.get(field_name)
             if f and f.filename:
-                filename = secure_filename(f.filename)
-                unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}_{filename}"
-                path = os.path.join(app.config["UPLOAD_FOLDER"], unique_filename)
-                f.save(path)
-                
-                existing_docs = Document.get_by_application(app_id)
-                existing_doc = next((d for d in existing_docs if d["document_key"] == req["key"]), None)
-                
-                if existing_doc:
-                    old_file_path = os.path.join(app.config["UPLOAD_FOLDER"], existing_doc["filename"])
-                    if os.path.exists(old_file_path):
-                        try:
-                            os.remove(old_file_path)
-                        except:
-                            pass
-                    conn = get_db()
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE documents 
-                        SET filename = ?, status = 'Odoslaný', uploaded_at = ?
-                        WHERE id = ?
-                    """, (unique_filename, datetime.now(), existing_doc["id"]))
-                    conn.commit()
-                    conn.close()
-                else:
-                    Document.add_to_application(app_id, req["key"], req["label"], unique_filename)
-                
+                unique_filename = _unique_filename(f.filename)
+                upload_store.save(f, app.config["UPLOAD_FOLDER"], unique_filename)
+                _attach_document(app_id, req, unique_filename)
                 uploaded_count += 1
         
-        all_docs = Document.get_by_application(app_id)
-        progress = int((len(all_docs) / len(DOCUMENT_REQUIREMENTS)) * 100)
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE applications SET progress = ? WHERE id = ?", (progress, app_id))
-        conn.commit()
-        conn.close()
+        Application.update_progress(app_id, len(DOCUMENT_REQUIREMENTS))
         
         flash(f"Dokumenty boli aktualizované ({uploaded_count} súborov).", "success")
         return redirect(url_for("student_view_application", app_id=app_id))
@@ -320,6 +429,72 @@ def update_application_documents(app_id):
     return render_template("update_documents.html", application=application, required_documents=DOCUMENT_REQUIREMENTS)
 
 
+@app.errorhandler(chunked_upload.UploadError)
+def handle_upload_error(error):
+    return jsonify({"error": error.message}), error.status
+
+
+@app.route("/student/uploads", methods=["POST"])
+@role_required("student")
+def start_chunked_upload():
+    data = request.get_json(silent=True) or {}
+    upload = chunked_upload.start(
+        session["user"]["email"],
+        data.get("filename"),
+        data.get("size"),
+        app.config["CHUNKED_UPLOAD_DIR"],
+        chunk_size=data.get("chunk_size") or app.config["CHUNKED_UPLOAD_CHUNK_SIZE"],
+        max_size=app.config["MAX_UPLOAD_SIZE"],
+    )
+    return jsonify(chunked_upload.status(upload)), 201
+
+
+@app.route("/student/uploads/<upload_id>")
+@role_required("student")
+def chunked_upload_status(upload_id):
+    return jsonify(chunked_upload.status(chunked_upload.get_session(upload_id, session["user"]["email"])))
+
+
+@app.route("/student/uploads/<upload_id>/chunks/<int:index>", methods=["PUT"])
+@role_required("student")
+def put_upload_chunk(upload_id, index):
+    upload = chunked_upload.get_session(upload_id, session["user"]["email"])
+    digest = chunked_upload.put_chunk(
+        upload, index, request.stream, app.config["CHUNKED_UPLOAD_DIR"],
+        checksum=request.headers.get("X-Chunk-SHA256"),
+    )
+    return jsonify({"index": index, "sha256": digest})
+
+
+@app.route("/student/uploads/<upload_id>/complete", methods=["POST"])
+@role_required("student")
+def complete_chunked_upload(upload_id):
+    user = session.get("user")
+    data = request.get_json(silent=True) or {}
+    upload = chunked_upload.get_session(upload_id, user["email"])
+    application = Application.get_by_id(data.get("application_id") or "")
+    if not application or application["student_email"] != user["email"]:
+        raise chunked_upload.UploadError("application not found", 404)
+    if application["status"] != "Podaná":
+        raise chunked_upload.UploadError("documents can only be changed while the application is submitted", 409)
+    req = next((r for r in DOCUMENT_REQUIREMENTS if r["key"] == data.get("document_key")), None)
+    if req is None:
+        raise chunked_upload.UploadError("unknown document_key")
+    
+    unique_filename = _unique_filename(upload["filename"])
+    target = chunked_upload.complete(
+        upload, app.config["CHUNKED_UPLOAD_DIR"], app.config["UPLOAD_FOLDER"], unique_filename,
+        checksum=data.get("sha256"),
+    )
+    try:
+        _attach_document(application["id"], req, unique_filename)
+    except Exception:
+        chunked_upload.reopen(upload, app.config["CHUNKED_UPLOAD_DIR"], target)
+        raise
+    Application.update_progress(application["id"], len(DOCUMENT_REQUIREMENTS))
+    return jsonify({"document_key": req["key"], "filename": unique_filename})
+
+
 @app.route("/download/<filename>")
 @login_required
 def download_file(filename):
@@ -334,8 +509,14 @@ def download_file(filename):
     if doc:
         doc = dict(doc)
         application = Application.get_by_id(doc["application_id"])
+    elif user["role"] == "admin":
+        doc = archive.get_document_by_filename(filename)
+
+    if doc:
         if user["role"] == "admin" or (user["role"] == "student" and application["student_email"] == user["email"]):
-            return send_from_directory(app.config["UPLOAD_FOLDER"], filename, as_attachment=True)
+            upload = upload_store.open_upload(app.config["UPLOAD_FOLDER"], filename)
+            if upload:
+                return send_file(upload, as_attachment=True, download_name=filename)
     
     flash("Nemáte oprávnenie na prístup k tomuto súboru.", "danger")
     return redirect(url_for("student_dashboard" if user["role"] == "student" else "admin_panel"))
@@ -343,75 +524,87 @@ def download_file(filename):
 
 
 
+ADMIN_TABS = ["home", "applications", "students", "documents", "announcements"]
+
+
+def _admin_tab_context(tab):
+    if tab == "home":
+        counts = Application.count_by_status()
+        return {
+            "stats": {
+                "students_total": User.count_students(),
+                "applications_pending": counts.get("Podaná", 0),
+                "applications_approved": counts.get("Schválená", 0),
+                "applications_rejected": counts.get("Zamietnutá", 0),
+                "total_announcements": Announcement.count(),
+            },
+            "latest_apps": Application.get_latest(5),
+            "latest_announcements": Announcement.get_latest(5),
+        }
+
+    if tab == "applications":
+        status_filter = request.args.get("status", "all")
+        search_query = request.args.get("search", "").strip()
+        student_email = request.args.get("student", "").strip()
+
+        all_applications = Application.get_with_document_counts(
+            student_email=student_email or None,
+            status=None if status_filter == "all" else status_filter,
+        )
+        if search_query:
+            all_applications = [app for app in all_applications 
+                              if search_query.lower() in app.get("university", "").lower() 
+                              or search_query.lower() in app.get("student_name", "").lower()]
+        return {
+            "all_applications": all_applications,
+            "status_filter": status_filter,
+            "search_query": search_query,
+            "selected_student": student_email,
+            "selected_student_user": User.get_by_email(student_email) if student_email else None,
+        }
+
+    if tab == "students":
+        return {"all_students": User.get_students_with_application_counts()}
+
+    if tab == "documents":
+        return {"document_counts": Document.count_by_key()}
+
+    return {"all_announcements": Announcement.get_all()}
+
+
+def _render_admin_tab(tab):
+    return render_template(
+        f"admin_tab_{tab}.html",
+        required_documents=DOCUMENT_REQUIREMENTS,
+        **_admin_tab_context(tab),
+    )
+
+
 @app.route("/admin")
 @role_required("admin")
 def admin_panel():
     tab = request.args.get("tab", "home")
-    status_filter = request.args.get("status", "all")
-    search_query = request.args.get("search", "").strip()
-    student_email = request.args.get("student", "").strip()
-    
-    all_students = User.get_all_students()
-    
-    if student_email:
-        all_applications = Application.get_by_student(student_email)
-        if tab == "students":
-            tab = "applications"
-    else:
-        all_applications = Application.get_all()
-    
-    if search_query:
-        all_applications = [app for app in all_applications 
-                          if search_query.lower() in app.get("university", "").lower() 
-                          or search_query.lower() in app.get("student_name", "").lower()]
-    
-    if status_filter != "all":
-        all_applications = [app for app in all_applications if app.get("status") == status_filter]
-    
-    all_announcements = Announcement.get_all()
-    
-    for app in all_applications:
-        app["documents"] = Document.get_by_application(app["id"])
-    
-    all_apps_for_stats = Application.get_all()
-    total_students = len(all_students)
-    applications_pending = len([a for a in all_apps_for_stats if a["status"] == "Podaná"])
-    applications_approved = len([a for a in all_apps_for_stats if a["status"] == "Schválená"])
-    applications_rejected = len([a for a in all_apps_for_stats if a["status"] == "Zamietnutá"])
-    documents_waiting = sum(len(Document.get_by_application(app["id"])) for app in all_apps_for_stats)
-    unread_messages = 0
-    total_announcements = len(all_announcements)
-
-    stats = {
-        "students_total": total_students,
-        "applications_pending": applications_pending,
-        "applications_approved": applications_approved,
-        "applications_rejected": applications_rejected,
-        "documents_waiting": documents_waiting,
-        "unread_messages": unread_messages,
-        "total_announcements": total_announcements,
-    }
-    
-    latest_apps = all_applications[:10]
-    
-    latest_announcements = all_announcements[:5]
-    
+    if request.args.get("student", "").strip() and tab == "students":
+        tab = "applications"
+    if tab not in ADMIN_TABS:
+        tab = "home"
+
     return render_template(
         "admin_panel.html",
-        stats=stats,
-        latest_apps=latest_apps,
-        latest_announcements=latest_announcements,
         active_tab=tab,
-        required_documents=DOCUMENT_REQUIREMENTS,
-        all_applications=all_applications,
-        all_students=all_students,
-        all_announcements=all_announcements,
-        status_filter=status_filter,
-        search_query=search_query,
-        selected_student=student_email,
+        admin_tabs=ADMIN_TABS,
+        tab_html=_render_admin_tab(tab),
     )
 
 
+@app.route("/admin/tabs/<tab>")
+@role_required("admin")
+def admin_panel_tab(tab):
+    if tab not in ADMIN_TABS:
+        return "", 404
+    return _render_admin_tab(tab)
+
+
 @app.route("/admin/applications/<app_id>")
 @role_required("admin")
 def view_application(app_id):
@@ -421,9 +614,45 @@ def view_application(app_id):
         return redirect(url_for("admin_panel", tab="applications"))
     
     application["documents"] = Document.get_by_application(app_id)
-    application["comments"] = Comment.get_by_application(app_id)
+    application["comments"], next_cursor = Comment.get_page(
+        app_id, app.config["COMMENTS_PAGE_SIZE"], request.args.get("comments_before")
+    )
     
-    return render_template("admin_view_application.html", application=application, required_documents=DOCUMENT_REQUIREMENTS)
+    return render_template(
+        "admin_view_application.html",
+        application=application,
+        required_documents=DOCUMENT_REQUIREMENTS,
+        claim=review_queue.get_claim(app_id),
+        next_comments_cursor=next_cursor,
+    )
+
+
+@app.route("/admin/review")
+@role_required("admin")
+def admin_review():
+    return render_template(
+        "admin_review.html",
+        pending=review_queue.pending_count(),
+        reviewers=review_queue.reviewer_stats(),
+    )
+
+
+@app.route("/admin/review/next", methods=["POST"])
+@role_required("admin")
+def review_next():
+    app_id = review_queue.claim_next(session["user"]["email"], skip=request.form.get("skip"))
+    if app_id is None:
+        flash("Žiadne dokumenty nečakajú na kontrolu.", "info")
+        return redirect(url_for("admin_review"))
+    return redirect(url_for("view_application", app_id=app_id))
+
+
+@app.route("/admin/review/release", methods=["POST"])
+@role_required("admin")
+def review_release():
+    review_queue.release(session["user"]["email"])
+    flash("Prihláška bola vrátená do frontu.", "info")
+    return redirect(url_for("admin_review"))
 
 
 @app.route("/admin/applications/<app_id>/approve", methods=["POST"])
@@ -554,88 +783,299 @@ def admin_users():
     return render_template("admin_users.html", users=users)
 
 
+@app.route("/admin/users/import", methods=["GET", "POST"])
+@role_required("admin")
+def import_users():
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Vyberte súbor CSV alebo XLSX.", "danger")
+            return redirect(url_for("import_users"))
+
+        extension = os.path.splitext(secure_filename(upload.filename))[1].lower()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "import" + extension)
+            upload.save(path)
+            report = io.StringIO()
+            try:
+                summary = bulk_import.import_users(
+                    path, report,
+                    chunk_size=app.config["IMPORT_CHUNK_SIZE"],
+                    workers=app.config["IMPORT_WORKERS"],
+                    filename=upload.filename,
+                    max_rows=app.config["IMPORT_WEB_MAX_ROWS"],
+                )
+            except bulk_import.ImportFileError as e:
+                flash(str(e), "danger")
+                return redirect(url_for("import_users"))
+
+        if summary["already_finished"]:
+            flash("Tento súbor už bol importovaný.", "info")
+            return redirect(url_for("admin_users"))
+        response = send_file(
+            io.BytesIO(report.getvalue().encode("utf-8-sig")),
+            mimetype="text/csv",
+            as_attachment=True,
+            download_name="import-report.csv",
+        )
+        response.headers["X-Import-Created"] = str(summary["created"])
+        response.headers["X-Import-Failed"] = str(summary["failed"])
+        return response
+
+    return render_template("admin_users_import.html", max_rows=app.config["IMPORT_WEB_MAX_ROWS"])
+
+
 @app.route("/admin/users/<user_email>/delete", methods=["POST"])
 @role_required("admin")
 def delete_user(user_email):
     if user_email == session["user"]["email"]:
         flash("Nemôžete zmazať svoj vlastný účet.", "danger")
-    else:
-        User.delete(user_email)
+    elif User.delete(user_email):
         flash("Používateľ bol zmazaný.", "success")
+    else:
+        counts = User.authored_counts(user_email)
+        flash(
+            "Správcu nemožno zmazať, pretože jeho záznamy patria k údajom iných používateľov "
+            f"(komentáre: {counts['comments']}, oznámenia: {counts['announcements']}, správy: {counts['messages']}).",
+            "danger",
+        )
     return redirect(url_for("admin_users"))
 
 
+@app.route("/admin/deletions", methods=["GET", "POST"])
+@role_required("admin")
+def admin_deletions():
+    if request.method == "POST":
+        kind = request.form.get("kind")
+        if kind == "users":
+            targets = bulk_delete.find_users(request.form.get("emails", "").split(), exclude=session["user"]["email"])
+            description = f"Používatelia ({len(targets)})"
+        elif kind == "applications":
+            status = request.form.get("status") or None
+            created_before = request.form.get("created_before", "").strip()
+            try:
+                created_before_ts = int(datetime.strptime(created_before, "%Y-%m-%d").timestamp()) if created_before else None
+            except ValueError:
+                flash("Neplatný dátum.", "danger")
+                return redirect(url_for("admin_deletions"))
+            targets = bulk_delete.find_applications(status, created_before_ts)
+            description = f"Prihlášky – stav: {status or 'všetky'}, vytvorené pred: {created_before or 'kedykoľvek'}"
+        else:
+            return redirect(url_for("admin_deletions"))
+        if not targets:
+            flash("Zadaným podmienkam nezodpovedá nič na zmazanie.", "info")
+            return redirect(url_for("admin_deletions"))
+        job_id = bulk_delete.create(kind, targets, session["user"]["email"], description)
+        bulk_delete.start(job_id)
+        flash(f"Hromadné mazanie spustené ({len(targets)} položiek).", "success")
+        return redirect(url_for("admin_deletions"))
+
+    return render_template(
+        "admin_deletions.html",
+        jobs=bulk_delete.list_jobs(),
+        statuses=["Podaná", "Schválená", "Zamietnutá"],
+    )
+
+
+@app.route("/admin/deletions/<int:job_id>")
+@role_required("admin")
+def deletion_progress(job_id):
+    job = bulk_delete.get(job_id)
+    if job is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(job)
+
+
+@app.route("/admin/deletions/<int:job_id>/resume", methods=["POST"])
+@role_required("admin")
+def resume_deletion(job_id):
+    job = bulk_delete.get(job_id)
+    if job and job["resumable"]:
+        bulk_delete.start(job_id)
+        flash("Hromadné mazanie pokračuje.", "success")
+    else:
+        flash("Túto úlohu nemožno obnoviť.", "warning")
+    return redirect(url_for("admin_deletions"))
+
+
 @app.route("/admin/documents/<doc_id>/update-status", methods=["POST"])
 @role_required("admin")
 def update_document_status(doc_id):
     status = request.form.get("status", "").strip()
     if status in ["Odoslaný", "V preverovaní", "Schválený", "Zamietnutý"]:
-        Document.update_status(doc_id, status)
+        Document.update_status(doc_id, status, reviewer_email=session["user"]["email"])
         flash("Stav dokumentu bol aktualizovaný.", "success")
     else:
         flash("Neplatný stav dokumentu.", "danger")
     
+    if request.form.get("app_id"):
+        return redirect(url_for("view_application", app_id=request.form["app_id"]))
     return redirect(url_for("admin_panel", tab="applications"))
 
 
+@app.route("/admin/profiles")
+@role_required("admin")
+def admin_profiles():
+    return render_template(
+        "admin_profiles.html",
+        captures=profiler.list_captures(),
+        enabled=app.config["PROFILER_ENABLED"],
+        keep=app.config["PROFILE_KEEP"],
+    )
+
+
+@app.route("/admin/profiles/<capture_id>")
+@role_required("admin")
+def view_profile(capture_id):
+    capture = profiler.get(capture_id)
+    if capture is None:
+        flash("Profil nebol nájdený.", "warning")
+        return redirect(url_for("admin_profiles"))
+    return render_template("admin_profile.html", capture=capture)
+
+
+@app.route("/admin/profiles/<capture_id>/download")
+@role_required("admin")
+def download_profile(capture_id):
+    path = profiler.prof_path(capture_id)
+    if path is None:
+        flash("Profil nebol nájdený.", "warning")
+        return redirect(url_for("admin_profiles"))
+    return send_file(path, as_attachment=True, download_name=capture_id + ".prof",
+                     mimetype="application/octet-stream")
+
+
+@app.route("/admin/metrics")
+@role_required("admin")
+def admin_metrics():
+    return jsonify({
+        "sql": sql_trace.endpoint_stats(),
+        "throttle": throttle.counters(app.config["THROTTLE_DATABASE"]),
+        "notifications": notifications.stats(),
+        "review_queue": review_queue.pending_count(),
+    })
+
+
 @app.route("/admin/statistics")
 @role_required("admin")
 def admin_statistics():
-    all_applications = Application.get_all()
+    date_from = request.args.get("date_from", "").strip()
+    date_to = request.args.get("date_to", "").strip()
+    since_ts = until_ts = None
+    try:
+        if date_from:
+            since_ts = int(datetime.strptime(date_from, "%Y-%m-%d").timestamp())
+        if date_to:
+            until_ts = int((datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)).timestamp())
+    except ValueError:
+        flash("Neplatný formát dátumu.", "warning")
+        date_from = date_to = ""
+        since_ts = until_ts = None
+    
+    status_counts = Application.count_by_status(since_ts, until_ts)
     all_students = User.get_all_students()
     
-    applications_approved = len([a for a in all_applications if a["status"] == "Schválená"])
-    applications_rejected = len([a for a in all_applications if a["status"] == "Zamietnutá"])
+    monthly_stats = Application.monthly_stats(since_ts, until_ts)
+    mobility_stats = Application.mobility_stats(since_ts, until_ts)
     
-    monthly_stats = {}
-    for app in all_applications:
-        if app.get("created_at"):
-            try:
-                if isinstance(app["created_at"], str):
-                    try:
-                        date_obj = datetime.fromisoformat(app["created_at"].replace(" ", "T"))
-                    except:
-                        date_obj = datetime.strptime(app["created_at"], "%Y-%m-%d %H:%M:%S")
-                else:
-                    date_obj = app["created_at"]
-                month_key = date_obj.strftime("%Y-%m")
-                if month_key not in monthly_stats:
-                    monthly_stats[month_key] = {"total": 0, "approved": 0, "rejected": 0}
-                monthly_stats[month_key]["total"] += 1
-                if app["status"] == "Schválená":
-                    monthly_stats[month_key]["approved"] += 1
-                elif app["status"] == "Zamietnutá":
-                    monthly_stats[month_key]["rejected"] += 1
-            except Exception as e:
-                pass
-    
-    mobility_stats = {}
-    for app in all_applications:
-        mob_type = app.get("mobility_type", "Nezadané")
-        mobility_stats[mob_type] = mobility_stats.get(mob_type, 0) + 1
-    
-    doc_stats = {}
-    for req in DOCUMENT_REQUIREMENTS:
-        count = 0
-        for app in all_applications:
-            docs = Document.get_by_application(app["id"])
-            if any(d["document_key"] == req["key"] for d in docs):
-                count += 1
-        doc_stats[req["label"]] = count
+    key_counts = Document.count_applications_by_key(since_ts, until_ts)
+    doc_stats = {req["label"]: key_counts.get(req["key"], 0) for req in DOCUMENT_REQUIREMENTS}
     
     return render_template(
         "admin_statistics.html",
         monthly_stats=monthly_stats,
         mobility_stats=mobility_stats,
         doc_stats=doc_stats,
-        total_applications=len(all_applications),
+        total_applications=sum(status_counts.values()),
         total_students=len(all_students),
-        applications_approved=applications_approved,
-        applications_rejected=applications_rejected,
+        applications_approved=status_counts.get("Schválená", 0),
+        applications_rejected=status_counts.get("Zamietnutá", 0),
+        date_from=date_from,
+        date_to=date_to,
         active_tab="statistics",
     )
 
 
+def _analytics_query():
+    cube = analytics.get_cube(
+        [req["key"] for req in DOCUMENT_REQUIREMENTS],
+        refresh_seconds=app.config["ANALYTICS_REFRESH_SECONDS"],
+    )
+    group_by = [dim for dim in request.args.getlist("group_by") if dim in analytics.DIMENSIONS]
+    filters = {dim: request.args.getlist(f"f_{dim}") for dim in analytics.DIMENSIONS}
+    return cube, group_by, filters, cube.query(group_by, filters)
+
+
+@app.route("/admin/statistics/explore")
+@role_required("admin")
+def admin_statistics_explore():
+    cube, group_by, filters, rows = _analytics_query()
+    return render_template(
+        "admin_statistics_explore.html",
+        dimensions=analytics.DIMENSIONS,
+        dimension_values={dim: cube.values(dim) for dim in analytics.DIMENSIONS},
+        group_by=group_by,
+        filters=filters,
+        rows=rows,
+        required_documents=DOCUMENT_REQUIREMENTS,
+        active_tab="statistics",
+    )
+
+
+@app.route("/admin/statistics/cube")
+@role_required("admin")
+def admin_statistics_cube():
+    _, group_by, filters, rows = _analytics_query()
+    return jsonify({"group_by": group_by, "filters": {k: v for k, v in filters.items() if v}, "rows": rows})
+
+
+@app.route("/admin/archive")
+@role_required("admin")
+def admin_archive():
+    search_query = request.args.get("search", "").strip()
+    status_filter = request.args.get("status", "all")
+    academic_year = request.args.get("year", type=int)
+    applications = archive.search(
+        query=search_query or None,
+        academic_year=academic_year,
+        status=None if status_filter == "all" else status_filter,
+    )
+    return render_template(
+        "admin_archive.html",
+        applications=applications,
+        year_counts=archive.year_counts(),
+        search_query=search_query,
+        status_filter=status_filter,
+        selected_year=academic_year,
+        required_documents=DOCUMENT_REQUIREMENTS,
+    )
+
+
+@app.route("/admin/archive/<app_id>")
+@role_required("admin")
+def view_archived_application(app_id):
+    application = archive.get_application(app_id)
+    if not application:
+        flash("Prihláška v archíve nebola nájdená.", "danger")
+        return redirect(url_for("admin_archive"))
+    return render_template(
+        "admin_view_archived_application.html", application=application, required_documents=DOCUMENT_REQUIREMENTS
+    )
+
+
+def _university_index():
+    return university_index.get_index(
+        app.config["PARTNER_UNIVERSITIES"], refresh_seconds=app.config["UNIVERSITY_INDEX_REFRESH_SECONDS"]
+    )
+
+
+@app.route("/universities/suggest")
+@login_required
+def suggest_universities():
+    limit = min(request.args.get("limit", university_index.DEFAULT_LIMIT, type=int), university_index.MAX_LIMIT)
+    return jsonify(_university_index().suggest(request.args.get("q", ""), limit=max(limit, 1)))
+
+
 @app.route("/application", methods=["GET", "POST"])
 @role_required("student")
 def application_form():
@@ -650,10 +1090,8 @@ def application_form():
             field_name = f"doc_{req['key']}"
             f = request.files.get(field_name)
             if f and f.filename:
-                filename = secure_filename(f.filename)
-                unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}_{filename}"
-                path = os.path.join(app.config["UPLOAD_FOLDER"], unique_filename)
-                f.save(path)
+                unique_filename = _unique_filename(f.filename)
+                upload_store.save(f, app.config["UPLOAD_FOLDER"], unique_filename)
                 uploaded_count += 1
                 documents.append(
                     {
@@ -663,6 +1101,8 @@ def application_form():
                     }
                 )
 
+        if destination:
+            destination = _university_index().canonical(destination)
         app_id = Application.create(
             user["email"],
             user["name"],
@@ -670,6 +1110,8 @@ def application_form():
             mobility_type,
             documents
         )
+        if destination:
+            _university_index().add(destination)
 
         flash(
             f"Prihláška bola vytvorená a dokumenty boli nahrané ({uploaded_count} z {len(DOCUMENT_REQUIREMENTS)}).",
@@ -700,13 +1142,250 @@ def delete_application(app_id):
 
 
 
+@app.cli.command("gc-uploads")
+@click.option("--dry-run", is_flag=True, help="Only report orphaned files, do not delete anything.")
+@click.option("--batch-size", type=int, default=None)
+@click.option("--grace-seconds", type=int, default=None)
+@click.option("--max-batches", type=int, default=None, help="Stop after N batches; the next run resumes.")
+@click.option("--restart", is_flag=True, help="Ignore a saved cursor and start a new pass.")
+def gc_uploads_command(dry_run, batch_size, grace_seconds, max_batches, restart):
+    report = uploads_gc.collect_garbage(
+        app.config["UPLOAD_FOLDER"],
+        batch_size=batch_size or app.config["UPLOAD_GC_BATCH_SIZE"],
+        grace_seconds=app.config["UPLOAD_GC_GRACE_SECONDS"] if grace_seconds is None else grace_seconds,
+        dry_run=dry_run,
+        max_batches=max_batches,
+        restart=restart,
+    )
+    if dry_run:
+        for orphan in report["orphans"]:
+            click.echo(f"{orphan['filename']}\t{orphan['size']}")
+    click.echo(
+        f"batches={report['batches']} scanned={report['files_scanned']} "
+        f"orphans={len(report['orphans'])} deleted={report['files_deleted']} "
+        f"skipped_recent={report['skipped_recent']} bytes_reclaimed={report['bytes_reclaimed']} "
+        f"finished={report['finished']}"
+    )
+
+
+@app.cli.command("prune-upload-sessions")
+@click.option("--ttl-seconds", type=int, default=None, help="Drop chunked uploads idle for longer than this.")
+def prune_upload_sessions_command(ttl_seconds):
+    deleted = chunked_upload.prune_stale(
+        app.config["CHUNKED_UPLOAD_DIR"],
+        ttl_seconds=app.config["CHUNKED_UPLOAD_TTL_SECONDS"] if ttl_seconds is None else ttl_seconds,
+    )
+    click.echo(f"deleted={deleted}")
+
+
+@app.cli.command("migrate-uploads")
+@click.option("--batch-size", type=int, default=upload_store.DEFAULT_MIGRATION_BATCH_SIZE)
+@click.option("--max-batches", type=int, default=None, help="Stop after N batches; rerun to continue.")
+def migrate_uploads_command(batch_size, max_batches):
+    report = upload_store.migrate_flat_files(app.config["UPLOAD_FOLDER"], batch_size=batch_size, max_batches=max_batches)
+    click.echo(
+        f"batches={report['batches']} moved={report['files_moved']} "
+        f"bytes_moved={report['bytes_moved']} finished={report['finished']}"
+    )
+
+
+@app.cli.command("build-assets")
+def build_assets_command():
+    report = static_assets.build(app.static_folder)
+    static_assets.load_manifest(app.static_folder)
+    click.echo(f"files={report['files']} gzip={report['gzip']} brotli={report['brotli']}")
+
+
+@app.cli.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--report", "report_path", type=click.Path(dir_okay=False), default=None,
+              help="Where to write the per-row report (default: <file>.report.csv).")
+@click.option("--chunk-size", type=int, default=None)
+@click.option("--workers", type=int, default=None, help="Password hashing processes.")
+@click.option("--restart", is_flag=True, help="Ignore saved progress and process the whole file again.")
+def import_users_command(path, report_path, chunk_size, workers, restart):
+    report_path = report_path or os.path.splitext(path)[0] + ".report.csv"
+    # The report holds the only copy of the generated passwords, so it is
+    # truncated only when the import starts over.
+    state = bulk_import.get_state(bulk_import.file_id(path))
+    if state and state["finished_at"] and not restart:
+        click.echo("already imported, use --restart to process the file again")
+        return
+    try:
+        with open(report_path, "a" if state and not restart else "w", newline="", encoding="utf-8") as report:
+            summary = bulk_import.import_users(
+                path, report,
+                chunk_size=chunk_size or app.config["IMPORT_CHUNK_SIZE"],
+                workers=workers or app.config["IMPORT_WORKERS"],
+                restart=restart,
+            )
+    except bulk_import.ImportFileError as e:
+        raise click.ClickException(str(e))
+    if summary["already_finished"]:
+        click.echo("already imported, use --restart to process the file again")
+        return
+    click.echo(
+        f"rows={summary['rows']} created={summary['created']} failed={summary['failed']} "
+        f"resumed={summary['resumed']} report={report_path}"
+    )
+
+
+@app.cli.command("prune-changes")
+@click.option("--days", type=int, default=90, help="Delete change events older than this.")
+def prune_changes_command(days):
+    deleted = change_feed.prune(int(datetime.now().timestamp()) - days * 24 * 3600)
+    click.echo(f"deleted={deleted}")
+
+
+@app.cli.command("send-notifications")
+@click.option("--loop", is_flag=True, help="Keep sending until interrupted.")
+@click.option("--interval", type=float, default=30, help="Seconds between runs with --loop.")
+@click.option("--prune-days", type=int, default=30, help="Delete sent notifications older than this.")
+def send_notifications_command(loop, interval, prune_days):
+    while True:
+        report = notifications.send_from_config(app.config)
+        report["pruned"] = notifications.prune(int(time.time()) - prune_days * 24 * 3600)
+        click.echo(" ".join(f"{key}={value}" for key, value in report.items()))
+        if not loop:
+            break
+        time.sleep(interval)
+
+
+@app.cli.command("resume-deletions")
+@click.option("--batch-size", type=int, default=None)
+@click.option("--pause-ms", type=int, default=None)
+def resume_deletions_command(batch_size, pause_ms):
+    for job_id in bulk_delete.resumable_ids():
+        job = bulk_delete.run(job_id, batch_size=batch_size, pause_ms=pause_ms)
+        if job is None:
+            click.echo(f"job={job_id} skipped=already-running")
+            continue
+        click.echo(
+            f"job={job_id} status={job['status']} done={job['items_done']} failed={job['items_failed']} "
+            f"applications={job['applications_deleted']} files={job['files_removed']}"
+        )
+
+
+@app.cli.command("check-student-summary")
+@click.option("--fix", is_flag=True, help="Store the recomputed rows.")
+def check_student_summary_command(fix):
+    report = student_summary.check(fix=fix)
+    for mismatch in report["mismatches"][:20]:
+        diff = " ".join(f"{column}={have}->{want}" for column, (have, want) in mismatch["diff"].items())
+        click.echo(f"{mismatch['student_email']}\t{diff}")
+    click.echo(f"students={report['students']} mismatches={len(report['mismatches'])} fixed={report['fixed']}")
+    if report["mismatches"] and not fix:
+        raise SystemExit(1)
+
+
+@app.cli.command("archive")
+@click.option("--before-year", type=int, default=None,
+              help="Archive academic years starting before this one (e.g. 2024 for 2024/2025).")
+@click.option("--chunk-size", type=int, default=None, help="Applications moved per transaction.")
+@click.option("--max-chunks", type=int, default=None, help="Stop after this many chunks.")
+@click.option("--dry-run", is_flag=True, help="Only count what would be archived.")
+def archive_command(before_year, chunk_size, max_chunks, dry_run):
+    if before_year is None:
+        before_year = archive.current_academic_year() - app.config["ARCHIVE_KEEP_YEARS"] + 1
+    report = archive.archive_before(
+        before_year,
+        chunk_size=chunk_size or app.config["ARCHIVE_CHUNK_SIZE"],
+        max_chunks=max_chunks,
+        dry_run=dry_run,
+    )
+    click.echo(" ".join(f"{key}={value}" for key, value in report.items()))
+
+
+@app.cli.command("backup")
+@click.option("--dest", default=None, help="Backup directory (default: BACKUP_DIR).")
+@click.option("--pages", type=int, default=backup.DEFAULT_PAGES_PER_STEP, help="Database pages copied per step.")
+@click.option("--pause-ms", type=int, default=backup.DEFAULT_PAUSE_MS, help="Pause between steps for writers.")
+@click.option("--no-uploads", is_flag=True, help="Back up only the database.")
+def backup_command(dest, pages, pause_ms, no_uploads):
+    snapshot_dir, manifest = backup.create_backup(
+        dest or app.config["BACKUP_DIR"],
+        upload_folder=None if no_uploads else app.config["UPLOAD_FOLDER"],
+        pages_per_step=pages,
+        pause_ms=pause_ms,
+    )
+    db = manifest["database"]
+    click.echo(
+        f"snapshot={snapshot_dir} db_bytes={db['bytes']} db_seconds={db['seconds']} "
+        f"db_mb_per_second={db['mb_per_second']} steps={db['steps']} restarts={db['restarts']} "
+        f"single_step_fallback={db['single_step_fallback']}"
+    )
+    if manifest["archive"]:
+        click.echo(f"archive db_bytes={manifest['archive']['bytes']} db_seconds={manifest['archive']['seconds']}")
+    if manifest["uploads"]:
+        uploads = manifest["uploads"]
+        click.echo(
+            f"uploads files={uploads['count']} copied={uploads['copied']} linked={uploads['linked']} "
+            f"bytes_copied={uploads['bytes_copied']} seconds={uploads['seconds']} "
+            f"mb_per_second={uploads['mb_per_second']} previous={manifest['previous']}"
+        )
+    report = backup.verify_backup(snapshot_dir)
+    if not report["ok"]:
+        raise click.ClickException("verification failed: " + "; ".join(report["problems"][:5]))
+    click.echo("verified=ok")
+
+
+@app.cli.command("verify-backup")
+@click.argument("snapshot", type=click.Path(exists=True, file_okay=False))
+@click.option("--deep", is_flag=True, help="Also re-hash every upload.")
+def verify_backup_command(snapshot, deep):
+    try:
+        report = backup.verify_backup(snapshot, deep=deep)
+    except backup.BackupError as e:
+        raise click.ClickException(str(e))
+    for problem in report["problems"]:
+        click.echo(problem)
+    click.echo(f"ok={report['ok']} files_checked={report['files_checked']}")
+    if not report["ok"]:
+        raise SystemExit(1)
+
+
+@app.cli.command("restore-backup")
+@click.argument("snapshot", type=click.Path(exists=True, file_okay=False))
+@click.option("--delete-extra", is_flag=True, help="Delete uploads that are not in the snapshot.")
+@click.confirmation_option(prompt="This overwrites the live database. Stop the app first. Continue?")
+def restore_backup_command(snapshot, delete_extra):
+    try:
+        result = backup.restore_backup(snapshot, app.config["UPLOAD_FOLDER"], delete_extra=delete_extra)
+    except backup.BackupError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"database_seconds={result['database_seconds']} archive_restored={result['archive_restored']} "
+        f"files_restored={result['files_restored']} "
+        f"files_deleted={result['files_deleted']}"
+    )
+
+
+@app.cli.command("warmup")
+def warmup_command():
+    report = warmup.warm_up(app)
+    click.echo(
+        f"templates={report['templates']} tables_and_indexes={report['tables_and_indexes']} "
+        f"seconds={report['seconds']:.3f}"
+    )
+
+
 @app.errorhandler(404)
 def not_found(error):
+    if api.is_api_request():
+        return jsonify({"error": "not found"}), 404
     flash("Stránka nebola nájdená.", "warning")
     return redirect(url_for("index")), 404
 
+@app.errorhandler(405)
+def method_not_allowed(error):
+    if api.is_api_request():
+        return jsonify({"error": "method not allowed"}), 405
+    return error
+
 @app.errorhandler(500)
 def internal_error(error):
+    if api.is_api_request():
+        return jsonify({"error": "internal server error"}), 500
     flash("Vyskytla sa chyba. Skúste to znova.", "danger")
     return redirect(url_for("index")), 500
 
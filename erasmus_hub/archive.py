@@ -0,0 +1,327 @@
+import os
+import time
+from datetime import datetime
+
+import change_feed
+from database import get_db, to_epoch
+
+ARCHIVE_DATABASE = os.environ.get("ERASMUS_ARCHIVE_DB", "erasmus_hub_archive.db")
+DEFAULT_CHUNK_SIZE = 200
+DEFAULT_KEEP_YEARS = 2
+ACADEMIC_YEAR_START_MONTH = 9
+DECIDED_STATUSES = ("Schválená", "Zamietnutá")
+
+ARCHIVED_TABLES = ["applications", "documents", "application_comments", "messages"]
+# The archive is a standalone file, so it stores the resolved names instead of
+# ids into the hot database's lookup tables.
+ARCHIVE_SOURCES = {"applications": "application_details", "documents": "document_details"}
+ARCHIVE_INDEXES = [
+    ("idx_archive_applications_created_ts", "applications", "created_ts"),
+    ("idx_archive_applications_student", "applications", "student_email, created_ts"),
+    ("idx_archive_documents_application", "documents", "application_id"),
+    ("idx_archive_documents_filename", "documents", "filename"),
+    ("idx_archive_comments_application", "application_comments", "application_id, created_ts"),
+    ("idx_archive_messages_created_ts", "messages", "created_ts"),
+]
+
+
+def academic_year_start(year):
+    return to_epoch(datetime(year, ACADEMIC_YEAR_START_MONTH, 1))
+
+
+def current_academic_year(now=None):
+    now = now or datetime.now()
+    return now.year if now.month >= ACADEMIC_YEAR_START_MONTH else now.year - 1
+
+
+def _columns(cursor, schema, table):
+    cursor.execute(f"PRAGMA {schema}.table_info({table})")
+    return [(row["name"], row["type"], row["pk"]) for row in cursor.fetchall()]
+
+
+def _ensure_schema(cursor):
+    # Archive tables mirror the hot ones without constraints or triggers; columns
+    # added to the hot schema later are added here on the next attach.
+    for table in ARCHIVED_TABLES:
+        columns = _columns(cursor, "main", ARCHIVE_SOURCES.get(table, table))
+        existing = {name for name, _, _ in _columns(cursor, "archive", table)}
+        if not existing:
+            definitions = [f"{name} {type_} PRIMARY KEY" if name == "id" else f"{name} {type_}"
+                           for name, type_, _ in columns]
+            cursor.execute(f"CREATE TABLE archive.{table} ({', '.join(definitions)}, archived_ts INTEGER)")
+            continue
+        for name, type_, _ in columns:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE archive.{table} ADD COLUMN {name} {type_}")
+    for name, table, columns in ARCHIVE_INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS archive.{name} ON {table}({columns})")
+
+
+def connect(path=None):
+    conn = get_db()
+    conn.execute("ATTACH DATABASE ? AS archive", (path or ARCHIVE_DATABASE,))
+    _ensure_schema(conn.cursor())
+    conn.commit()
+    return conn
+
+
+def _copy(cursor, table, where, params, archived_ts):
+    source = ARCHIVE_SOURCES.get(table, table)
+    columns = ", ".join(name for name, _, _ in _columns(cursor, "main", source))
+    cursor.execute(f"""
+        INSERT OR REPLACE INTO archive.{table} ({columns}, archived_ts)
+        SELECT {columns}, ? FROM main.{source} WHERE {where}
+    """, [archived_ts] + list(params))
+    return cursor.rowcount
+
+
+def _in(ids):
+    return f"({', '.join('?' for _ in ids)})"
+
+
+def _archive_application_chunk(conn, ids, archived_ts):
+    cursor = conn.cursor()
+    # The hot and archive files are separate WAL databases, so one transaction
+    # spanning both is not atomic across a crash. Copy first and commit, then
+    # delete only rows whose archived copy is still identical; a crash in
+    # between leaves duplicates that the next run overwrites, never a loss.
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        _copy(cursor, "applications", f"id IN {_in(ids)}", ids, archived_ts)
+        _copy(cursor, "documents", f"application_id IN {_in(ids)}", ids, archived_ts)
+        _copy(cursor, "application_comments", f"application_id IN {_in(ids)}", ids, archived_ts)
+        cursor.execute("COMMIT")
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(f"""
+            SELECT a.id FROM main.applications a
+            JOIN archive.applications x ON x.id = a.id AND x.updated_ts IS a.updated_ts
+            WHERE a.id IN {_in(ids)}
+              AND NOT EXISTS (
+                SELECT 1 FROM main.documents d
+                WHERE d.application_id = a.id AND NOT EXISTS (
+                    SELECT 1 FROM archive.documents y WHERE y.id = d.id AND y.updated_ts IS d.updated_ts
+                )
+              )
+              AND NOT EXISTS (
+                SELECT 1 FROM main.application_comments c
+                WHERE c.application_id = a.id AND NOT EXISTS (
+                    SELECT 1 FROM archive.application_comments z WHERE z.id = c.id
+                )
+              )
+        """, ids)
+        safe_ids = [row["id"] for row in cursor.fetchall()]
+        counts = {"applications": 0, "documents": 0, "comments": 0, "skipped": len(ids) - len(safe_ids)}
+        if safe_ids:
+            cursor.execute(f"SELECT id FROM main.documents WHERE application_id IN {_in(safe_ids)}", safe_ids)
+            document_ids = [row["id"] for row in cursor.fetchall()]
+            cursor.execute(f"DELETE FROM main.application_comments WHERE application_id IN {_in(safe_ids)}", safe_ids)
+            counts["comments"] = cursor.rowcount
+            cursor.execute(f"DELETE FROM main.documents WHERE application_id IN {_in(safe_ids)}", safe_ids)
+            counts["documents"] = cursor.rowcount
+            cursor.execute(f"DELETE FROM main.applications WHERE id IN {_in(safe_ids)}", safe_ids)
+            counts["applications"] = cursor.rowcount
+            change_feed.record_many(cursor, "document", "delete",
+                                    [(doc_id, {"archived": True}) for doc_id in document_ids])
+            change_feed.record_many(cursor, "application", "delete",
+                                    [(app_id, {"archived": True}) for app_id in safe_ids])
+        cursor.execute("COMMIT")
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    return counts
+
+
+def _archive_message_chunk(conn, before_ts, chunk_size, archived_ts):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id FROM main.messages WHERE is_read = 1 AND created_ts < ?
+        ORDER BY created_ts LIMIT ?
+    """, (before_ts, chunk_size))
+    ids = [row["id"] for row in cursor.fetchall()]
+    if not ids:
+        return 0
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        _copy(cursor, "messages", f"id IN {_in(ids)}", ids, archived_ts)
+        cursor.execute("COMMIT")
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    # Read messages never change again, so anything copied can go.
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute(f"""
+            DELETE FROM main.messages
+            WHERE id IN {_in(ids)} AND id IN (SELECT id FROM archive.messages)
+        """, ids)
+        deleted = cursor.rowcount
+        cursor.execute("COMMIT")
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    return deleted
+
+
+def archive_before(before_year, chunk_size=DEFAULT_CHUNK_SIZE, max_chunks=None, dry_run=False, path=None):
+    started = time.perf_counter()
+    before_ts = academic_year_start(before_year)
+    report = {
+        "before_year": f"{before_year}/{before_year + 1}",
+        "dry_run": dry_run,
+        "chunks": 0,
+        "applications": 0,
+        "documents": 0,
+        "comments": 0,
+        "messages": 0,
+        "skipped": 0,
+        "finished": False,
+    }
+    conn = connect(path)
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    archived_ts = int(time.time())
+    statuses = list(DECIDED_STATUSES)
+    try:
+        if dry_run:
+            cursor.execute(f"""
+                SELECT COUNT(*) AS applications,
+                       (SELECT COUNT(*) FROM main.documents WHERE application_id IN (
+                            SELECT id FROM main.applications WHERE status IN {_in(statuses)} AND created_ts < ?
+                       )) AS documents
+                FROM main.applications WHERE status IN {_in(statuses)} AND created_ts < ?
+            """, statuses + [before_ts] + statuses + [before_ts])
+            row = cursor.fetchone()
+            report["applications"], report["documents"] = row["applications"], row["documents"]
+            cursor.execute("SELECT COUNT(*) FROM main.messages WHERE is_read = 1 AND created_ts < ?", (before_ts,))
+            report["messages"] = cursor.fetchone()[0]
+            report["finished"] = True
+            return report
+
+        last = (-1, "")
+        while max_chunks is None or report["chunks"] < max_chunks:
+            cursor.execute(f"""
+                SELECT id, created_ts FROM main.applications
+                WHERE status IN {_in(statuses)} AND created_ts < ? AND (created_ts, id) > (?, ?)
+                ORDER BY created_ts, id LIMIT ?
+            """, statuses + [before_ts, last[0], last[1], chunk_size])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last = (rows[-1]["created_ts"], rows[-1]["id"])
+            counts = _archive_application_chunk(conn, [row["id"] for row in rows], archived_ts)
+            report["chunks"] += 1
+            for key, value in counts.items():
+                report[key] += value
+        else:
+            return report
+
+        while max_chunks is None or report["chunks"] < max_chunks:
+            deleted = _archive_message_chunk(conn, before_ts, chunk_size, archived_ts)
+            if not deleted:
+                break
+            report["chunks"] += 1
+            report["messages"] += deleted
+        else:
+            return report
+        report["finished"] = True
+    finally:
+        conn.close()
+        report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def _exists(path):
+    return os.path.isfile(path or ARCHIVE_DATABASE)
+
+
+def search(query=None, academic_year=None, status=None, limit=200, path=None):
+    if not _exists(path):
+        return []
+    clauses = []
+    params = []
+    if query:
+        clauses.append("(university LIKE ? OR student_name LIKE ? OR student_email LIKE ?)")
+        params.extend([f"%{query}%"] * 3)
+    if academic_year is not None:
+        clauses.append("created_ts >= ? AND created_ts < ?")
+        params.extend([academic_year_start(academic_year), academic_year_start(academic_year + 1)])
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    conn = connect(path)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT a.*, (SELECT COUNT(*) FROM archive.documents d WHERE d.application_id = a.id) AS document_count
+        FROM archive.applications a{where}
+        ORDER BY created_ts DESC LIMIT ?
+    """, params + [limit])
+    apps = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return apps
+
+
+def year_counts(path=None):
+    if not _exists(path):
+        return []
+    conn = connect(path)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT CAST(strftime('%Y', created_ts, 'unixepoch', 'localtime') AS INTEGER)
+               - (CAST(strftime('%m', created_ts, 'unixepoch', 'localtime') AS INTEGER) < {ACADEMIC_YEAR_START_MONTH})
+               AS academic_year,
+               COUNT(*) AS count
+        FROM archive.applications
+        GROUP BY academic_year
+        ORDER BY academic_year DESC
+    """)
+    counts = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return counts
+
+
+def get_application(app_id, path=None):
+    if not _exists(path):
+        return None
+    conn = connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM archive.applications WHERE id = ?", (app_id,))
+    row = cursor.fetchone()
+    application = dict(row) if row else None
+    if application:
+        cursor.execute("SELECT * FROM archive.documents WHERE application_id = ? ORDER BY uploaded_ts", (app_id,))
+        application["documents"] = [dict(doc) for doc in cursor.fetchall()]
+        cursor.execute("""
+            SELECT * FROM archive.application_comments WHERE application_id = ? ORDER BY created_ts
+        """, (app_id,))
+        application["comments"] = [dict(comment) for comment in cursor.fetchall()]
+    conn.close()
+    return application
+
+
+def get_document_by_filename(filename, path=None):
+    if not _exists(path):
+        return None
+    conn = connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM archive.documents WHERE filename = ?", (filename,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def attach_if_exists(conn, path=None):
+    if not _exists(path):
+        return False
+    conn.execute("ATTACH DATABASE ? AS archive", (path or ARCHIVE_DATABASE,))
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'documents'")
+    if cursor.fetchone() is None:
+        conn.execute("DETACH DATABASE archive")
+        return False
+    return True
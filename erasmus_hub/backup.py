@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+import archive
+import database
+import upload_store
+
+DEFAULT_PAGES_PER_STEP = 256
+DEFAULT_PAUSE_MS = 5
+DEFAULT_MAX_RESTARTS = 20
+DB_FILENAME = "erasmus_hub.db"
+ARCHIVE_FILENAME = "erasmus_hub_archive.db"
+UPLOADS_DIRNAME = "uploads"
+MANIFEST_FILENAME = "manifest.json"
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _rate(size, seconds):
+    return round(size / (1024 * 1024) / seconds, 2) if seconds > 0 else None
+
+
+def _copy_pages(source, target, pages, pause_ms, max_restarts, stats):
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats["steps"] += 1
+        stats["pages"] = total
+        # Another connection wrote to the source between steps, so SQLite
+        # started copying from the beginning again.
+        if last_remaining is not None and remaining > last_remaining:
+            stats["restarts"] += 1
+            if stats["restarts"] > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        if pause_ms and remaining:
+            time.sleep(pause_ms / 1000)
+
+    source.backup(target, pages=pages, progress=progress)
+
+
+def backup_database(target_path, pages_per_step=DEFAULT_PAGES_PER_STEP, pause_ms=DEFAULT_PAUSE_MS,
+                    max_restarts=DEFAULT_MAX_RESTARTS, source_path=None):
+    started = time.perf_counter()
+    stats = {"steps": 0, "pages": 0, "restarts": 0, "single_step_fallback": False}
+    tmp_path = target_path + ".partial"
+    source = sqlite3.connect(source_path or database.DATABASE, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Small steps only hold the source read lock briefly; pausing between
+        # them lets queued writers in. Under constant writes the copy keeps
+        # restarting, so it then falls back to one step, which in WAL mode
+        # reads a snapshot without blocking writers.
+        try:
+            _copy_pages(source, target, pages_per_step, pause_ms, max_restarts, stats)
+        except _TooManyRestarts:
+            stats["single_step_fallback"] = True
+            source.backup(target, pages=-1)
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, target_path)
+
+    seconds = time.perf_counter() - started
+    size = os.path.getsize(target_path)
+    return {
+        **stats,
+        "bytes": size,
+        "seconds": round(seconds, 3),
+        "mb_per_second": _rate(size, seconds),
+        "sha256": _sha256(target_path),
+    }
+
+
+def _latest_snapshot(backup_dir, exclude=None):
+    if not os.path.isdir(backup_dir):
+        return None
+    candidates = sorted(
+        name for name in os.listdir(backup_dir)
+        if name != exclude and os.path.isfile(os.path.join(backup_dir, name, MANIFEST_FILENAME))
+    )
+    return os.path.join(backup_dir, candidates[-1]) if candidates else None
+
+
+def load_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILENAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise BackupError(f"{snapshot_dir} is not a backup snapshot")
+
+
+def snapshot_uploads(upload_folder, target_dir, previous_dir=None):
+    started = time.perf_counter()
+    previous = load_manifest(previous_dir)["uploads"]["files"] if previous_dir else {}
+    files = {}
+    stats = {"count": 0, "copied": 0, "linked": 0, "bytes_copied": 0}
+
+    for relative_path in upload_store.iter_files(upload_folder):
+        source = os.path.join(upload_folder, relative_path)
+        target = os.path.join(target_dir, relative_path)
+        try:
+            st = os.stat(source)
+        except FileNotFoundError:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        key = relative_path.replace(os.sep, "/")
+        entry = previous.get(key)
+        stats["count"] += 1
+
+        if entry and entry["size"] == st.st_size and entry["mtime"] == int(st.st_mtime):
+            # Unchanged since the last snapshot: hard-link instead of copying,
+            # so every snapshot is a complete tree but only changes use space.
+            try:
+                os.link(os.path.join(previous_dir, UPLOADS_DIRNAME, key), target)
+                files[key] = entry
+                stats["linked"] += 1
+                continue
+            except OSError:
+                pass
+
+        shutil.copy2(source, target)
+        files[key] = {"size": st.st_size, "mtime": int(st.st_mtime), "sha256": _sha256(target)}
+        stats["copied"] += 1
+        stats["bytes_copied"] += st.st_size
+
+    seconds = time.perf_counter() - started
+    return {
+        **stats,
+        "seconds": round(seconds, 3),
+        "mb_per_second": _rate(stats["bytes_copied"], seconds),
+        "files_manifest": files,
+    }
+
+
+def create_backup(backup_dir, upload_folder=None, pages_per_step=DEFAULT_PAGES_PER_STEP,
+                  pause_ms=DEFAULT_PAUSE_MS):
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    snapshot_dir = os.path.join(backup_dir, name)
+    if os.path.exists(snapshot_dir):
+        raise BackupError(f"{snapshot_dir} already exists")
+    previous_dir = _latest_snapshot(backup_dir)
+    os.makedirs(snapshot_dir)
+
+    manifest = {"created_at": datetime.now().isoformat(), "previous": None, "uploads": None, "archive": None}
+    manifest["database"] = backup_database(
+        os.path.join(snapshot_dir, DB_FILENAME), pages_per_step=pages_per_step, pause_ms=pause_ms
+    )
+    # Archived applications, documents, comments and messages exist only in
+    # the archive database once `flask archive` has moved them there.
+    if os.path.isfile(archive.ARCHIVE_DATABASE):
+        manifest["archive"] = backup_database(
+            os.path.join(snapshot_dir, ARCHIVE_FILENAME), pages_per_step=pages_per_step, pause_ms=pause_ms,
+            source_path=archive.ARCHIVE_DATABASE,
+        )
+    if upload_folder:
+        uploads = snapshot_uploads(
+            upload_folder, os.path.join(snapshot_dir, UPLOADS_DIRNAME), previous_dir=previous_dir
+        )
+        manifest["previous"] = os.path.basename(previous_dir) if previous_dir else None
+        manifest["uploads"] = {key: value for key, value in uploads.items() if key != "files_manifest"}
+        manifest["uploads"]["files"] = uploads["files_manifest"]
+
+    with open(os.path.join(snapshot_dir, MANIFEST_FILENAME + ".partial"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    # The manifest is written last; a snapshot without one is incomplete and ignored.
+    os.replace(os.path.join(snapshot_dir, MANIFEST_FILENAME + ".partial"),
+               os.path.join(snapshot_dir, MANIFEST_FILENAME))
+    return snapshot_dir, manifest
+
+
+def _verify_database(db_path, entry, label, problems):
+    if not os.path.isfile(db_path):
+        problems.append(f"{label} file missing")
+        return
+    if _sha256(db_path) != entry["sha256"]:
+        problems.append(f"{label} checksum mismatch")
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        result = str(e)
+    finally:
+        conn.close()
+    if result != "ok":
+        problems.append(f"{label} integrity_check: {result}")
+
+
+def verify_backup(snapshot_dir, deep=False):
+    manifest = load_manifest(snapshot_dir)
+    problems = []
+    _verify_database(os.path.join(snapshot_dir, DB_FILENAME), manifest["database"], "database", problems)
+    if manifest.get("archive"):
+        _verify_database(os.path.join(snapshot_dir, ARCHIVE_FILENAME), manifest["archive"], "archive database",
+                         problems)
+
+    checked = 0
+    if manifest["uploads"]:
+        for key, entry in manifest["uploads"]["files"].items():
+            path = os.path.join(snapshot_dir, UPLOADS_DIRNAME, key)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                problems.append(f"missing upload {key}")
+                continue
+            if size != entry["size"]:
+                problems.append(f"size mismatch {key}")
+            elif deep and _sha256(path) != entry["sha256"]:
+                problems.append(f"checksum mismatch {key}")
+            checked += 1
+    return {"ok": not problems, "problems": problems, "files_checked": checked}
+
+
+def _restore_database(snapshot_path, live_path):
+    source = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+    target = sqlite3.connect(live_path, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    try:
+        # Writing through the backup API keeps the live file and its WAL consistent.
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def restore_backup(snapshot_dir, upload_folder=None, delete_extra=False):
+    report = verify_backup(snapshot_dir)
+    if not report["ok"]:
+        raise BackupError("snapshot failed verification: " + "; ".join(report["problems"][:5]))
+    manifest = load_manifest(snapshot_dir)
+
+    started = time.perf_counter()
+    _restore_database(os.path.join(snapshot_dir, DB_FILENAME), database.DATABASE)
+    result = {"database_seconds": round(time.perf_counter() - started, 3), "archive_restored": False,
+              "files_restored": 0, "files_deleted": 0}
+    # Snapshots taken before the first archive run have no archive database;
+    # a live one is then left as it is.
+    if manifest.get("archive"):
+        _restore_database(os.path.join(snapshot_dir, ARCHIVE_FILENAME), archive.ARCHIVE_DATABASE)
+        result["archive_restored"] = True
+
+    if upload_folder and manifest["uploads"]:
+        files = manifest["uploads"]["files"]
+        for key, entry in files.items():
+            target_path = os.path.join(upload_folder, key)
+            try:
+                st = os.stat(target_path)
+                if st.st_size == entry["size"] and int(st.st_mtime) == entry["mtime"]:
+                    continue
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            shutil.copy2(os.path.join(snapshot_dir, UPLOADS_DIRNAME, key), target_path)
+            result["files_restored"] += 1
+        if delete_extra:
+            for relative_path in list(upload_store.iter_files(upload_folder)):
+                if relative_path.replace(os.sep, "/") not in files:
+                    os.remove(os.path.join(upload_folder, relative_path))
+                    result["files_deleted"] += 1
+    return result
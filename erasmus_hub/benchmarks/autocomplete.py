@@ -0,0 +1,57 @@
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from university_index import UniversityIndex, fold
+
+WORDS = ["Universität", "Université", "Universidad", "Uniwersytet", "Technische", "Politecnico", "Karlova",
+         "Wien", "Granada", "Warszawski", "Praha", "Brno", "München", "Lisboa", "Bologna", "Kraków", "Zürich"]
+
+
+def random_name(rng):
+    return " ".join(rng.sample(WORDS, 2) + ["".join(rng.choices(string.ascii_letters, k=6))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure university autocomplete lookup latency.")
+    parser.add_argument("--names", type=int, default=20000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = UniversityIndex()
+    started = time.perf_counter()
+    for _ in range(args.names):
+        index._add(random_name(rng), count=rng.randint(1, 50))
+    build = time.perf_counter() - started
+
+    queries = []
+    for _ in range(args.lookups):
+        word = fold(rng.choice(WORDS))
+        queries.append(word[:rng.randint(1, len(word))])
+
+    print(f"names={len(index.names)} entries={len(index.entries)} build_seconds={build:.3f}")
+    # "cold" empties the per-prefix cache before every lookup, as after a refresh.
+    for label, cold in (("lookup_ms", False), ("cold_lookup_ms", True)):
+        timings = []
+        for query in queries:
+            if cold:
+                index.cache.clear()
+            t0 = time.perf_counter()
+            index.suggest(query, limit=args.limit)
+            timings.append(time.perf_counter() - t0)
+        timings.sort()
+        print(f"{label} p50={statistics.median(timings) * 1000:.4f} "
+              f"p99={timings[int(len(timings) * 0.99)] * 1000:.4f} max={timings[-1] * 1000:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCUMENT_KEYS = ["cv", "motivation", "grades", "plan", "language", "passport", "other"]
+UUID_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+APPLICATION_LINK_RE = re.compile(r"/admin/applications/(" + UUID_RE.pattern + r")\"")
+
+
+class HttpClient:
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.cookies = {}
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+    async def _read_body(self, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    await self.reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+        if "content-length" in headers:
+            return await self.reader.readexactly(int(headers["content-length"]))
+        return await self.reader.read()
+
+    async def _exchange(self, method, path, body, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive",
+                 f"Content-Length: {len(body)}"]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        lines.extend(f"{k}: {v}" for k, v in headers.items())
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+        response_headers = {}
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            name, value = line.split(":", 1)
+            name = name.strip().lower()
+            if name == "set-cookie":
+                cookie_name, cookie_value = value.strip().split(";", 1)[0].split("=", 1)
+                if cookie_value:
+                    self.cookies[cookie_name] = cookie_value
+                else:
+                    self.cookies.pop(cookie_name, None)
+            response_headers[name] = value.strip()
+        response_body = await self._read_body(response_headers)
+        if version == "HTTP/1.0" or response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return int(status), response_headers, response_body
+
+    async def request(self, method, path, body=b"", headers=None):
+        for attempt in range(2):
+            try:
+                return await asyncio.wait_for(self._exchange(method, path, body, headers or {}), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+
+
+def route_name(method, path):
+    return f"{method} {UUID_RE.sub('<id>', path.split('?', 1)[0])}"
+
+
+def encode_multipart(fields, files):
+    boundary = f"----erasmusloadtest{random.getrandbits(64):016x}"
+    parts = []
+    for name, value in fields.items():
+        parts.append(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode())
+    for name, (filename, content) in files.items():
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: application/pdf\r\n\r\n".encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Recorder:
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.journey_errors = {}
+
+    def record(self, route, seconds, ok):
+        self.samples.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def journey_error(self, kind):
+        self.journey_errors[kind] = self.journey_errors.get(kind, 0) + 1
+
+
+class VirtualUser:
+
+    def __init__(self, args, recorder, email, password, role):
+        url = urlsplit(args.base_url)
+        self.client = HttpClient(url.hostname, url.port or 80, args.timeout)
+        self.args = args
+        self.recorder = recorder
+        self.email = email
+        self.password = password
+        self.role = role
+
+    async def call(self, method, path, body=b"", content_type=None, follow=True):
+        headers = {"Content-Type": content_type} if content_type else {}
+        started = time.perf_counter()
+        try:
+            status, headers, response = await self.client.request(method, path, body, headers)
+        except Exception:
+            self.recorder.record(route_name(method, path), time.perf_counter() - started, False)
+            raise
+        self.recorder.record(route_name(method, path), time.perf_counter() - started, status < 400)
+        if follow and status in (301, 302, 303) and "location" in headers:
+            location = urlsplit(headers["location"])
+            target = location.path + (f"?{location.query}" if location.query else "")
+            return await self.call("GET", target, follow=False)
+        return status, headers, response
+
+    async def form(self, path, data, follow=True):
+        return await self.call("POST", path, urlencode(data).encode(), "application/x-www-form-urlencoded", follow)
+
+    async def think(self):
+        if self.args.think_time:
+            await asyncio.sleep(random.uniform(0, 2 * self.args.think_time))
+
+    async def login(self):
+        await self.call("GET", "/login")
+        status, headers, _ = await self.form(
+            "/login", {"email": self.email, "password": self.password, "role": self.role}, follow=False
+        )
+        if status == 302 and "/login" not in headers.get("location", ""):
+            await self.call("GET", urlsplit(headers["location"]).path)
+            return True
+        return False
+
+    async def ensure_account(self):
+        if await self.login():
+            return True
+        status, _, _ = await self.form("/register", {
+            "full_name": f"Load Test {self.email.split('@')[0]}",
+            "role": self.role,
+            "email": self.email,
+            "password": self.password,
+            "password2": self.password,
+            "faculty": random.choice(["FRI", "FEI", "FHV", "FPEDAS"]),
+        }, follow=True)
+        return status < 400 and bool(self.client.cookies)
+
+    async def student_journey(self, deadline):
+        if not await self.ensure_account():
+            self.recorder.journey_error("student_login_failed")
+            return
+        while time.monotonic() < deadline:
+            await self.call("GET", "/application")
+            await self.think()
+            files = {
+                f"doc_{key}": (f"{key}.pdf", os.urandom(self.args.upload_size))
+                for key in DOCUMENT_KEYS
+            }
+            body, content_type = encode_multipart(
+                {"destination": random.choice(self.args.universities), "mobility_type": "Štúdium"}, files
+            )
+            status, _, _ = await self.call("POST", "/application", body, content_type)
+            if status >= 400:
+                self.recorder.journey_error("application_failed")
+            for _ in range(self.args.polls):
+                if time.monotonic() >= deadline:
+                    return
+                await self.think()
+                await self.call("GET", "/student")
+
+    async def admin_journey(self, deadline):
+        if not await self.login():
+            self.recorder.journey_error("admin_login_failed")
+            return
+        while time.monotonic() < deadline:
+            for tab in ("home", "students", "announcements"):
+                await self.call("GET", f"/admin?tab={tab}")
+                await self.think()
+            _, _, page = await self.call("GET", "/admin?tab=applications&status=Podan%C3%A1")
+            pending = APPLICATION_LINK_RE.findall(page.decode("utf-8", "replace"))
+            if not pending:
+                await self.think()
+                continue
+            app_id = random.choice(pending[:10])
+            await self.call("GET", f"/admin/applications/{app_id}")
+            await self.think()
+            await self.form(f"/admin/applications/{app_id}/approve", {})
+
+    async def run(self, delay, deadline):
+        await asyncio.sleep(delay)
+        try:
+            if self.role == "student":
+                await self.student_journey(deadline)
+            else:
+                await self.admin_journey(deadline)
+        except Exception as e:
+            self.recorder.journey_error(type(e).__name__)
+        finally:
+            await self.client.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    total = errors = 0
+    for route, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        route_errors = recorder.errors.get(route, 0)
+        total += len(ordered)
+        errors += route_errors
+        routes[route] = {
+            "requests": len(ordered),
+            "errors": route_errors,
+            "error_rate": route_errors / len(ordered),
+            "throughput": len(ordered) / elapsed,
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+    return {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "errors": errors,
+        "error_rate": errors / total if total else 0.0,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "journey_errors": recorder.journey_errors,
+        "routes": routes,
+    }
+
+
+def print_summary(summary):
+    print(f"{'route':<45} {'req':>7} {'err%':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in summary["routes"].items():
+        print(f"{route:<45} {stats['requests']:>7} {stats['error_rate'] * 100:>5.1f}% {stats['throughput']:>8.1f} "
+              f"{stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms")
+    print(f"total: {summary['requests']} requests in {summary['elapsed_s']:.1f}s, "
+          f"{summary['throughput']:.1f} req/s, error rate {summary['error_rate'] * 100:.2f}%")
+    if summary["journey_errors"]:
+        print(f"journey errors: {summary['journey_errors']}")
+
+
+def print_comparison(summary, baseline):
+    print(f"\ncompared with baseline from {baseline.get('started_at', '?')}:")
+    print(f"{'route':<45} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+    for route, stats in summary["routes"].items():
+        before = baseline["summary"]["routes"].get(route)
+        if not before:
+            print(f"{route:<45} {'-':>11} {stats['p95_ms']:>7.1f}ms {'new':>8}")
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        print(f"{route:<45} {before['p95_ms']:>9.1f}ms {stats['p95_ms']:>7.1f}ms {change:>+7.1f}%")
+    before_rps = baseline["summary"]["throughput"]
+    print(f"throughput: {before_rps:.1f} -> {summary['throughput']:.1f} req/s")
+
+
+def wait_for_port(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+async def run_load(args):
+    recorder = Recorder()
+    users = [
+        VirtualUser(args, recorder, f"loadtest{i}@example.com", args.student_password, "student")
+        for i in range(args.students)
+    ] + [
+        VirtualUser(args, recorder, args.admin_email, args.admin_password, "admin")
+        for _ in range(args.admins)
+    ]
+    started = time.monotonic()
+    deadline = started + args.ramp_up + args.duration
+    step = args.ramp_up / len(users) if users else 0
+    await asyncio.gather(*(user.run(i * step, deadline) for i, user in enumerate(users)))
+    return recorder, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scenario-based load test for a running Erasmus Hub")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--server-cmd", help="command that starts the app, run from the app directory, "
+                                             "e.g. \"gunicorn -w 4 -b 127.0.0.1:5000 app:app\"")
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=60, help="seconds after ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=10)
+    parser.add_argument("--polls", type=int, default=10, help="dashboard refreshes after each application")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between steps in seconds")
+    parser.add_argument("--upload-size", type=int, default=200 * 1024, help="bytes per uploaded document")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--student-password", default="loadtest")
+    parser.add_argument("--admin-email", default="admin@example.com")
+    parser.add_argument("--admin-password", default="admin")
+    parser.add_argument("--universities", nargs="+",
+                        default=["Universidad de Granada", "TU Wien", "Uniwersytet Warszawski", "Universität Wien"])
+    parser.add_argument("--output", default=f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json")
+    parser.add_argument("--compare", help="results file of a previous run")
+    args = parser.parse_args()
+
+    url = urlsplit(args.base_url)
+    server = None
+    if args.server_cmd:
+        server = subprocess.Popen(shlex.split(args.server_cmd), cwd=APP_DIR)
+        if not wait_for_port(url.hostname, url.port or 80, 30):
+            server.terminate()
+            sys.exit("server did not start listening within 30 s")
+
+    try:
+        started_at = datetime.now().isoformat(timespec="seconds")
+        recorder, elapsed = asyncio.run(run_load(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = summarize(recorder, elapsed)
+    print_summary(summary)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"started_at": started_at, "config": vars(args), "summary": summary}, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(summary, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+SCENARIOS = ["cold", "cached", "warmup"]
+ROUTES = [
+    ("student", "/student"),
+    ("student", "/student/announcements"),
+    ("student", "/application"),
+    ("admin", "/admin?tab=home"),
+    ("admin", "/admin?tab=applications"),
+    ("admin", "/admin/statistics"),
+    (None, "/login"),
+]
+USERS = {
+    "student": {"email": "student@example.com", "role": "student", "name": "Ján Študent"},
+    "admin": {"email": "admin@example.com", "role": "admin", "name": "Admin"},
+}
+
+
+def boot_worker(workdir, cache_dir, warm, results):
+    started = time.perf_counter()
+    os.chdir(workdir)
+    os.environ["ERASMUS_JINJA_CACHE_DIR"] = cache_dir
+    os.environ["ERASMUS_WARMUP"] = "1" if warm else "0"
+
+    import database
+    database.DATABASE = os.path.join(workdir, "boot.db")
+    from app import app
+    imported = time.perf_counter()
+
+    client = app.test_client()
+    first = {}
+    second = {}
+    for role, path in ROUTES:
+        with client.session_transaction() as sess:
+            sess.clear()
+            if role:
+                sess["user"] = USERS[role]
+        for timings in (first, second):
+            t0 = time.perf_counter()
+            client.get(path)
+            timings[path] = time.perf_counter() - t0
+    ready = time.perf_counter()
+    results.put({
+        "import": imported - started,
+        "first": first,
+        "second": second,
+        "ready": ready - started,
+    })
+
+
+def run_scenario(scenario, workdir, cache_dir, context):
+    if scenario == "cold":
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    results = context.Queue()
+    process = context.Process(target=boot_worker, args=(workdir, cache_dir, scenario == "warmup", results))
+    process.start()
+    report = results.get()
+    process.join()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker boot-to-first-fast-response benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="boots per scenario")
+    parser.add_argument("--db", default=None, help="database to copy, defaults to a fresh one")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = os.path.join(tmp, "worker")
+        cache_dir = os.path.join(tmp, "jinja_cache")
+        os.makedirs(os.path.join(workdir, "static", "uploads"))
+        if args.db:
+            shutil.copy(args.db, os.path.join(workdir, "boot.db"))
+
+        for scenario in SCENARIOS:
+            if scenario != "cold":
+                # Prime the shared cache, like the first worker of a deploy.
+                run_scenario("cached", workdir, cache_dir, context)
+            reports = []
+            for _ in range(args.repeat):
+                reports.append(run_scenario(scenario, workdir, cache_dir, context))
+            ready = sorted(report["ready"] for report in reports)[len(reports) // 2]
+            imported = sorted(report["import"] for report in reports)[len(reports) // 2]
+            print(f"{scenario:<7} import={imported * 1000:.1f}ms boot_to_ready={ready * 1000:.1f}ms")
+            for _, path in ROUTES:
+                first = sorted(report["first"][path] for report in reports)[len(reports) // 2]
+                second = sorted(report["second"][path] for report in reports)[len(reports) // 2]
+                print(f"    {path:<28} first={first * 1000:7.2f}ms second={second * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
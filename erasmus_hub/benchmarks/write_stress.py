@@ -0,0 +1,108 @@
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+def configure(args, db_path):
+    database.DATABASE = db_path
+    database.SINGLE_WRITER = args.single_writer
+    if args.busy_timeout is not None:
+        database.BUSY_TIMEOUT_MS = args.busy_timeout
+
+
+def worker_process(args, db_path, app_id, results):
+    configure(args, db_path)
+    from models import Application, Comment, Document
+
+    doc_id = Document.get_by_application(app_id)[0]["id"]
+    errors = {"locked": 0, "other": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.writers)
+
+    def writer(n):
+        barrier.wait()
+        for i in range(args.writes):
+            try:
+                if i % 10 == 0:
+                    Document.update_status(doc_id, "V preverovaní" if i % 20 else "Odoslaný")
+                elif i % 10 == 5:
+                    Application.approve(app_id, "admin@example.com")
+                else:
+                    Comment.create(app_id, "admin@example.com", "Stress", f"writer {n} comment {i}")
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors["locked" if "locked" in str(e) else "other"] += 1
+            except Exception:
+                with lock:
+                    errors["other"] += 1
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent write stress test for database.py")
+    parser.add_argument("--writers", type=int, default=50, help="writer threads per process")
+    parser.add_argument("--writes", type=int, default=40, help="writes per thread")
+    parser.add_argument("--processes", type=int, default=1, help="processes, like gunicorn workers")
+    parser.add_argument("--single-writer", action="store_true")
+    parser.add_argument("--journal", choices=["wal", "delete"], default="wal")
+    parser.add_argument("--busy-timeout", type=int, default=None, help="busy timeout in ms")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "stress.db")
+        configure(args, db_path)
+        database.init_db()
+        if args.journal == "delete":
+            conn = sqlite3.connect(db_path)
+            conn.execute("PRAGMA journal_mode = DELETE")
+            conn.close()
+
+        from models import Application
+        app_id = Application.create(
+            "student@example.com", "Ján Študent", "Stress University", "Štúdium",
+            [{"key": "cv", "label": "Životopis", "filename": "stress.pdf"}],
+        )
+        database._writer = None
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker_process, args=(args, db_path, app_id, results))
+            for _ in range(args.processes)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        errors = {"locked": 0, "other": 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                errors[key] += value
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        total = args.processes * args.writers * args.writes
+        succeeded = total - errors["locked"] - errors["other"]
+        print(f"journal={args.journal} single_writer={args.single_writer} "
+              f"processes={args.processes} writers={args.writers} writes={args.writes}")
+        print(f"elapsed={elapsed:.2f}s ok={succeeded}/{total} throughput={succeeded / elapsed:.0f} writes/s "
+              f"locked_errors={errors['locked']} other_errors={errors['other']}")
+        return 1 if errors["locked"] or errors["other"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+import logging
+import sqlite3
+import threading
+import time
+
+from database import get_db, run_write
+from models import Application, User
+import upload_store
+
+DEFAULT_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 500
+DEFAULT_PAUSE_MS = 200
+# A running job whose worker has not reported for this long is treated as
+# dead (the process was restarted) and may be resumed.
+DEFAULT_STALE_SECONDS = 120
+KINDS = ("users", "applications")
+
+logger = logging.getLogger(__name__)
+
+_batch_size = DEFAULT_BATCH_SIZE
+_pause_ms = DEFAULT_PAUSE_MS
+_stale_seconds = DEFAULT_STALE_SECONDS
+_upload_folder = "uploads"
+
+
+def _placeholders(values):
+    return ", ".join("?" for _ in values)
+
+
+def find_users(emails, exclude=None):
+    emails = sorted({email.strip() for email in emails if email.strip()} - {exclude})
+    if not emails:
+        return []
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT email FROM users WHERE email IN ({_placeholders(emails)}) ORDER BY email", emails)
+    found = [row["email"] for row in cursor.fetchall()]
+    conn.close()
+    return found
+
+
+def find_applications(status=None, created_before_ts=None):
+    clauses, params = [], []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if created_before_ts is not None:
+        clauses.append("created_ts < ?")
+        params.append(created_before_ts)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id FROM applications{where} ORDER BY id", params)
+    found = [row["id"] for row in cursor.fetchall()]
+    conn.close()
+    return found
+
+
+def create(kind, targets, created_by, description=None):
+    if kind not in KINDS:
+        raise ValueError(f"unknown deletion kind: {kind}")
+    targets = sorted(set(targets))
+
+    # The targets are fixed when the job is created, so a resumed job deletes
+    # exactly what was asked for even if the filter would now match more.
+    def write(cursor):
+        cursor.execute("""
+            INSERT INTO deletion_jobs (kind, description, created_by, total, created_ts)
+            VALUES (?, ?, ?, ?, ?)
+        """, (kind, description, created_by, len(targets), int(time.time())))
+        job_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO deletion_job_items (job_id, target) VALUES (?, ?)",
+                           [(job_id, target) for target in targets])
+        return job_id
+
+    return run_write(write)
+
+
+def _with_progress(job, now):
+    job = dict(job)
+    finished = job["items_done"] + job["items_failed"]
+    job["percent"] = int(finished * 100 / job["total"]) if job["total"] else 100
+    job["stale"] = job["status"] == "running" and (job["heartbeat_ts"] or 0) < now - _stale_seconds
+    job["resumable"] = job["status"] in ("pending", "failed") or job["stale"]
+    return job
+
+
+def get(job_id):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM deletion_jobs WHERE id = ?", (job_id,))
+    job = cursor.fetchone()
+    conn.close()
+    return _with_progress(job, int(time.time())) if job else None
+
+
+def list_jobs(limit=20):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT j.*, u.name AS created_by_name
+        FROM deletion_jobs j
+        LEFT JOIN users u ON u.email = j.created_by
+        ORDER BY j.id DESC LIMIT ?
+    """, (limit,))
+    now = int(time.time())
+    jobs = [_with_progress(row, now) for row in cursor.fetchall()]
+    conn.close()
+    return jobs
+
+
+def resumable_ids():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id FROM deletion_jobs
+        WHERE status IN ('pending', 'failed') OR (status = 'running' AND heartbeat_ts < ?)
+        ORDER BY id
+    """, (int(time.time()) - _stale_seconds,))
+    ids = [row["id"] for row in cursor.fetchall()]
+    conn.close()
+    return ids
+
+
+def _claim(job_id):
+    now = int(time.time())
+
+    def write(cursor):
+        cursor.execute("""
+            UPDATE deletion_jobs
+            SET status = 'running', started_ts = COALESCE(started_ts, ?), heartbeat_ts = ?, last_error = NULL
+            WHERE id = ? AND (status IN ('pending', 'failed') OR (status = 'running' AND heartbeat_ts < ?))
+        """, (now, now, job_id, now - _stale_seconds))
+        return cursor.rowcount
+
+    return run_write(write)
+
+
+def _next_items(job_id, after, limit):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT target FROM deletion_job_items
+        WHERE job_id = ? AND target > ? AND state = 'pending'
+        ORDER BY target LIMIT ?
+    """, (job_id, after, limit))
+    targets = [row["target"] for row in cursor.fetchall()]
+    conn.close()
+    return targets
+
+
+def _student_applications(emails, limit):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id FROM applications WHERE student_email IN ({_placeholders(emails)}) LIMIT ?",
+                   [*emails, limit])
+    ids = [row["id"] for row in cursor.fetchall()]
+    conn.close()
+    return ids
+
+
+def _kept_admins(emails):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT email FROM users WHERE role = 'admin' AND email IN ({_placeholders(emails)})", emails)
+    admins = [row["email"] for row in cursor.fetchall()]
+    kept = {email for email in admins if any(User.authored_counts(email, cursor).values())}
+    conn.close()
+    return kept
+
+
+def _delete_batch(job_id, upload_folder, app_ids=(), users=(), items_done=()):
+    def write(cursor):
+        cursor.execute("UPDATE deletion_jobs SET heartbeat_ts = ? WHERE id = ?", (int(time.time()), job_id))
+        filenames, applications, documents, failed = [], 0, 0, []
+        if app_ids:
+            marks = _placeholders(app_ids)
+            cursor.execute(f"SELECT filename FROM documents WHERE application_id IN ({marks})", app_ids)
+            filenames = [row["filename"] for row in cursor.fetchall()]
+            documents = len(filenames)
+            cursor.execute(f"SELECT COUNT(*) FROM applications WHERE id IN ({marks})", app_ids)
+            applications = cursor.fetchone()[0]
+            for app_id in app_ids:
+                Application._delete(cursor, app_id)
+            if filenames:
+                # Never unlink a file some surviving document still points at.
+                cursor.execute(f"SELECT filename FROM documents WHERE filename IN ({_placeholders(filenames)})",
+                               filenames)
+                kept = {row["filename"] for row in cursor.fetchall()}
+                filenames = [name for name in filenames if name not in kept]
+        for email in users:
+            # Same rules as deleting a single user: a student goes with their
+            # messages and comments, an admin who wrote for others is kept.
+            # A failure stays with its user without undoing the rest of the batch.
+            cursor.execute("SAVEPOINT bulk_delete_user")
+            try:
+                if not User._delete(cursor, email):
+                    failed.append((email, "Správca je autorom komentárov k cudzím prihláškam, oznámení alebo správ."))
+            except sqlite3.IntegrityError as e:
+                cursor.execute("ROLLBACK TO bulk_delete_user")
+                failed.append((email, str(e)))
+            cursor.execute("RELEASE bulk_delete_user")
+        failed_targets = {email for email, _ in failed}
+        done = [target for target in [*items_done, *users] if target not in failed_targets]
+        cursor.executemany("UPDATE deletion_job_items SET state = 'done' WHERE job_id = ? AND target = ?",
+                           [(job_id, target) for target in done])
+        cursor.executemany("""
+            UPDATE deletion_job_items SET state = 'failed', error = ? WHERE job_id = ? AND target = ?
+        """, [(error, job_id, email) for email, error in failed])
+        cursor.execute("""
+            UPDATE deletion_jobs
+            SET items_done = items_done + ?, items_failed = items_failed + ?,
+                applications_deleted = applications_deleted + ?, documents_deleted = documents_deleted + ?
+            WHERE id = ?
+        """, (len(done), len(failed), applications, documents, job_id))
+        return filenames
+
+    # Files go only after the commit; if the process dies in between, the
+    # orphans are left for gc-uploads rather than deleting files of rows that
+    # were rolled back.
+    filenames = run_write(write)
+    removed = sum(1 for name in filenames if upload_store.remove(upload_folder, name))
+    if removed:
+        run_write(lambda cursor: cursor.execute(
+            "UPDATE deletion_jobs SET files_removed = files_removed + ? WHERE id = ?", (removed, job_id)))
+
+
+def _run_users(job_id, upload_folder, batch_size, pause):
+    after = ""
+    while True:
+        emails = _next_items(job_id, after, batch_size)
+        if not emails:
+            return
+        after = emails[-1]
+        # Admins that have to be kept are reported as failed by the user
+        # delete below; applications are only drained for the rest.
+        kept = _kept_admins(emails)
+        deletable = [email for email in emails if email not in kept]
+        while deletable:
+            app_ids = _student_applications(deletable, batch_size)
+            if not app_ids:
+                break
+            _delete_batch(job_id, upload_folder, app_ids=app_ids)
+            time.sleep(pause)
+        _delete_batch(job_id, upload_folder, users=emails)
+        time.sleep(pause)
+
+
+def _run_applications(job_id, upload_folder, batch_size, pause):
+    after = ""
+    while True:
+        app_ids = _next_items(job_id, after, batch_size)
+        if not app_ids:
+            return
+        after = app_ids[-1]
+        _delete_batch(job_id, upload_folder, app_ids=app_ids, items_done=app_ids)
+        time.sleep(pause)
+
+
+def run(job_id, upload_folder=None, batch_size=None, pause_ms=None):
+    # Every batch marks its items done in the same transaction that deletes
+    # them, so an interrupted job resumes with the first item still pending.
+    if not _claim(job_id):
+        return None
+    job = get(job_id)
+    upload_folder = upload_folder or _upload_folder
+    batch_size = min(batch_size or _batch_size, MAX_BATCH_SIZE)
+    pause = (_pause_ms if pause_ms is None else pause_ms) / 1000
+    worker = _run_users if job["kind"] == "users" else _run_applications
+    try:
+        worker(job_id, upload_folder, batch_size, pause)
+    except Exception as e:
+        logger.exception("deletion job %s failed", job_id)
+        run_write(lambda cursor: cursor.execute("""
+            UPDATE deletion_jobs SET status = 'failed', last_error = ? WHERE id = ?
+        """, (str(e), job_id)))
+    else:
+        now = int(time.time())
+        run_write(lambda cursor: cursor.execute("""
+            UPDATE deletion_jobs SET status = 'done', heartbeat_ts = ?, finished_ts = ? WHERE id = ?
+        """, (now, now, job_id)))
+    return get(job_id)
+
+
+def start(job_id):
+    thread = threading.Thread(target=run, args=(job_id,), name=f"bulk-delete-{job_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_app(app):
+    global _batch_size, _pause_ms, _stale_seconds, _upload_folder
+    app.config.setdefault("BULK_DELETE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    app.config.setdefault("BULK_DELETE_PAUSE_MS", DEFAULT_PAUSE_MS)
+    app.config.setdefault("BULK_DELETE_STALE_SECONDS", DEFAULT_STALE_SECONDS)
+    _batch_size = app.config["BULK_DELETE_BATCH_SIZE"]
+    _pause_ms = app.config["BULK_DELETE_PAUSE_MS"]
+    _stale_seconds = app.config["BULK_DELETE_STALE_SECONDS"]
+    _upload_folder = app.config["UPLOAD_FOLDER"]
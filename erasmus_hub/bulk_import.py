@@ -0,0 +1,257 @@
+import csv
+import hashlib
+import io
+import os
+import re
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from database import get_db, run_write, to_epoch
+import change_feed
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+DEFAULT_CHUNK_SIZE = 500
+# Uploads through the web form are hashed on the request thread, so they are
+# kept to about one chunk; larger files go through the CLI command.
+DEFAULT_WEB_MAX_ROWS = 500
+MIN_PASSWORD_LENGTH = 4
+REPORT_FIELDS = ["row", "email", "status", "error", "initial_password"]
+COLUMN_ALIASES = {"full_name": "name", "meno": "name", "e-mail": "email", "fakulta": "faculty", "heslo": "password"}
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def _normalize_header(header):
+    key = (header or "").strip().lower()
+    return COLUMN_ALIASES.get(key, key)
+
+
+def _read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        header = [_normalize_header(h) for h in next(reader, [])]
+        for number, values in enumerate(reader, start=2):
+            if any(value.strip() for value in values):
+                yield number, dict(zip(header, values))
+
+
+def _read_xlsx(path):
+    if openpyxl is None:
+        raise ImportFileError("Na import súborov XLSX je potrebný balík openpyxl.")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [_normalize_header(str(h) if h is not None else "") for h in next(rows, ())]
+        for number, values in enumerate(rows, start=2):
+            values = ["" if value is None else str(value) for value in values]
+            if any(value.strip() for value in values):
+                yield number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".xlsx":
+        return _read_xlsx(path)
+    if extension in (".csv", ".txt"):
+        return _read_csv(path)
+    raise ImportFileError("Podporované sú len súbory CSV a XLSX.")
+
+
+def file_id(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def validate(row, seen):
+    email = (row.get("email") or "").strip().lower()
+    name = (row.get("name") or "").strip()
+    faculty = (row.get("faculty") or "").strip() or None
+    password = row.get("password") or ""
+    if not email:
+        return None, "Chýba e‑mail."
+    if not _EMAIL_RE.match(email):
+        return None, "Neplatný e‑mail."
+    if not name:
+        return None, "Chýba meno."
+    if password and len(password) < MIN_PASSWORD_LENGTH:
+        return None, f"Heslo musí mať aspoň {MIN_PASSWORD_LENGTH} znaky."
+    if email in seen:
+        return None, "E‑mail sa v súbore opakuje."
+    seen.add(email)
+    return {"email": email, "name": name, "faculty": faculty, "password": password}, None
+
+
+def get_state(import_id):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM user_import_state WHERE id = ?", (import_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def _existing_emails(emails):
+    if not emails:
+        return set()
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"SELECT email FROM users WHERE email IN ({', '.join('?' for _ in emails)})", list(emails)
+    )
+    existing = {row["email"] for row in cursor.fetchall()}
+    conn.close()
+    return existing
+
+
+def _sync(report_file):
+    report_file.flush()
+    try:
+        os.fsync(report_file.fileno())
+    except (AttributeError, io.UnsupportedOperation):
+        pass
+
+
+def import_users(path, report_file, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, restart=False, filename=None,
+                 max_rows=None):
+    if max_rows is not None and sum(1 for _ in read_rows(path)) > max_rows:
+        raise ImportFileError(
+            f"Súbor má viac ako {max_rows} riadkov. Väčší import spustite príkazom flask import-users."
+        )
+    import_id = file_id(path)
+    state = get_state(import_id)
+    if state and state["finished_at"] and not restart:
+        return {**state, "resumed": False, "already_finished": True}
+    if state is None or restart:
+        now = datetime.now()
+        run_write(lambda cursor: cursor.execute("""
+            INSERT OR REPLACE INTO user_import_state
+                (id, filename, rows_processed, users_created, rows_failed, started_at, finished_at)
+            VALUES (?, ?, 0, 0, 0, ?, NULL)
+        """, (import_id, filename or os.path.basename(path), now.isoformat())))
+        state = get_state(import_id)
+        resumed = False
+    else:
+        resumed = True
+
+    writer = csv.DictWriter(report_file, fieldnames=REPORT_FIELDS)
+    # A resumed import appends to the report of the earlier runs.
+    if report_file.tell() == 0:
+        writer.writeheader()
+    summary = {"rows": 0, "created": 0, "failed": 0}
+    seen = set()
+    pending = []
+    report_rows = []
+
+    def flush(last_row):
+        existing = _existing_emails([record["email"] for _, record in pending])
+        to_insert = []
+        for number, record in pending:
+            if record["email"] in existing:
+                report_rows.append({"row": number, "email": record["email"], "status": "chyba",
+                                    "error": "Používateľ s týmto e‑mailom už existuje."})
+            else:
+                to_insert.append((number, record))
+
+        generated = {}
+        for number, record in to_insert:
+            if not record["password"]:
+                record["password"] = generated[number] = secrets.token_urlsafe(9)
+        hashes = list(executor.map(generate_password_hash, [record["password"] for _, record in to_insert],
+                                   chunksize=max(1, len(to_insert) // (4 * (workers or os.cpu_count() or 1)))))
+        created_ts = to_epoch(datetime.now())
+        failed = sum(1 for row in report_rows if row["status"] == "chyba")
+        # Generated passwords reach the disk before the users are committed;
+        # the row that follows the insert says whether the account exists.
+        for number, record in to_insert:
+            if number in generated:
+                writer.writerow({"row": number, "email": record["email"], "status": "čaká",
+                                 "initial_password": generated[number]})
+        _sync(report_file)
+
+        def write(cursor):
+            # Someone may register one of these e-mails between the check and
+            # the insert, so only rows that actually went in are reported and
+            # recorded as created.
+            inserted = []
+            for (number, record), password_hash in zip(to_insert, hashes):
+                cursor.execute("""
+                    INSERT INTO users (email, password, role, name, faculty, created_ts)
+                    VALUES (?, ?, 'student', ?, ?, ?)
+                    ON CONFLICT(email) DO NOTHING
+                    RETURNING email
+                """, (record["email"], password_hash, record["name"], record["faculty"], created_ts))
+                if cursor.fetchone() is not None:
+                    inserted.append((number, record))
+            change_feed.record_many(cursor, "user", "create", [
+                (record["email"], {"email": record["email"], "role": "student", "name": record["name"],
+                                   "faculty": record["faculty"]})
+                for _, record in inserted
+            ])
+            cursor.execute("""
+                UPDATE user_import_state
+                SET rows_processed = ?, users_created = users_created + ?, rows_failed = rows_failed + ?
+                WHERE id = ?
+            """, (last_row, len(inserted), failed + len(to_insert) - len(inserted), import_id))
+            return inserted
+
+        inserted = run_write(write) if to_insert or report_rows else []
+        created = {number for number, _ in inserted}
+        for number, record in to_insert:
+            if number in created:
+                report_rows.append({"row": number, "email": record["email"], "status": "vytvorený",
+                                    "initial_password": generated.get(number, "")})
+            else:
+                report_rows.append({"row": number, "email": record["email"], "status": "chyba",
+                                    "error": "Používateľ s týmto e‑mailom už existuje."})
+        report_rows.sort(key=lambda row: row["row"])
+        for row in report_rows:
+            writer.writerow(row)
+        _sync(report_file)
+        summary["created"] += len(inserted)
+        summary["failed"] += failed + len(to_insert) - len(inserted)
+        pending.clear()
+        report_rows.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        last_row = state["rows_processed"]
+        for number, row in read_rows(path):
+            if number <= state["rows_processed"]:
+                continue
+            summary["rows"] += 1
+            last_row = number
+            record, error = validate(row, seen)
+            if error:
+                report_rows.append({"row": number, "email": (row.get("email") or "").strip(),
+                                    "status": "chyba", "error": error})
+            else:
+                pending.append((number, record))
+            if len(pending) + len(report_rows) >= chunk_size:
+                flush(last_row)
+        flush(last_row)
+
+    run_write(lambda cursor: cursor.execute(
+        "UPDATE user_import_state SET finished_at = ? WHERE id = ?", (datetime.now().isoformat(), import_id)
+    ))
+    return {**get_state(import_id), **summary, "resumed": resumed, "already_finished": False}
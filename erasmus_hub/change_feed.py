@@ -0,0 +1,78 @@
+import json
+import time
+
+from database import get_db, run_write
+
+DEFAULT_READ_LIMIT = 500
+MAX_READ_LIMIT = 5000
+DEFAULT_POLL_SECONDS = 1.0
+
+
+def record(cursor, entity, entity_id, action, data=None):
+    # Must be called with the cursor of the write it describes, so the event
+    # commits or rolls back together with the change. SQLite has a single
+    # writer, so sequence numbers become visible in order and a reader that
+    # tails by seq never misses an event that commits later.
+    cursor.execute("""
+        INSERT INTO change_events (entity, entity_id, action, data, created_ts)
+        VALUES (?, ?, ?, ?, ?)
+    """, (entity, str(entity_id), action, json.dumps(data or {}, ensure_ascii=False, default=str), int(time.time())))
+
+
+def record_many(cursor, entity, action, events):
+    now = int(time.time())
+    cursor.executemany("""
+        INSERT INTO change_events (entity, entity_id, action, data, created_ts)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(entity, str(entity_id), action, json.dumps(data or {}, ensure_ascii=False, default=str), now)
+          for entity_id, data in events])
+
+
+def read(after_seq=0, limit=DEFAULT_READ_LIMIT, entities=None):
+    clauses = ["seq > ?"]
+    params = [after_seq]
+    if entities:
+        clauses.append(f"entity IN ({', '.join('?' for _ in entities)})")
+        params.extend(entities)
+    params.append(min(limit, MAX_READ_LIMIT))
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT seq, entity, entity_id, action, data, created_ts FROM change_events
+        WHERE {' AND '.join(clauses)}
+        ORDER BY seq LIMIT ?
+    """, params)
+    events = []
+    for row in cursor.fetchall():
+        event = dict(row)
+        event["data"] = json.loads(event["data"]) if event["data"] else {}
+        events.append(event)
+    conn.close()
+    return events
+
+
+def latest_seq():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_events")
+    seq = cursor.fetchone()[0]
+    conn.close()
+    return seq
+
+
+def tail(after_seq=0, entities=None, poll_seconds=DEFAULT_POLL_SECONDS, batch_size=DEFAULT_READ_LIMIT):
+    while True:
+        events = read(after_seq, limit=batch_size, entities=entities)
+        for event in events:
+            yield event
+            after_seq = event["seq"]
+        if len(events) < batch_size:
+            time.sleep(poll_seconds)
+
+
+def prune(before_ts):
+    def write(cursor):
+        cursor.execute("DELETE FROM change_events WHERE created_ts < ?", (before_ts,))
+        return cursor.rowcount
+
+    return run_write(write)
@@ -0,0 +1,208 @@
+import hashlib
+import math
+import os
+import shutil
+import time
+from uuid import uuid4
+
+from werkzeug.utils import secure_filename
+
+from database import get_db, run_write
+import upload_store
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_SIZE = 16 * 1024 * 1024
+# Unfinished uploads untouched for this long are dropped together with their data.
+DEFAULT_SESSION_TTL_SECONDS = 24 * 3600
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _part_path(chunk_dir, upload_id):
+    return os.path.join(chunk_dir, upload_id + ".part")
+
+
+def _expected_length(session, index):
+    return min(session["chunk_size"], session["size"] - index * session["chunk_size"])
+
+
+def _total_chunks(session):
+    return max(1, math.ceil(session["size"] / session["chunk_size"]))
+
+
+def get_session(upload_id, owner_email):
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM upload_sessions WHERE id = ? AND owner_email = ?", (upload_id, owner_email))
+        session = cursor.fetchone()
+        if session is None:
+            raise UploadError("upload not found", 404)
+        session = dict(session)
+        cursor.execute("SELECT idx FROM upload_chunks WHERE upload_id = ? ORDER BY idx", (upload_id,))
+        session["received"] = [row["idx"] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    session["total_chunks"] = _total_chunks(session)
+    return session
+
+
+def status(session):
+    received = set(session["received"])
+    return {
+        "upload_id": session["id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": session["total_chunks"],
+        "received": session["received"],
+        "missing": [i for i in range(session["total_chunks"]) if i not in received],
+        "completed": session["completed_ts"] is not None,
+    }
+
+
+def start(owner_email, filename, size, chunk_dir, chunk_size=None, max_size=DEFAULT_MAX_SIZE):
+    filename = secure_filename(filename or "")
+    if not filename:
+        raise UploadError("filename is required")
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError("size must be a positive integer")
+    if size > max_size:
+        raise UploadError(f"file is larger than {max_size} bytes", 413)
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if not isinstance(chunk_size, int) or not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise UploadError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE}")
+
+    upload_id = uuid4().hex
+    os.makedirs(chunk_dir, exist_ok=True)
+    # Chunks are written in place at their offset, so the finished file needs
+    # no assembly step and a resumed upload only sends what is missing.
+    with open(_part_path(chunk_dir, upload_id), "wb") as f:
+        f.truncate(size)
+    now = int(time.time())
+    run_write(lambda cursor: cursor.execute("""
+        INSERT INTO upload_sessions (id, owner_email, filename, size, chunk_size, created_ts, updated_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (upload_id, owner_email, filename, size, chunk_size, now, now)))
+    return get_session(upload_id, owner_email)
+
+
+def put_chunk(session, index, stream, chunk_dir, checksum=None):
+    if session["completed_ts"] is not None:
+        raise UploadError("upload is already completed", 409)
+    if not 0 <= index < session["total_chunks"]:
+        raise UploadError("chunk index out of range")
+    expected = _expected_length(session, index)
+    data = stream.read(expected + 1)
+    if len(data) != expected:
+        raise UploadError(f"chunk {index} must be exactly {expected} bytes")
+    digest = hashlib.sha256(data).hexdigest()
+    if checksum and checksum.lower() != digest:
+        raise UploadError(f"checksum mismatch for chunk {index}", 422)
+
+    path = _part_path(chunk_dir, session["id"])
+    try:
+        fd = os.open(path, os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadError("upload data is gone, start again", 410)
+    try:
+        os.pwrite(fd, data, index * session["chunk_size"])
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    # The chunk counts as received only once its bytes are on disk.
+    def write(cursor):
+        cursor.execute("""
+            INSERT INTO upload_chunks (upload_id, idx, sha256) VALUES (?, ?, ?)
+            ON CONFLICT(upload_id, idx) DO UPDATE SET sha256 = excluded.sha256
+        """, (session["id"], index, digest))
+        cursor.execute("UPDATE upload_sessions SET updated_ts = ? WHERE id = ?", (int(time.time()), session["id"]))
+
+    run_write(write)
+    return digest
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete(session, chunk_dir, upload_folder, unique_filename, checksum=None):
+    if session["completed_ts"] is not None:
+        raise UploadError("upload is already completed", 409)
+    missing = status(session)["missing"]
+    if missing:
+        raise UploadError(f"{len(missing)} chunks are missing", 409)
+    path = _part_path(chunk_dir, session["id"])
+    if not os.path.isfile(path):
+        raise UploadError("upload data is gone, start again", 410)
+    if checksum and checksum.lower() != _file_digest(path):
+        raise UploadError("checksum mismatch for the whole file", 422)
+
+    def write(cursor):
+        cursor.execute("""
+            UPDATE upload_sessions SET completed_ts = ? WHERE id = ? AND completed_ts IS NULL
+        """, (int(time.time()), session["id"]))
+        return cursor.rowcount
+
+    # Claiming the session first makes a repeated complete request lose the
+    # race instead of attaching the same file twice.
+    if not run_write(write):
+        raise UploadError("upload is already completed", 409)
+    target = os.path.join(upload_folder, upload_store.shard_path(unique_filename))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.move(path, target)
+    # The upload GC spares files by mtime until they are referenced; the last
+    # chunk may have been written long before completion.
+    os.utime(target)
+    return target
+
+
+def reopen(session, chunk_dir, target):
+    # Undoes complete() when the document could not be attached, so the same
+    # upload can be completed again instead of answering 409 with the file
+    # left unreferenced. The data goes back before the session is reopened.
+    shutil.move(target, _part_path(chunk_dir, session["id"]))
+    run_write(lambda cursor: cursor.execute("""
+        UPDATE upload_sessions SET completed_ts = NULL, updated_ts = ? WHERE id = ?
+    """, (int(time.time()), session["id"])))
+
+
+def prune_stale(chunk_dir, ttl_seconds=DEFAULT_SESSION_TTL_SECONDS, now=None):
+    cutoff = int(now if now is not None else time.time()) - ttl_seconds
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM upload_sessions WHERE updated_ts < ?", (cutoff,))
+        stale = [row["id"] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    for upload_id in stale:
+        try:
+            os.remove(_part_path(chunk_dir, upload_id))
+        except FileNotFoundError:
+            pass
+    if stale:
+        placeholders = ", ".join("?" for _ in stale)
+        run_write(lambda cursor: cursor.execute(f"DELETE FROM upload_sessions WHERE id IN ({placeholders})", stale))
+    return len(stale)
+
+
+def init_app(app):
+    app.config.setdefault("CHUNKED_UPLOAD_DIR", "upload_chunks")
+    app.config.setdefault("CHUNKED_UPLOAD_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    app.config.setdefault("CHUNKED_UPLOAD_TTL_SECONDS", DEFAULT_SESSION_TTL_SECONDS)
+    app.config.setdefault("MAX_UPLOAD_SIZE", DEFAULT_MAX_SIZE)
@@ -1,18 +1,187 @@
 import sqlite3
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
 
 DATABASE = "erasmus_hub.db"
+BUSY_TIMEOUT_MS = int(os.environ.get("ERASMUS_DB_BUSY_TIMEOUT_MS", "10000"))
+SINGLE_WRITER = os.environ.get("ERASMUS_DB_SINGLE_WRITER", "0") == "1"
+WRITER_BATCH_SIZE = int(os.environ.get("ERASMUS_DB_WRITER_BATCH_SIZE", "64"))
+WRITER_BATCH_WAIT_MS = float(os.environ.get("ERASMUS_DB_WRITER_BATCH_WAIT_MS", "2"))
+SQL_TRACE = os.environ.get("ERASMUS_SQL_TRACE", "1") == "1"
+
+_query_listeners = []
+
+
+def add_query_listener(listener):
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+
+def remove_query_listener(listener):
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+
+class TracingCursor(sqlite3.Cursor):
+    
+    def _timed(self, method, sql, *args):
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            self._trace = {"sql": sql, "duration": time.perf_counter() - started}
+            for listener in list(_query_listeners):
+                listener(self._trace)
+    
+    def _timed_fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            # Rows are stepped lazily, so fetch time belongs to the last statement.
+            trace = getattr(self, "_trace", None)
+            if trace is not None:
+                trace["duration"] += time.perf_counter() - started
+    
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+    
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+    
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+    
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class TracingConnection(sqlite3.Connection):
+    
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+    
+    # The built-in shortcuts run on a cursor without going through its
+    # Python methods, so they would not be traced.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
 
 
 def get_db():
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(DATABASE, timeout=BUSY_TIMEOUT_MS / 1000,
+                           factory=TracingConnection if SQL_TRACE else sqlite3.Connection)
     conn.row_factory = sqlite3.Row
+    # Connection setup is not a query of the caller, so it stays out of the trace.
+    sqlite3.Connection.execute(conn, f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    sqlite3.Connection.execute(conn, "PRAGMA foreign_keys = ON")
+    sqlite3.Connection.execute(conn, "PRAGMA synchronous = NORMAL")
     return conn
 
 
+class WriteQueue:
+    
+    def __init__(self, batch_size=WRITER_BATCH_SIZE, batch_wait_ms=WRITER_BATCH_WAIT_MS):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.jobs = queue.Queue()
+        self.stats = {"jobs": 0, "transactions": 0, "failed_jobs": 0}
+        self.thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self.thread.start()
+    
+    def submit(self, fn):
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("run_write called from inside a write job")
+        future = Future()
+        self.jobs.put((fn, future))
+        return future
+    
+    def _collect(self):
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        conn = get_db()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        while True:
+            batch = self._collect()
+            results = []
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for fn, future in batch:
+                    # Each job gets its own savepoint so one failing job does not
+                    # roll back the others committed in the same transaction.
+                    cursor.execute("SAVEPOINT job")
+                    try:
+                        results.append((future, fn(cursor), None))
+                        cursor.execute("RELEASE job")
+                    except BaseException as e:
+                        cursor.execute("ROLLBACK TO job")
+                        cursor.execute("RELEASE job")
+                        results.append((future, None, e))
+                cursor.execute("COMMIT")
+            except BaseException as e:
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                results = [(future, None, e) for _, future in batch]
+            
+            self.stats["jobs"] += len(batch)
+            self.stats["transactions"] += 1
+            for future, result, error in results:
+                if error is not None:
+                    self.stats["failed_jobs"] += 1
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteQueue()
+    return _writer
+
+
+def run_write(fn):
+    if SINGLE_WRITER:
+        return get_writer().submit(fn).result()
+    conn = get_db()
+    try:
+        result = fn(conn.cursor())
+        conn.commit()
+        return result
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
 def init_db():
     conn = get_db()
+    conn.execute("PRAGMA journal_mode = WAL")
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -22,7 +191,39 @@ def init_db():
             role TEXT NOT NULL CHECK(role IN ('student', 'admin')),
             name TEXT NOT NULL,
             faculty TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_ts INTEGER,
+            updated_ts INTEGER
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS universities (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS mobility_types (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS student_names (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_types (
+            id INTEGER PRIMARY KEY,
+            key TEXT UNIQUE NOT NULL,
+            label TEXT NOT NULL,
+            required INTEGER NOT NULL DEFAULT 0
         )
     """)
     
@@ -30,9 +231,9 @@ def init_db():
         CREATE TABLE IF NOT EXISTS applications (
             id TEXT PRIMARY KEY,
             student_email TEXT NOT NULL,
-            student_name TEXT NOT NULL,
-            university TEXT NOT NULL,
-            mobility_type TEXT NOT NULL,
+            student_name_id INTEGER NOT NULL REFERENCES student_names(id),
+            university_id INTEGER NOT NULL REFERENCES universities(id),
+            mobility_type_id INTEGER NOT NULL REFERENCES mobility_types(id),
             status TEXT NOT NULL DEFAULT 'Podaná' CHECK(status IN ('Podaná', 'Schválená', 'Zamietnutá')),
             progress INTEGER DEFAULT 0,
             submitted_date TEXT,
@@ -42,6 +243,12 @@ def init_db():
             rejected_by TEXT,
             rejection_reason TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            submitted_ts INTEGER,
+            approved_ts INTEGER,
+            rejected_ts INTEGER,
+            created_ts INTEGER,
+            updated_ts INTEGER,
+            comment_count INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (student_email) REFERENCES users(email)
         )
     """)
@@ -50,11 +257,12 @@ def init_db():
         CREATE TABLE IF NOT EXISTS documents (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             application_id TEXT NOT NULL,
-            document_key TEXT NOT NULL,
-            document_label TEXT NOT NULL,
+            document_type_id INTEGER NOT NULL REFERENCES document_types(id),
             filename TEXT NOT NULL,
             status TEXT NOT NULL DEFAULT 'Odoslaný' CHECK(status IN ('Odoslaný', 'V preverovaní', 'Schválený', 'Zamietnutý')),
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            uploaded_ts INTEGER,
+            updated_ts INTEGER,
             FOREIGN KEY (application_id) REFERENCES applications(id) ON DELETE CASCADE
         )
     """)
@@ -67,6 +275,7 @@ def init_db():
             author_name TEXT NOT NULL,
             comment_text TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_ts INTEGER,
             FOREIGN KEY (application_id) REFERENCES applications(id) ON DELETE CASCADE,
             FOREIGN KEY (author_email) REFERENCES users(email)
         )
@@ -83,6 +292,7 @@ def init_db():
             message_text TEXT NOT NULL,
             is_read INTEGER DEFAULT 0,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_ts INTEGER,
             FOREIGN KEY (from_email) REFERENCES users(email)
         )
     """)
@@ -97,16 +307,578 @@ def init_db():
             author_name TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP,
+            created_ts INTEGER,
+            updated_ts INTEGER,
             FOREIGN KEY (author_email) REFERENCES users(email)
         )
     """)
     
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_gc_state (
+            id INTEGER PRIMARY KEY CHECK(id = 1),
+            cursor TEXT,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            files_scanned INTEGER DEFAULT 0,
+            files_deleted INTEGER DEFAULT 0,
+            bytes_reclaimed INTEGER DEFAULT 0
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            action TEXT NOT NULL CHECK(action IN ('create', 'update', 'delete')),
+            data TEXT,
+            created_ts INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_events_entity_seq ON change_events(entity, seq)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_events_created_ts ON change_events(created_ts)")
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_import_state (
+            id TEXT PRIMARY KEY,
+            filename TEXT,
+            rows_processed INTEGER DEFAULT 0,
+            users_created INTEGER DEFAULT 0,
+            rows_failed INTEGER DEFAULT 0,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            application_id TEXT,
+            data TEXT,
+            created_ts INTEGER NOT NULL,
+            available_ts INTEGER NOT NULL,
+            sent_ts INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            claimed_ts INTEGER
+        )
+    """)
+    cursor.execute("PRAGMA table_info(notification_outbox)")
+    if "claimed_ts" not in {row["name"] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE notification_outbox ADD COLUMN claimed_ts INTEGER")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending
+        ON notification_outbox(recipient, id) WHERE sent_ts IS NULL
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            owner_email TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            chunk_size INTEGER NOT NULL,
+            created_ts INTEGER NOT NULL,
+            updated_ts INTEGER NOT NULL,
+            completed_ts INTEGER
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_chunks (
+            upload_id TEXT NOT NULL REFERENCES upload_sessions(id) ON DELETE CASCADE,
+            idx INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            PRIMARY KEY (upload_id, idx)
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_claims (
+            application_id TEXT PRIMARY KEY REFERENCES applications(id) ON DELETE CASCADE,
+            reviewer_email TEXT NOT NULL,
+            claimed_ts INTEGER NOT NULL,
+            lease_until_ts INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_claims_reviewer ON review_claims(reviewer_email)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_log (
+            id INTEGER PRIMARY KEY,
+            reviewer_email TEXT NOT NULL,
+            application_id TEXT NOT NULL,
+            document_id INTEGER,
+            action TEXT NOT NULL,
+            claimed_ts INTEGER,
+            reviewed_ts INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_review_log_reviewed_ts ON review_log(reviewed_ts)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS student_summary (
+            student_email TEXT PRIMARY KEY REFERENCES users(email) ON DELETE CASCADE,
+            applications_total INTEGER NOT NULL DEFAULT 0,
+            applications_pending INTEGER NOT NULL DEFAULT 0,
+            applications_approved INTEGER NOT NULL DEFAULT 0,
+            applications_rejected INTEGER NOT NULL DEFAULT 0,
+            documents_total INTEGER NOT NULL DEFAULT 0,
+            documents_pending INTEGER NOT NULL DEFAULT 0,
+            documents_approved INTEGER NOT NULL DEFAULT 0,
+            documents_rejected INTEGER NOT NULL DEFAULT 0,
+            documents_required INTEGER NOT NULL DEFAULT 0,
+            latest_application_id TEXT,
+            last_activity_ts INTEGER
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deletion_jobs (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL CHECK(kind IN ('users', 'applications')),
+            description TEXT,
+            created_by TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'running', 'done', 'failed')),
+            total INTEGER NOT NULL DEFAULT 0,
+            items_done INTEGER NOT NULL DEFAULT 0,
+            items_failed INTEGER NOT NULL DEFAULT 0,
+            applications_deleted INTEGER NOT NULL DEFAULT 0,
+            documents_deleted INTEGER NOT NULL DEFAULT 0,
+            files_removed INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_ts INTEGER NOT NULL,
+            started_ts INTEGER,
+            heartbeat_ts INTEGER,
+            finished_ts INTEGER
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deletion_job_items (
+            job_id INTEGER NOT NULL REFERENCES deletion_jobs(id) ON DELETE CASCADE,
+            target TEXT NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending' CHECK(state IN ('pending', 'done', 'failed')),
+            error TEXT,
+            PRIMARY KEY (job_id, target)
+        ) WITHOUT ROWID
+    """)
+
     conn.commit()
     conn.close()
     
+    migrate_timestamps()
+    migrate_lookup_tables()
+    migrate_comment_counts()
+    migrate_change_tracking()
+    create_partial_indexes()
+    migrate_student_summary()
+    create_views()
     create_default_users()
 
 
+TIMESTAMP_COLUMNS = [
+    ("users", "created_at", "created_ts"),
+    ("applications", "submitted_date", "submitted_ts"),
+    ("applications", "approved_at", "approved_ts"),
+    ("applications", "rejected_at", "rejected_ts"),
+    ("applications", "created_at", "created_ts"),
+    ("documents", "uploaded_at", "uploaded_ts"),
+    ("application_comments", "created_at", "created_ts"),
+    ("messages", "created_at", "created_ts"),
+    ("announcements", "created_at", "created_ts"),
+    ("announcements", "updated_at", "updated_ts"),
+]
+
+TIMESTAMP_INDEXES = [
+    ("idx_users_created_ts", "users", "created_ts"),
+    ("idx_applications_created_ts", "applications", "created_ts"),
+    ("idx_applications_student_created_ts", "applications", "student_email, created_ts"),
+    ("idx_applications_status_created_ts", "applications", "status, created_ts"),
+    ("idx_documents_uploaded_ts", "documents", "uploaded_ts"),
+    ("idx_comments_application_created_ts", "application_comments", "application_id, created_ts"),
+    ("idx_messages_created_ts", "messages", "created_ts"),
+    ("idx_announcements_created_ts", "announcements", "created_ts"),
+]
+
+# Indexes that only cover rows a hot query looks for, e.g. the review queue
+# scanning documents nobody has looked at yet.
+PARTIAL_INDEXES = [
+    ("idx_documents_review_queue", "documents", "uploaded_ts, id", "status = 'Odoslaný'"),
+]
+
+# Recomputes one student's dashboard counters from their own rows; :email is
+# replaced by the affected student in the triggers below.
+STUDENT_SUMMARY_REFRESH = """
+    INSERT INTO student_summary (
+        student_email, applications_total, applications_pending, applications_approved, applications_rejected,
+        documents_total, documents_pending, documents_approved, documents_rejected, documents_required,
+        latest_application_id, last_activity_ts
+    )
+    SELECT u.email, a.total, a.pending, a.approved, a.rejected,
+           d.total, d.pending, d.approved, d.rejected,
+           a.total * (SELECT COUNT(*) FROM document_types WHERE required = 1),
+           (SELECT id FROM applications WHERE student_email = u.email ORDER BY created_ts DESC, rowid DESC LIMIT 1),
+           NULLIF(MAX(COALESCE(a.last_ts, 0), COALESCE(d.last_ts, 0)), 0)
+    FROM users u,
+         (SELECT COUNT(*) AS total,
+                 COALESCE(SUM(status = 'Podaná'), 0) AS pending,
+                 COALESCE(SUM(status = 'Schválená'), 0) AS approved,
+                 COALESCE(SUM(status = 'Zamietnutá'), 0) AS rejected,
+                 MAX(MAX(COALESCE(created_ts, 0), COALESCE(approved_ts, 0), COALESCE(rejected_ts, 0))) AS last_ts
+          FROM applications WHERE student_email = :email) a,
+         (SELECT COUNT(*) AS total,
+                 COALESCE(SUM(x.status IN ('Odoslaný', 'V preverovaní')), 0) AS pending,
+                 COALESCE(SUM(x.status = 'Schválený'), 0) AS approved,
+                 COALESCE(SUM(x.status = 'Zamietnutý'), 0) AS rejected,
+                 MAX(x.uploaded_ts) AS last_ts
+          FROM documents x JOIN applications y ON y.id = x.application_id
+          WHERE y.student_email = :email) d
+    WHERE u.email = :email
+    ON CONFLICT(student_email) DO UPDATE SET
+        applications_total = excluded.applications_total,
+        applications_pending = excluded.applications_pending,
+        applications_approved = excluded.applications_approved,
+        applications_rejected = excluded.applications_rejected,
+        documents_total = excluded.documents_total,
+        documents_pending = excluded.documents_pending,
+        documents_approved = excluded.documents_approved,
+        documents_rejected = excluded.documents_rejected,
+        documents_required = excluded.documents_required,
+        latest_application_id = excluded.latest_application_id,
+        last_activity_ts = excluded.last_activity_ts
+"""
+
+# Triggers keep student_summary in the same transaction as every write to
+# applications and documents, including archiving and raw SQL.
+STUDENT_SUMMARY_TRIGGERS = {
+    "trg_applications_insert_summary": ("AFTER INSERT ON applications", ["NEW.student_email"]),
+    "trg_applications_update_summary": (
+        "AFTER UPDATE OF status, student_email, created_ts ON applications",
+        ["NEW.student_email", "OLD.student_email"],
+    ),
+    "trg_applications_delete_summary": ("AFTER DELETE ON applications", ["OLD.student_email"]),
+    "trg_documents_insert_summary": (
+        "AFTER INSERT ON documents",
+        ["(SELECT student_email FROM applications WHERE id = NEW.application_id)"],
+    ),
+    "trg_documents_update_summary": (
+        "AFTER UPDATE OF status, application_id, uploaded_ts ON documents",
+        ["(SELECT student_email FROM applications WHERE id = NEW.application_id)"],
+    ),
+    "trg_documents_delete_summary": (
+        "AFTER DELETE ON documents",
+        ["(SELECT student_email FROM applications WHERE id = OLD.application_id)"],
+    ),
+}
+
+# updated_ts is maintained by triggers so that every write path, including
+# raw SQL in migrations and CLI commands, is visible to incremental sync.
+CHANGE_TRACKED_TABLES = {
+    "users": ("id", "created_ts"),
+    "applications": ("id", "MAX(COALESCE(created_ts, 0), COALESCE(approved_ts, 0), COALESCE(rejected_ts, 0))"),
+    "documents": ("id", "uploaded_ts"),
+    "announcements": ("id", "COALESCE(updated_ts, created_ts)"),
+}
+
+
+LOOKUP_INDEXES = [
+    ("idx_applications_university_id", "applications", "university_id"),
+    ("idx_applications_mobility_type_id", "applications", "mobility_type_id"),
+    ("idx_documents_type_application", "documents", "document_type_id, application_id"),
+]
+
+# Reads go through these views, so rows keep the column names the templates,
+# the API and the archive use while the tables store integer ids.
+VIEWS = {
+    "application_details": """
+        SELECT a.*, COALESCE(n.name, a.student_email) AS student_name,
+               u.name AS university, m.name AS mobility_type
+        FROM applications a
+        LEFT JOIN student_names n ON n.id = a.student_name_id
+        LEFT JOIN universities u ON u.id = a.university_id
+        LEFT JOIN mobility_types m ON m.id = a.mobility_type_id
+    """,
+    "document_details": """
+        SELECT d.*, t.key AS document_key, t.label AS document_label
+        FROM documents d
+        LEFT JOIN document_types t ON t.id = d.document_type_id
+    """,
+}
+
+
+def to_epoch(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    value = str(value).strip()
+    for fmt in ("%d.%m.%Y %H:%M", "%d.%m.%Y"):
+        try:
+            return int(datetime.strptime(value, fmt).timestamp())
+        except ValueError:
+            pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None and len(value) == 19 and value[10] == " ":
+        # CURRENT_TIMESTAMP defaults are written by SQLite in UTC, everything
+        # else was written from datetime.now() in local time.
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def backfill_timestamps(conn, batch_size=1000):
+    cursor = conn.cursor()
+    for table, source, target in TIMESTAMP_COLUMNS:
+        last_rowid = 0
+        while True:
+            cursor.execute(f"""
+                SELECT rowid, {source} FROM {table}
+                WHERE rowid > ? AND {target} IS NULL AND {source} IS NOT NULL
+                ORDER BY rowid LIMIT ?
+            """, (last_rowid, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            updates = [(to_epoch(row[1]), row[0]) for row in rows]
+            cursor.executemany(
+                f"UPDATE {table} SET {target} = ? WHERE rowid = ?",
+                [update for update in updates if update[0] is not None]
+            )
+            conn.commit()
+            last_rowid = rows[-1][0]
+    # Applications migrated without created_at still have a submission date.
+    cursor.execute("UPDATE applications SET created_ts = submitted_ts WHERE created_ts IS NULL")
+    conn.commit()
+
+
+def migrate_timestamps():
+    conn = get_db()
+    cursor = conn.cursor()
+    for table, _, target in TIMESTAMP_COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        if target not in {row["name"] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {target} INTEGER")
+    conn.commit()
+    
+    backfill_timestamps(conn)
+    
+    for name, table, columns in TIMESTAMP_INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+    conn.commit()
+    conn.close()
+
+
+# Inserting first takes the write lock before the read, so two writers
+# cannot both miss the row and collide on the unique name.
+def lookup_id(cursor, table, name):
+    cursor.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+    cursor.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+    return cursor.fetchone()[0]
+
+
+def document_type_id(cursor, key, label):
+    cursor.execute("INSERT OR IGNORE INTO document_types (key, label) VALUES (?, ?)", (key, label or key))
+    cursor.execute("SELECT id, label FROM document_types WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    if label and row[1] != label:
+        cursor.execute("UPDATE document_types SET label = ? WHERE id = ?", (label, row[0]))
+    return row[0]
+
+
+def sync_document_types(requirements):
+    def write(cursor):
+        for req in requirements:
+            document_type_id(cursor, req["key"], req["label"])
+        keys = [req["key"] for req in requirements]
+        cursor.execute(f"""
+            UPDATE document_types SET required = key IN ({", ".join("?" for _ in keys)})
+            WHERE required != (key IN ({", ".join("?" for _ in keys)}))
+        """, keys + keys)
+        if cursor.rowcount:
+            cursor.execute("""
+                UPDATE student_summary
+                SET documents_required = applications_total * (SELECT COUNT(*) FROM document_types WHERE required = 1)
+            """)
+    
+    run_write(write)
+
+
+def migrate_lookup_tables():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(applications)")
+    application_columns = {row["name"] for row in cursor.fetchall()}
+    cursor.execute("PRAGMA table_info(documents)")
+    document_columns = {row["name"] for row in cursor.fetchall()}
+    
+    if ("university" in application_columns or "student_name_id" not in application_columns
+            or "document_key" in document_columns):
+        # The values themselves do not change, so updated_ts must not move:
+        # the triggers are recreated by migrate_change_tracking afterwards.
+        for table in ("applications", "documents"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_{table}_update_updated_ts")
+        for name in VIEWS:
+            cursor.execute(f"DROP VIEW IF EXISTS {name}")
+    
+    if "university" in application_columns:
+        cursor.execute("INSERT OR IGNORE INTO universities (name) SELECT DISTINCT university FROM applications")
+        cursor.execute("INSERT OR IGNORE INTO mobility_types (name) SELECT DISTINCT mobility_type FROM applications")
+        cursor.execute("ALTER TABLE applications ADD COLUMN university_id INTEGER REFERENCES universities(id)")
+        cursor.execute("ALTER TABLE applications ADD COLUMN mobility_type_id INTEGER REFERENCES mobility_types(id)")
+        cursor.execute("""
+            UPDATE applications SET
+                university_id = (SELECT id FROM universities WHERE name = applications.university),
+                mobility_type_id = (SELECT id FROM mobility_types WHERE name = applications.mobility_type)
+        """)
+        for column in ("university", "mobility_type"):
+            cursor.execute(f"ALTER TABLE applications DROP COLUMN {column}")
+    
+    if "student_name_id" not in application_columns:
+        if "student_name" in application_columns:
+            source = "applications.student_name"
+        else:
+            # Databases migrated before names had their own table lost the
+            # column; the current account name is the closest that is left.
+            source = "(SELECT name FROM users WHERE email = applications.student_email)"
+        cursor.execute(
+            f"INSERT OR IGNORE INTO student_names (name) SELECT {source} FROM applications WHERE {source} IS NOT NULL"
+        )
+        cursor.execute("ALTER TABLE applications ADD COLUMN student_name_id INTEGER REFERENCES student_names(id)")
+        cursor.execute(f"UPDATE applications SET student_name_id = (SELECT id FROM student_names WHERE name = {source})")
+        if "student_name" in application_columns:
+            cursor.execute("ALTER TABLE applications DROP COLUMN student_name")
+    
+    if "document_key" in document_columns:
+        cursor.execute("""
+            INSERT OR IGNORE INTO document_types (key, label)
+            SELECT document_key, MAX(document_label) FROM documents GROUP BY document_key
+        """)
+        cursor.execute("ALTER TABLE documents ADD COLUMN document_type_id INTEGER REFERENCES document_types(id)")
+        cursor.execute("""
+            UPDATE documents SET document_type_id = (SELECT id FROM document_types WHERE key = documents.document_key)
+        """)
+        for column in ("document_key", "document_label"):
+            cursor.execute(f"ALTER TABLE documents DROP COLUMN {column}")
+    
+    for name, table, columns in LOOKUP_INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+    conn.commit()
+    conn.close()
+
+
+def create_partial_indexes():
+    conn = get_db()
+    for name, table, columns, where in PARTIAL_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns}) WHERE {where}")
+    conn.commit()
+    conn.close()
+
+
+def rebuild_student_summary(cursor):
+    cursor.execute("DELETE FROM student_summary")
+    cursor.execute("SELECT DISTINCT student_email FROM applications")
+    emails = [row[0] for row in cursor.fetchall()]
+    for email in emails:
+        cursor.execute(STUDENT_SUMMARY_REFRESH, {"email": email})
+    return len(emails)
+
+
+def migrate_student_summary():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(document_types)")
+    if "required" not in {row["name"] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE document_types ADD COLUMN required INTEGER NOT NULL DEFAULT 0")
+    for name, (event, emails) in STUDENT_SUMMARY_TRIGGERS.items():
+        body = "".join(STUDENT_SUMMARY_REFRESH.replace(":email", email) + ";" for email in emails)
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM student_summary), EXISTS (SELECT 1 FROM applications)")
+    has_summary, has_applications = cursor.fetchone()
+    if has_applications and not has_summary:
+        rebuild_student_summary(cursor)
+    conn.commit()
+    conn.close()
+
+
+def create_views():
+    conn = get_db()
+    for name, query in VIEWS.items():
+        conn.execute(f"DROP VIEW IF EXISTS {name}")
+        conn.execute(f"CREATE VIEW {name} AS {query}")
+    conn.commit()
+    conn.close()
+
+
+COMMENT_COUNT_TRIGGERS = {
+    "trg_application_comments_insert_count": (
+        "AFTER INSERT ON application_comments",
+        "UPDATE applications SET comment_count = comment_count + 1 WHERE id = NEW.application_id",
+    ),
+    "trg_application_comments_delete_count": (
+        "AFTER DELETE ON application_comments",
+        "UPDATE applications SET comment_count = comment_count - 1 WHERE id = OLD.application_id",
+    ),
+}
+
+
+def migrate_comment_counts():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(applications)")
+    if "comment_count" not in {row["name"] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE applications ADD COLUMN comment_count INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(f"""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'trigger' AND name IN ({", ".join("?" for _ in COMMENT_COUNT_TRIGGERS)})
+    """, list(COMMENT_COUNT_TRIGGERS))
+    if cursor.fetchone()[0] < len(COMMENT_COUNT_TRIGGERS):
+        # The counter is kept by triggers, so every writer (including
+        # migrate_from_json) maintains it; counts written before the triggers
+        # existed are recomputed once. A derived counter is not a change of
+        # the application itself; the trigger is recreated by
+        # migrate_change_tracking afterwards.
+        cursor.execute("DROP TRIGGER IF EXISTS trg_applications_update_updated_ts")
+        for name, (event, body) in COMMENT_COUNT_TRIGGERS.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body}; END")
+        cursor.execute("""
+            UPDATE applications
+            SET comment_count = (SELECT COUNT(*) FROM application_comments c WHERE c.application_id = applications.id)
+        """)
+    conn.commit()
+    conn.close()
+
+
+def migrate_change_tracking():
+    conn = get_db()
+    cursor = conn.cursor()
+    for table, (key, initial) in CHANGE_TRACKED_TABLES.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        if "updated_ts" not in {row["name"] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN updated_ts INTEGER")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_updated_ts ON {table}(updated_ts, {key})")
+        cursor.execute(f"UPDATE {table} SET updated_ts = COALESCE({initial}, 0) WHERE updated_ts IS NULL")
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_updated_ts AFTER INSERT ON {table}
+            WHEN NEW.updated_ts IS NULL
+            BEGIN
+                UPDATE {table} SET updated_ts = CAST(strftime('%s', 'now') AS INTEGER) WHERE rowid = NEW.rowid;
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_updated_ts AFTER UPDATE ON {table}
+            WHEN NEW.updated_ts IS OLD.updated_ts
+            BEGIN
+                UPDATE {table} SET updated_ts = CAST(strftime('%s', 'now') AS INTEGER) WHERE rowid = NEW.rowid;
+            END
+        """)
+    conn.commit()
+    conn.close()
+
+
 def create_default_users():
     from werkzeug.security import generate_password_hash
     
@@ -118,23 +890,25 @@ def create_default_users():
     
     if count == 0:
         cursor.execute("""
-            INSERT INTO users (email, password, role, name)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO users (email, password, role, name, created_ts)
+            VALUES (?, ?, ?, ?, ?)
         """, (
             "student@example.com",
             generate_password_hash("student"),
             "student",
-            "Ján Študent"
+            "Ján Študent",
+            to_epoch(datetime.now())
         ))
         
         cursor.execute("""
-            INSERT INTO users (email, password, role, name)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO users (email, password, role, name, created_ts)
+            VALUES (?, ?, ?, ?, ?)
         """, (
             "admin@example.com",
             generate_password_hash("admin"),
             "admin",
-            "Mária Nováková"
+            "Mária Nováková",
+            to_epoch(datetime.now())
         ))
         
         conn.commit()
@@ -148,6 +922,8 @@ def migrate_from_json():
     from uuid import uuid4
     
     conn = get_db()
+    # Legacy JSON exports reference users that may no longer exist.
+    conn.execute("PRAGMA foreign_keys = OFF")
     cursor = conn.cursor()
     if os.path.exists("users.json"):
         try:
@@ -183,16 +959,16 @@ def migrate_from_json():
                     if not cursor.fetchone():
                         cursor.execute("""
                             INSERT INTO applications (
-                                id, student_email, student_name, university, mobility_type,
+                                id, student_email, student_name_id, university_id, mobility_type_id,
                                 status, progress, submitted_date, approved_at, approved_by,
                                 rejected_at, rejected_by, rejection_reason, created_at
                             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                         """, (
                             app_id,
                             app.get("student_email", ""),
-                            app.get("student_name", ""),
-                            app.get("university", ""),
-                            app.get("type", "Štúdium"),
+                            lookup_id(cursor, "student_names", app.get("student_name", "")),
+                            lookup_id(cursor, "universities", app.get("university", "")),
+                            lookup_id(cursor, "mobility_types", app.get("type", "Štúdium")),
                             app.get("status", "Podaná"),
                             app.get("progress", 0),
                             app.get("submitted", ""),
@@ -207,12 +983,11 @@ def migrate_from_json():
                         for doc in app.get("documents", []):
                             cursor.execute("""
                                 INSERT INTO documents (
-                                    application_id, document_key, document_label, filename, status
-                                ) VALUES (?, ?, ?, ?, ?)
+                                    application_id, document_type_id, filename, status
+                                ) VALUES (?, ?, ?, ?)
                             """, (
                                 app_id,
-                                doc.get("key", ""),
-                                doc.get("label", ""),
+                                document_type_id(cursor, doc.get("key", ""), doc.get("label", "")),
                                 doc.get("filename", ""),
                                 doc.get("status", "Odoslaný")
                             ))
@@ -284,6 +1059,7 @@ def migrate_from_json():
             print(f"Помилка міграції новин: {e}")
     
     conn.commit()
+    backfill_timestamps(conn)
     conn.close()
 
 
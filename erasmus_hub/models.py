@@ -1,5 +1,10 @@
 
-from database import get_db
+import sqlite3
+
+from database import get_db, run_write, to_epoch, lookup_id, document_type_id
+import change_feed
+import notifications
+import review_queue
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from uuid import uuid4
@@ -18,25 +23,26 @@ class User:
     
     @staticmethod
     def create(email, password, role, name, faculty=None):
-        import sqlite3
-        conn = get_db()
-        cursor = conn.cursor()
-        try:
+        password_hash = generate_password_hash(password)
+        
+        def write(cursor):
             cursor.execute("""
-                INSERT INTO users (email, password, role, name, faculty)
-                VALUES (?, ?, ?, ?, ?)
-            """, (email, generate_password_hash(password), role, name, faculty))
-            conn.commit()
+                INSERT INTO users (email, password, role, name, faculty, created_ts)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (email, password_hash, role, name, faculty, to_epoch(datetime.now())))
+            change_feed.record(cursor, "user", email, "create",
+                               {"email": email, "role": role, "name": name, "faculty": faculty})
+        
+        try:
+            run_write(write)
             return True
         except sqlite3.IntegrityError:
             return False
-        finally:
-            conn.close()
     
     @staticmethod
     def verify_password(user, password):
         stored_password = user.get("password", "")
-        if stored_password.startswith("pbkdf2:"):
+        if stored_password.startswith(("pbkdf2:", "scrypt:")):
             return check_password_hash(stored_password, password)
         return stored_password == password
     
@@ -49,6 +55,30 @@ class User:
         conn.close()
         return students
     
+    @staticmethod
+    def count_students():
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'student'")
+        total = cursor.fetchone()[0]
+        conn.close()
+        return total
+    
+    @staticmethod
+    def get_students_with_application_counts():
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT u.*, COUNT(a.id) AS application_count
+            FROM users u
+            LEFT JOIN applications a ON a.student_email = u.email
+            WHERE u.role = 'student'
+            GROUP BY u.email
+        """)
+        students = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return students
+    
     @staticmethod
     def get_all():
         conn = get_db()
@@ -60,83 +90,133 @@ class User:
     
     @staticmethod
     def update(email, name=None, faculty=None):
-        conn = get_db()
-        cursor = conn.cursor()
-        updates = []
-        params = []
+        changes = {}
         if name:
-            updates.append("name = ?")
-            params.append(name)
+            changes["name"] = name
         if faculty is not None:
-            updates.append("faculty = ?")
-            params.append(faculty)
-        if updates:
-            params.append(email)
-            cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE email = ?", params)
-            conn.commit()
-        conn.close()
+            changes["faculty"] = faculty
+        if changes:
+            updates = [f"{column} = ?" for column in changes]
+            params = list(changes.values()) + [email]
+            
+            def write(cursor):
+                cursor.execute(f"UPDATE users SET {', '.join(updates)} WHERE email = ?", params)
+                if cursor.rowcount:
+                    change_feed.record(cursor, "user", email, "update", changes)
+            
+            run_write(write)
     
     @staticmethod
     def update_password(email, new_password):
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET password = ? WHERE email = ?", 
-                      (generate_password_hash(new_password), email))
-        conn.commit()
-        conn.close()
+        password_hash = generate_password_hash(new_password)
+        
+        def write(cursor):
+            cursor.execute("UPDATE users SET password = ? WHERE email = ?", (password_hash, email))
+            if cursor.rowcount:
+                change_feed.record(cursor, "user", email, "update", {"password_changed": True})
+        
+        run_write(write)
     
     @staticmethod
-    def delete(email):
-        conn = get_db()
-        cursor = conn.cursor()
+    def authored_counts(email, cursor=None):
+        conn = None
+        if cursor is None:
+            conn = get_db()
+            cursor = conn.cursor()
+        # Comments on the user's own applications go with the applications,
+        # so only content written for other people counts.
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM application_comments c
+                 WHERE c.author_email = :email
+                   AND c.application_id NOT IN (SELECT id FROM applications WHERE student_email = :email)) AS comments,
+                (SELECT COUNT(*) FROM announcements WHERE author_email = :email) AS announcements,
+                (SELECT COUNT(*) FROM messages WHERE from_email = :email) AS messages
+        """, {"email": email})
+        counts = dict(cursor.fetchone())
+        if conn is not None:
+            conn.close()
+        return counts
+    
+    @staticmethod
+    def _delete(cursor, email):
+        # A student is erased with everything tied to the account: their
+        # applications (and the comments on them), their conversation with
+        # the office and any comments they wrote elsewhere. An admin's
+        # comments, announcements and messages are part of other people's
+        # records, so an admin who wrote any is kept and False is returned.
+        cursor.execute("SELECT role FROM users WHERE email = ?", (email,))
+        user = cursor.fetchone()
+        if user is None:
+            return True
+        if user["role"] == "admin":
+            if any(User.authored_counts(email, cursor).values()):
+                return False
+        else:
+            cursor.execute("SELECT id FROM applications WHERE student_email = ?", (email,))
+            for row in cursor.fetchall():
+                Application._delete(cursor, row["id"])
+            cursor.execute("DELETE FROM application_comments WHERE author_email = ? RETURNING id", (email,))
+            change_feed.record_many(cursor, "comment", "delete", [(row["id"], None) for row in cursor.fetchall()])
+            cursor.execute("DELETE FROM messages WHERE from_email = ? OR to_email = ? RETURNING id", (email, email))
+            change_feed.record_many(cursor, "message", "delete", [(row["id"], None) for row in cursor.fetchall()])
         cursor.execute("DELETE FROM users WHERE email = ?", (email,))
-        conn.commit()
-        conn.close()
+        change_feed.record(cursor, "user", email, "delete")
+        return True
+    
+    @staticmethod
+    def delete(email):
+        try:
+            return run_write(lambda cursor: User._delete(cursor, email))
+        except sqlite3.IntegrityError:
+            return False
 
 
 class Application:
     
     @staticmethod
     def create(student_email, student_name, university, mobility_type, documents):
-        from database import get_db
-        import sqlite3
-        
-        conn = get_db()
-        cursor = conn.cursor()
         app_id = str(uuid4())
         progress = int((len(documents) / 7) * 100) if documents else 0
+        now = datetime.now()
         
-        try:
+        def write(cursor):
             cursor.execute("""
                 INSERT INTO applications (
-                    id, student_email, student_name, university, mobility_type,
-                    status, progress, submitted_date, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    id, student_email, student_name_id, university_id, mobility_type_id,
+                    status, progress, submitted_date, created_at, submitted_ts, created_ts
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
-                app_id, student_email, student_name, university, mobility_type,
-                "Podaná", progress, datetime.now().strftime("%d.%m.%Y"), datetime.now()
+                app_id, student_email, lookup_id(cursor, "student_names", student_name),
+                lookup_id(cursor, "universities", university),
+                lookup_id(cursor, "mobility_types", mobility_type),
+                "Podaná", progress, now.strftime("%d.%m.%Y"), now, to_epoch(now), to_epoch(now)
             ))
+            change_feed.record(cursor, "application", app_id, "create", {
+                "student_email": student_email, "student_name": student_name, "university": university,
+                "mobility_type": mobility_type, "status": "Podaná", "progress": progress,
+            })
             
             for doc in documents:
                 cursor.execute("""
                     INSERT INTO documents (
-                        application_id, document_key, document_label, filename, status
+                        application_id, document_type_id, filename, status, uploaded_ts
                     ) VALUES (?, ?, ?, ?, ?)
-                """, (app_id, doc["key"], doc["label"], doc["filename"], "Odoslaný"))
-            
-            conn.commit()
-            return app_id
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+                """, (app_id, document_type_id(cursor, doc["key"], doc["label"]), doc["filename"], "Odoslaný",
+                      to_epoch(now)))
+                change_feed.record(cursor, "document", cursor.lastrowid, "create", {
+                    "application_id": app_id, "document_key": doc["key"], "filename": doc["filename"],
+                    "status": "Odoslaný",
+                })
+        
+        run_write(write)
+        return app_id
     
     @staticmethod
     def get_by_id(app_id):
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM applications WHERE id = ?", (app_id,))
+        cursor.execute("SELECT * FROM application_details WHERE id = ?", (app_id,))
         app = cursor.fetchone()
         conn.close()
         return dict(app) if app else None
@@ -145,7 +225,7 @@ class Application:
     def get_by_student(student_email):
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM applications WHERE student_email = ? ORDER BY created_at DESC", (student_email,))
+        cursor.execute("SELECT * FROM application_details WHERE student_email = ? ORDER BY created_ts DESC", (student_email,))
         apps = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return apps
@@ -154,7 +234,38 @@ class Application:
     def get_all():
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM applications ORDER BY created_at DESC")
+        cursor.execute("SELECT * FROM application_details ORDER BY created_ts DESC")
+        apps = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return apps
+    
+    @staticmethod
+    def get_latest(limit):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM application_details ORDER BY created_ts DESC LIMIT ?", (limit,))
+        apps = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return apps
+    
+    @staticmethod
+    def get_with_document_counts(student_email=None, status=None):
+        clauses = []
+        params = []
+        if student_email:
+            clauses.append("a.student_email = ?")
+            params.append(student_email)
+        if status:
+            clauses.append("a.status = ?")
+            params.append(status)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT a.*, (SELECT COUNT(*) FROM documents d WHERE d.application_id = a.id) AS document_count
+            FROM application_details a{where}
+            ORDER BY a.created_ts DESC
+        """, params)
         apps = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return apps
@@ -163,7 +274,7 @@ class Application:
     def get_by_status(status):
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM applications WHERE status = ? ORDER BY created_at DESC", (status,))
+        cursor.execute("SELECT * FROM application_details WHERE status = ? ORDER BY created_ts DESC", (status,))
         apps = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return apps
@@ -174,50 +285,150 @@ class Application:
         cursor = conn.cursor()
         search_term = f"%{query}%"
         cursor.execute("""
-            SELECT * FROM applications 
+            SELECT * FROM application_details
             WHERE university LIKE ? OR student_name LIKE ?
-            ORDER BY created_at DESC
+            ORDER BY created_ts DESC
         """, (search_term, search_term))
         apps = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return apps
     
     @staticmethod
-    def approve(app_id, admin_email):
+    def _range_clause(since_ts, until_ts, column="created_ts"):
+        clauses = []
+        params = []
+        if since_ts is not None:
+            clauses.append(f"{column} >= ?")
+            params.append(since_ts)
+        if until_ts is not None:
+            clauses.append(f"{column} < ?")
+            params.append(until_ts)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+    
+    @staticmethod
+    def count_by_status(since_ts=None, until_ts=None):
+        where, params = Application._range_clause(since_ts, until_ts)
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE applications
-            SET status = 'Schválená',
-                approved_at = ?,
-                approved_by = ?
-            WHERE id = ?
-        """, (datetime.now().strftime("%d.%m.%Y %H:%M"), admin_email, app_id))
-        conn.commit()
+        cursor.execute(f"SELECT status, COUNT(*) AS total FROM applications{where} GROUP BY status", params)
+        counts = {row["status"]: row["total"] for row in cursor.fetchall()}
+        conn.close()
+        return counts
+    
+    @staticmethod
+    def monthly_stats(since_ts=None, until_ts=None):
+        where, params = Application._range_clause(since_ts, until_ts)
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT strftime('%Y-%m', created_ts, 'unixepoch', 'localtime') AS month,
+                   COUNT(*) AS total,
+                   SUM(status = 'Schválená') AS approved,
+                   SUM(status = 'Zamietnutá') AS rejected
+            FROM applications{where}
+            GROUP BY month
+            ORDER BY month
+        """, params)
+        stats = {
+            row["month"]: {"total": row["total"], "approved": row["approved"], "rejected": row["rejected"]}
+            for row in cursor.fetchall() if row["month"]
+        }
         conn.close()
+        return stats
     
     @staticmethod
-    def reject(app_id, admin_email, reason):
+    def mobility_stats(since_ts=None, until_ts=None):
+        where, params = Application._range_clause(since_ts, until_ts)
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE applications
-            SET status = 'Zamietnutá',
-                rejected_at = ?,
-                rejected_by = ?,
-                rejection_reason = ?
-            WHERE id = ?
-        """, (datetime.now().strftime("%d.%m.%Y %H:%M"), admin_email, reason, app_id))
-        conn.commit()
+        cursor.execute(f"""
+            SELECT m.name AS mobility_type, t.total
+            FROM (
+                SELECT mobility_type_id, COUNT(*) AS total
+                FROM applications{where}
+                GROUP BY mobility_type_id
+            ) t
+            LEFT JOIN mobility_types m ON m.id = t.mobility_type_id
+            ORDER BY t.total DESC
+        """, params)
+        stats = {row["mobility_type"] or "Nezadané": row["total"] for row in cursor.fetchall()}
         conn.close()
+        return stats
     
     @staticmethod
-    def delete(app_id):
-        conn = get_db()
-        cursor = conn.cursor()
+    def approve(app_id, admin_email):
+        now = datetime.now()
+        
+        def write(cursor):
+            cursor.execute("""
+                UPDATE applications
+                SET status = 'Schválená',
+                    approved_at = ?,
+                    approved_ts = ?,
+                    approved_by = ?
+                WHERE id = ?
+            """, (now.strftime("%d.%m.%Y %H:%M"), to_epoch(now), admin_email, app_id))
+            if cursor.rowcount:
+                change_feed.record(cursor, "application", app_id, "update", {
+                    "status": "Schválená", "approved_by": admin_email, "approved_ts": to_epoch(now),
+                })
+                notifications.enqueue(cursor, app_id, "application_approved")
+                review_queue.record(cursor, admin_email, app_id, "Schválená", done=True)
+        
+        run_write(write)
+    
+    @staticmethod
+    def reject(app_id, admin_email, reason):
+        now = datetime.now()
+        
+        def write(cursor):
+            cursor.execute("""
+                UPDATE applications
+                SET status = 'Zamietnutá',
+                    rejected_at = ?,
+                    rejected_ts = ?,
+                    rejected_by = ?,
+                    rejection_reason = ?
+                WHERE id = ?
+            """, (now.strftime("%d.%m.%Y %H:%M"), to_epoch(now), admin_email, reason, app_id))
+            if cursor.rowcount:
+                change_feed.record(cursor, "application", app_id, "update", {
+                    "status": "Zamietnutá", "rejected_by": admin_email, "rejected_ts": to_epoch(now),
+                    "rejection_reason": reason,
+                })
+                notifications.enqueue(cursor, app_id, "application_rejected", {"reason": reason})
+                review_queue.record(cursor, admin_email, app_id, "Zamietnutá", done=True)
+        
+        run_write(write)
+    
+    @staticmethod
+    def update_progress(app_id, required_count):
+        def write(cursor):
+            cursor.execute("""
+                UPDATE applications
+                SET progress = (SELECT COUNT(*) FROM documents WHERE application_id = ?) * 100 / ?
+                WHERE id = ?
+            """, (app_id, required_count, app_id))
+            if cursor.rowcount:
+                cursor.execute("SELECT progress FROM applications WHERE id = ?", (app_id,))
+                change_feed.record(cursor, "application", app_id, "update", {"progress": cursor.fetchone()["progress"]})
+        
+        run_write(write)
+    
+    @staticmethod
+    def _delete(cursor, app_id):
+        # Documents go with the application through ON DELETE CASCADE; consumers
+        # still get an event for each of them.
+        cursor.execute("SELECT id FROM documents WHERE application_id = ?", (app_id,))
+        document_ids = [row["id"] for row in cursor.fetchall()]
         cursor.execute("DELETE FROM applications WHERE id = ?", (app_id,))
-        conn.commit()
-        conn.close()
+        if cursor.rowcount:
+            change_feed.record_many(cursor, "document", "delete", [(doc_id, None) for doc_id in document_ids])
+            change_feed.record(cursor, "application", app_id, "delete")
+    
+    @staticmethod
+    def delete(app_id):
+        run_write(lambda cursor: Application._delete(cursor, app_id))
 
 
 class Document:
@@ -226,73 +437,180 @@ class Document:
     def get_by_application(application_id):
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM documents WHERE application_id = ?", (application_id,))
+        cursor.execute("SELECT * FROM document_details WHERE application_id = ?", (application_id,))
         docs = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return docs
     
     @staticmethod
-    def update_status(doc_id, status):
+    def count_applications_by_key(since_ts=None, until_ts=None):
+        where, params = Application._range_clause(since_ts, until_ts, column="a.created_ts")
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("UPDATE documents SET status = ? WHERE id = ?", (status, doc_id))
-        conn.commit()
+        cursor.execute(f"""
+            SELECT k.key AS document_key, t.total
+            FROM (
+                SELECT d.document_type_id, COUNT(DISTINCT d.application_id) AS total
+                FROM documents d
+                JOIN applications a ON a.id = d.application_id{where}
+                GROUP BY d.document_type_id
+            ) t
+            JOIN document_types k ON k.id = t.document_type_id
+        """, params)
+        counts = {row["document_key"]: row["total"] for row in cursor.fetchall()}
         conn.close()
+        return counts
+    
+    @staticmethod
+    def count_by_key():
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT k.key AS document_key, t.documents, t.students
+            FROM (
+                SELECT d.document_type_id, COUNT(*) AS documents, COUNT(DISTINCT a.student_email) AS students
+                FROM documents d
+                JOIN applications a ON a.id = d.application_id
+                GROUP BY d.document_type_id
+            ) t
+            JOIN document_types k ON k.id = t.document_type_id
+        """)
+        counts = {
+            row["document_key"]: {"documents": row["documents"], "students": row["students"]}
+            for row in cursor.fetchall()
+        }
+        conn.close()
+        return counts
+    
+    @staticmethod
+    def update_status(doc_id, status, reviewer_email=None):
+        def write(cursor):
+            cursor.execute("UPDATE documents SET status = ? WHERE id = ?", (status, doc_id))
+            if cursor.rowcount:
+                change_feed.record(cursor, "document", doc_id, "update", {"status": status})
+                cursor.execute("SELECT application_id, document_label FROM document_details WHERE id = ?", (doc_id,))
+                doc = cursor.fetchone()
+                notifications.enqueue(cursor, doc["application_id"], "document_status", {
+                    "document_id": doc_id, "document_label": doc["document_label"], "status": status,
+                })
+                if reviewer_email:
+                    review_queue.record(cursor, reviewer_email, doc["application_id"], status, document_id=doc_id)
+        
+        run_write(write)
     
     @staticmethod
     def get_by_id(doc_id):
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM documents WHERE id = ?", (doc_id,))
+        cursor.execute("SELECT * FROM document_details WHERE id = ?", (doc_id,))
         doc = cursor.fetchone()
         conn.close()
         return dict(doc) if doc else None
     
     @staticmethod
     def add_to_application(application_id, document_key, document_label, filename):
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO documents (application_id, document_key, document_label, filename, status)
-            VALUES (?, ?, ?, ?, ?)
-        """, (application_id, document_key, document_label, filename, "Odoslaný"))
-        conn.commit()
-        conn.close()
+        now = datetime.now()
+        
+        def write(cursor):
+            cursor.execute("""
+                INSERT INTO documents (application_id, document_type_id, filename, status, uploaded_ts)
+                VALUES (?, ?, ?, ?, ?)
+            """, (application_id, document_type_id(cursor, document_key, document_label), filename, "Odoslaný",
+                  to_epoch(now)))
+            change_feed.record(cursor, "document", cursor.lastrowid, "create", {
+                "application_id": application_id, "document_key": document_key, "filename": filename,
+                "status": "Odoslaný",
+            })
+        
+        run_write(write)
+    
+    @staticmethod
+    def replace_file(doc_id, filename):
+        now = datetime.now()
+        
+        def write(cursor):
+            cursor.execute("""
+                UPDATE documents
+                SET filename = ?, status = 'Odoslaný', uploaded_at = ?, uploaded_ts = ?
+                WHERE id = ?
+            """, (filename, now, to_epoch(now), doc_id))
+            if cursor.rowcount:
+                change_feed.record(cursor, "document", doc_id, "update", {"filename": filename, "status": "Odoslaný"})
+        
+        run_write(write)
     
     @staticmethod
     def delete(doc_id):
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
-        conn.commit()
-        conn.close()
+        def write(cursor):
+            cursor.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            if cursor.rowcount:
+                change_feed.record(cursor, "document", doc_id, "delete")
+        
+        run_write(write)
 
 
 class Comment:
     
     @staticmethod
     def create(application_id, author_email, author_name, comment_text):
+        now = datetime.now()
+        
+        def write(cursor):
+            cursor.execute("""
+                INSERT INTO application_comments (application_id, author_email, author_name, comment_text, created_ts)
+                VALUES (?, ?, ?, ?, ?)
+            """, (application_id, author_email, author_name, comment_text, to_epoch(now)))
+            change_feed.record(cursor, "comment", cursor.lastrowid, "create", {
+                "application_id": application_id, "author_email": author_email, "author_name": author_name,
+                "comment_text": comment_text,
+            })
+            notifications.enqueue(cursor, application_id, "comment_added", {
+                "author_name": author_name, "comment_text": comment_text,
+            }, actor=author_email)
+        
+        run_write(write)
+    
+    @staticmethod
+    def get_by_application(application_id, limit=None, before=None):
+        # before is the (created_ts, id) of the last comment already shown;
+        # the next page continues right after it on the index.
+        clauses = ["application_id = ?"]
+        params = [application_id]
+        if before:
+            # A row value comparison lets SQLite seek on the index instead of
+            # skipping over the comments already shown.
+            clauses.append("(created_ts, id) < (?, ?)")
+            params += list(before)
+        query = f"""
+            SELECT * FROM application_comments
+            WHERE {" AND ".join(clauses)}
+            ORDER BY created_ts DESC, id DESC
+        """
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO application_comments (application_id, author_email, author_name, comment_text)
-            VALUES (?, ?, ?, ?)
-        """, (application_id, author_email, author_name, comment_text))
-        conn.commit()
-        conn.close()
-    
-    @staticmethod
-    def get_by_application(application_id):
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM application_comments
-            WHERE application_id = ?
-            ORDER BY created_at DESC
-        """, (application_id,))
+        cursor.execute(query, params)
         comments = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return comments
+    
+    @staticmethod
+    def get_page(application_id, limit, cursor=None):
+        before = None
+        if cursor:
+            try:
+                created_ts, comment_id = cursor.split(":", 1)
+                before = (int(created_ts), int(comment_id))
+            except ValueError:
+                pass
+        comments = Comment.get_by_application(application_id, limit=limit + 1, before=before)
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = f"{comments[-1]['created_ts']}:{comments[-1]['id']}"
+        return comments, next_cursor
 
 
 class Message:
@@ -301,15 +619,18 @@ class Message:
     @staticmethod
     def create(from_email, from_name, from_role, to_email, to_role, message_text):
 
-        conn = get_db()
-        cursor = conn.cursor()
         msg_id = str(uuid4())
-        cursor.execute("""
-            INSERT INTO messages (id, from_email, from_name, from_role, to_email, to_role, message_text)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (msg_id, from_email, from_name, from_role, to_email, to_role, message_text))
-        conn.commit()
-        conn.close()
+        now = datetime.now()
+        def write(cursor):
+            cursor.execute("""
+                INSERT INTO messages (id, from_email, from_name, from_role, to_email, to_role, message_text, created_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (msg_id, from_email, from_name, from_role, to_email, to_role, message_text, to_epoch(now)))
+            change_feed.record(cursor, "message", msg_id, "create", {
+                "from_email": from_email, "from_role": from_role, "to_email": to_email, "to_role": to_role,
+            })
+        
+        run_write(write)
         return msg_id
     
     @staticmethod
@@ -321,13 +642,13 @@ class Message:
             cursor.execute("""
                 SELECT * FROM messages
                 WHERE from_email = ? OR to_email = ?
-                ORDER BY created_at DESC
+                ORDER BY created_ts DESC
             """, (user_email, user_email))
         else:
             cursor.execute("""
                 SELECT * FROM messages
                 WHERE from_role = 'admin' OR to_role = 'admin'
-                ORDER BY created_at DESC
+                ORDER BY created_ts DESC
             """)
         messages = [dict(row) for row in cursor.fetchall()]
         conn.close()
@@ -335,14 +656,15 @@ class Message:
     
     @staticmethod
     def mark_read(msg_id, user_email=None):
-        conn = get_db()
-        cursor = conn.cursor()
-        if user_email:
-            cursor.execute("UPDATE messages SET is_read = 1 WHERE id = ? AND to_email = ?", (msg_id, user_email))
-        else:
-            cursor.execute("UPDATE messages SET is_read = 1 WHERE id = ?", (msg_id,))
-        conn.commit()
-        conn.close()
+        def write(cursor):
+            if user_email:
+                cursor.execute("UPDATE messages SET is_read = 1 WHERE id = ? AND to_email = ?", (msg_id, user_email))
+            else:
+                cursor.execute("UPDATE messages SET is_read = 1 WHERE id = ?", (msg_id,))
+            if cursor.rowcount:
+                change_feed.record(cursor, "message", msg_id, "update", {"is_read": True})
+        
+        run_write(write)
     
     @staticmethod
     def get_unread_count(user_email, user_role):
@@ -367,52 +689,78 @@ class Announcement:
     
     @staticmethod
     def create(title, content, priority, author_email, author_name):
-        conn = get_db()
-        cursor = conn.cursor()
         ann_id = str(uuid4())
-        cursor.execute("""
-            INSERT INTO announcements (id, title, content, priority, author_email, author_name)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (ann_id, title, content, priority, author_email, author_name))
-        conn.commit()
-        conn.close()
+        now = datetime.now()
+        def write(cursor):
+            cursor.execute("""
+                INSERT INTO announcements (id, title, content, priority, author_email, author_name, created_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (ann_id, title, content, priority, author_email, author_name, to_epoch(now)))
+            change_feed.record(cursor, "announcement", ann_id, "create", {
+                "title": title, "content": content, "priority": priority,
+                "author_email": author_email, "author_name": author_name,
+            })
+        
+        run_write(write)
         return ann_id
     
     @staticmethod
     def get_all():
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM announcements ORDER BY created_at DESC")
+        cursor.execute("SELECT * FROM announcements ORDER BY created_ts DESC")
         announcements = [dict(row) for row in cursor.fetchall()]
         conn.close()
         return announcements
     
     @staticmethod
-    def get_by_id(ann_id):
+    def get_latest(limit):
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM announcements WHERE id = ?", (ann_id,))
-        ann = cursor.fetchone()
+        cursor.execute("SELECT * FROM announcements ORDER BY created_ts DESC LIMIT ?", (limit,))
+        announcements = [dict(row) for row in cursor.fetchall()]
         conn.close()
-        return dict(ann) if ann else None
+        return announcements
     
     @staticmethod
-    def update(ann_id, title, content, priority):
+    def count():
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE announcements
-            SET title = ?, content = ?, priority = ?, updated_at = ?
-            WHERE id = ?
-        """, (title, content, priority, datetime.now(), ann_id))
-        conn.commit()
+        cursor.execute("SELECT COUNT(*) FROM announcements")
+        total = cursor.fetchone()[0]
         conn.close()
+        return total
     
     @staticmethod
-    def delete(ann_id):
+    def get_by_id(ann_id):
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM announcements WHERE id = ?", (ann_id,))
-        conn.commit()
+        cursor.execute("SELECT * FROM announcements WHERE id = ?", (ann_id,))
+        ann = cursor.fetchone()
         conn.close()
+        return dict(ann) if ann else None
+    
+    @staticmethod
+    def update(ann_id, title, content, priority):
+        now = datetime.now()
+        def write(cursor):
+            cursor.execute("""
+                UPDATE announcements
+                SET title = ?, content = ?, priority = ?, updated_at = ?, updated_ts = ?
+                WHERE id = ?
+            """, (title, content, priority, now, to_epoch(now), ann_id))
+            if cursor.rowcount:
+                change_feed.record(cursor, "announcement", ann_id, "update",
+                                   {"title": title, "content": content, "priority": priority})
+        
+        run_write(write)
+    
+    @staticmethod
+    def delete(ann_id):
+        def write(cursor):
+            cursor.execute("DELETE FROM announcements WHERE id = ?", (ann_id,))
+            if cursor.rowcount:
+                change_feed.record(cursor, "announcement", ann_id, "delete")
+        
+        run_write(write)
 
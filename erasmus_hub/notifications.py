@@ -0,0 +1,330 @@
+import importlib
+import json
+import logging
+import smtplib
+import time
+from email.message import EmailMessage
+
+from database import get_db, run_write
+
+logger = logging.getLogger("erasmus_hub.notifications")
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_RATE_PER_SECOND = 5.0
+# Notifications for one recipient created within this window go out as one e-mail.
+DEFAULT_COALESCE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_SENDER = "erasmus-hub@localhost"
+MAX_BACKOFF_SECONDS = 3600
+# Rows a run has claimed are skipped by other runs; a run that died holding
+# a claim releases it after this long.
+CLAIM_SECONDS = 900
+
+_coalesce_seconds = DEFAULT_COALESCE_SECONDS
+
+SUBJECTS = {
+    "application_approved": "Prihláška bola schválená",
+    "application_rejected": "Prihláška bola zamietnutá",
+    "comment_added": "Nový komentár k prihláške",
+    "document_status": "Zmena stavu dokumentu",
+}
+KINDS = {
+    "application_approved": "Vaša prihláška na {university} bola schválená.",
+    "application_rejected": "Vaša prihláška na {university} bola zamietnutá. Dôvod: {reason}",
+    "comment_added": "{author_name} pridal(a) komentár k prihláške na {university}: „{comment_text}“",
+    "document_status": "Stav dokumentu „{document_label}“ v prihláške na {university} je teraz: {status}.",
+}
+
+
+def enqueue(cursor, application_id, kind, data=None, actor=None):
+    # Called with the cursor of the action itself, so a notification exists
+    # exactly when the change it describes was committed.
+    cursor.execute("SELECT student_email, university FROM application_details WHERE id = ?", (application_id,))
+    row = cursor.fetchone()
+    if row is None or row["student_email"] == actor:
+        return
+    now = int(time.time())
+    payload = {"university": row["university"], **(data or {})}
+    cursor.execute("""
+        INSERT INTO notification_outbox (recipient, kind, application_id, data, created_ts, available_ts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (row["student_email"], kind, application_id, json.dumps(payload, ensure_ascii=False), now,
+          now + _coalesce_seconds))
+
+
+def _coalesce(rows):
+    # A document that changed status several times only needs its last state.
+    latest = {}
+    for row in rows:
+        data = json.loads(row["data"] or "{}")
+        key = (row["kind"], data["document_id"]) if row["kind"] == "document_status" else row["id"]
+        latest.pop(key, None)
+        latest[key] = (row, data)
+    return list(latest.values())
+
+
+def build_message(recipient, rows, sender=DEFAULT_SENDER, base_url=None):
+    items = _coalesce(rows)
+    lines = []
+    for row, data in items:
+        lines.append("• " + KINDS[row["kind"]].format_map(_Missing(data)))
+        if base_url and row["application_id"]:
+            lines.append(f"  {base_url.rstrip('/')}/student/application/{row['application_id']}")
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = recipient
+    if len(items) == 1:
+        message["Subject"] = "Erasmus+ Hub: " + SUBJECTS[items[0][0]["kind"]]
+    else:
+        message["Subject"] = f"Erasmus+ Hub: {len(items)} nové upozornenia k vašim prihláškam"
+    message.set_content("Dobrý deň,\n\n" + "\n".join(lines) + "\n\nErasmus+ Hub\n")
+    return message
+
+
+class _Missing(dict):
+
+    def __missing__(self, key):
+        return ""
+
+
+class ConsoleBackend:
+
+    def __init__(self, **options):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, message):
+        logger.info("notification to %s: %s\n%s", message["To"], message["Subject"], message.get_content())
+
+
+class MemoryBackend:
+
+    outbox = []
+
+    def __init__(self, **options):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, message):
+        MemoryBackend.outbox.append(message)
+
+
+class SMTPBackend:
+
+    def __init__(self, host="localhost", port=25, username=None, password=None, use_tls=False, timeout=10,
+                 **options):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.connection = None
+
+    def open(self):
+        if self.connection is not None:
+            return
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self.connection = connection
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self.connection.quit()
+        except smtplib.SMTPException:
+            self.connection.close()
+        except OSError:
+            pass
+        self.connection = None
+
+    def send(self, message):
+        # One connection is reused for the whole batch; the server may still
+        # drop an idle one, so reconnect once before giving up.
+        self.open()
+        try:
+            self.connection.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            self.connection = None
+            self.open()
+            self.connection.send_message(message)
+
+
+BACKENDS = {"console": ConsoleBackend, "memory": MemoryBackend, "smtp": SMTPBackend}
+
+
+def get_backend(name, **options):
+    if name in BACKENDS:
+        return BACKENDS[name](**options)
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(**options)
+
+
+def _claim(cursor, now, limit, max_attempts):
+    available = "sent_ts IS NULL AND attempts < ? AND (claimed_ts IS NULL OR claimed_ts < ?)"
+    cursor.execute(f"""
+        SELECT recipient FROM notification_outbox
+        WHERE {available}
+        GROUP BY recipient
+        HAVING MIN(available_ts) <= ?
+        ORDER BY MIN(id)
+        LIMIT ?
+    """, (max_attempts, now - CLAIM_SECONDS, now, limit))
+    batches = []
+    for recipient in [row["recipient"] for row in cursor.fetchall()]:
+        cursor.execute(f"""
+            UPDATE notification_outbox SET claimed_ts = ?
+            WHERE recipient = ? AND {available}
+            RETURNING *
+        """, (now, recipient, max_attempts, now - CLAIM_SECONDS))
+        rows = sorted((dict(row) for row in cursor.fetchall()), key=lambda row: row["id"])
+        # Another run may have claimed them since the recipients were read.
+        if rows:
+            batches.append((recipient, rows))
+    return batches
+
+
+def _release(ids):
+    placeholders = ", ".join("?" for _ in ids)
+    run_write(lambda cursor: cursor.execute(
+        f"UPDATE notification_outbox SET claimed_ts = NULL WHERE id IN ({placeholders}) AND sent_ts IS NULL", ids
+    ))
+
+
+def _mark_failed(ids, error, attempts):
+    backoff = min(MAX_BACKOFF_SECONDS, 60 * 2 ** attempts)
+    placeholders = ", ".join("?" for _ in ids)
+    run_write(lambda cursor: cursor.execute(f"""
+        UPDATE notification_outbox
+        SET attempts = attempts + 1, last_error = ?, available_ts = ?, claimed_ts = NULL
+        WHERE id IN ({placeholders})
+    """, [str(error)[:500], int(time.time()) + backoff] + ids))
+
+
+def send_pending(backend, batch_size=DEFAULT_BATCH_SIZE, rate_per_second=DEFAULT_RATE_PER_SECOND,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, sender=DEFAULT_SENDER, base_url=None):
+    report = {"emails": 0, "notifications": 0, "failed": 0}
+    # The batch is claimed in one write transaction, so overlapping runs
+    # never pick up the same notifications.
+    batches = run_write(lambda cursor: _claim(cursor, int(time.time()), batch_size, max_attempts))
+    if not batches:
+        return report
+    unsent = {row["id"] for _, rows in batches for row in rows}
+
+    interval = 1 / rate_per_second if rate_per_second else 0
+    next_send = time.monotonic()
+    try:
+        backend.open()
+    except (smtplib.SMTPException, OSError) as e:
+        # Nothing was attempted, so the notifications keep their attempt count.
+        logger.warning("notification backend unavailable: %s", e)
+        _release(sorted(unsent))
+        return report
+    try:
+        for recipient, rows in batches:
+            ids = [row["id"] for row in rows]
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_send = max(next_send, time.monotonic()) + interval
+            unsent.difference_update(ids)
+            try:
+                backend.send(build_message(recipient, rows, sender=sender, base_url=base_url))
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused,
+                    smtplib.SMTPNotSupportedError) as e:
+                _mark_failed(ids, e, max(row["attempts"] for row in rows))
+                report["failed"] += 1
+                continue
+            except (smtplib.SMTPException, OSError) as e:
+                # The server itself is unavailable; the rest would fail the same way.
+                _mark_failed(ids, e, max(row["attempts"] for row in rows))
+                report["failed"] += 1
+                logger.warning("notification delivery stopped: %s", e)
+                break
+            sent_ts = int(time.time())
+            placeholders = ", ".join("?" for _ in ids)
+            run_write(lambda cursor: cursor.execute(
+                f"UPDATE notification_outbox SET sent_ts = ?, claimed_ts = NULL WHERE id IN ({placeholders})",
+                [sent_ts] + ids
+            ))
+            report["emails"] += 1
+            report["notifications"] += len(ids)
+    finally:
+        backend.close()
+        if unsent:
+            _release(sorted(unsent))
+    return report
+
+
+def stats():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT SUM(sent_ts IS NULL) AS pending, SUM(sent_ts IS NOT NULL) AS sent,
+               SUM(sent_ts IS NULL AND attempts > 0) AS retrying
+        FROM notification_outbox
+    """)
+    row = dict(cursor.fetchone())
+    conn.close()
+    return {key: value or 0 for key, value in row.items()}
+
+
+def prune(before_ts):
+    def write(cursor):
+        cursor.execute("DELETE FROM notification_outbox WHERE sent_ts < ?", (before_ts,))
+        return cursor.rowcount
+
+    return run_write(write)
+
+
+def backend_from_config(config):
+    return get_backend(
+        config["NOTIFY_BACKEND"],
+        host=config["SMTP_HOST"],
+        port=config["SMTP_PORT"],
+        username=config["SMTP_USERNAME"],
+        password=config["SMTP_PASSWORD"],
+        use_tls=config["SMTP_USE_TLS"],
+    )
+
+
+def send_from_config(config):
+    return send_pending(
+        backend_from_config(config),
+        batch_size=config["NOTIFY_BATCH_SIZE"],
+        rate_per_second=config["NOTIFY_RATE_PER_SECOND"],
+        max_attempts=config["NOTIFY_MAX_ATTEMPTS"],
+        sender=config["NOTIFY_SENDER"],
+        base_url=config["NOTIFY_BASE_URL"],
+    )
+
+
+def init_app(app):
+    global _coalesce_seconds
+    app.config.setdefault("NOTIFY_BACKEND", "console")
+    app.config.setdefault("NOTIFY_SENDER", DEFAULT_SENDER)
+    app.config.setdefault("NOTIFY_BASE_URL", None)
+    app.config.setdefault("NOTIFY_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    app.config.setdefault("NOTIFY_RATE_PER_SECOND", DEFAULT_RATE_PER_SECOND)
+    app.config.setdefault("NOTIFY_COALESCE_SECONDS", DEFAULT_COALESCE_SECONDS)
+    app.config.setdefault("NOTIFY_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)
+    app.config.setdefault("SMTP_HOST", "localhost")
+    app.config.setdefault("SMTP_PORT", 25)
+    app.config.setdefault("SMTP_USERNAME", None)
+    app.config.setdefault("SMTP_PASSWORD", None)
+    app.config.setdefault("SMTP_USE_TLS", False)
+    _coalesce_seconds = app.config["NOTIFY_COALESCE_SECONDS"]
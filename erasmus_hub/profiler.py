@@ -0,0 +1,202 @@
+import cProfile
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from uuid import uuid4
+
+from flask import g, request, session
+
+logger = logging.getLogger("erasmus_hub.profiler")
+
+DEFAULT_KEEP = 50
+DEFAULT_TOP_N = 30
+TRACEMALLOC_FRAMES = 1
+QUERY_FLAG = "_profile"
+HEADER = "X-Profile"
+
+_CAPTURE_ID_RE = re.compile(r"^\d+-[0-9a-f]{8}$")
+
+# tracemalloc is process-wide, so only one request is profiled at a time;
+# concurrent opt-ins are served normally and marked as skipped.
+_capture_lock = threading.Lock()
+_profile_dir = "profiles"
+_keep = DEFAULT_KEEP
+_top_n = DEFAULT_TOP_N
+
+
+def _requested():
+    if request.headers.get(HEADER) != "1" and request.args.get(QUERY_FLAG) != "1":
+        return False
+    return (session.get("user") or {}).get("role") == "admin"
+
+
+def _before_request():
+    if not _requested():
+        return
+    if not _capture_lock.acquire(blocking=False):
+        g.profile_skipped = True
+        return
+    g.profile_id = f"{int(time.time() * 1000)}-{uuid4().hex[:8]}"
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    g.profile = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profile.enable()
+
+
+def _after_request(response):
+    if g.get("profile_skipped"):
+        response.headers["X-Profile-Skipped"] = "busy"
+    elif g.get("profile") is not None:
+        g.profile_status = response.status_code
+        response.headers["X-Profile-Id"] = g.profile_id
+    return response
+
+
+def _teardown_request(error=None):
+    profile = g.pop("profile", None)
+    if profile is None:
+        return
+    try:
+        profile.disable()
+        duration = time.perf_counter() - g.profile_started
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        _save(g.profile_id, profile, snapshot, {
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": g.get("profile_status", 500),
+            "error": repr(error) if error is not None else None,
+            "user": (session.get("user") or {}).get("email"),
+            "duration_ms": round(duration * 1000, 1),
+            "memory_current": current,
+            "memory_peak": peak,
+        })
+    except Exception:
+        logger.exception("could not store profile %s", g.get("profile_id"))
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _capture_lock.release()
+
+
+def _top_functions(profile):
+    stats = pstats.Stats(profile)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    functions = []
+    for func in stats.fcn_list[:_top_n]:
+        primitive_calls, calls, own_time, cumulative_time, _ = stats.stats[func]
+        filename, line, name = func
+        functions.append({
+            "function": f"{os.path.basename(filename)}:{line}({name})" if line else name,
+            "calls": calls,
+            "primitive_calls": primitive_calls,
+            "own_ms": round(own_time * 1000, 2),
+            "cumulative_ms": round(cumulative_time * 1000, 2),
+        })
+    return functions
+
+
+def _top_allocations(snapshot):
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+    return [{
+        "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+        "size": stat.size,
+        "count": stat.count,
+    } for stat in snapshot.statistics("lineno")[:_top_n]]
+
+
+def _save(capture_id, profile, snapshot, meta):
+    os.makedirs(_profile_dir, exist_ok=True)
+    profile.dump_stats(os.path.join(_profile_dir, capture_id + ".prof"))
+    created_ts = int(capture_id.split("-")[0]) // 1000
+    meta.update(
+        id=capture_id,
+        created_ts=created_ts,
+        created_at=datetime.fromtimestamp(created_ts).strftime("%Y-%m-%d %H:%M:%S"),
+        functions=_top_functions(profile),
+        allocations=_top_allocations(snapshot),
+    )
+    # The .json file is written last and is what the listing looks for, so a
+    # capture only shows up once both files are complete.
+    tmp = os.path.join(_profile_dir, capture_id + ".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(_profile_dir, capture_id + ".json"))
+    prune()
+
+
+def _ids():
+    try:
+        names = os.listdir(_profile_dir)
+    except FileNotFoundError:
+        return []
+    # Ids start with a millisecond timestamp, so sorting by name sorts by age.
+    return sorted((name[:-5] for name in names if name.endswith(".json")), reverse=True)
+
+
+def prune(keep=None):
+    removed = 0
+    for capture_id in _ids()[keep or _keep:]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(_profile_dir, capture_id + suffix))
+            except FileNotFoundError:
+                pass
+        removed += 1
+    return removed
+
+
+def get(capture_id):
+    if not _CAPTURE_ID_RE.match(capture_id):
+        return None
+    try:
+        with open(os.path.join(_profile_dir, capture_id + ".json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_captures():
+    captures = []
+    for capture_id in _ids():
+        capture = get(capture_id)
+        if capture is not None:
+            capture.pop("functions", None)
+            capture.pop("allocations", None)
+            captures.append(capture)
+    return captures
+
+
+def prof_path(capture_id):
+    if not _CAPTURE_ID_RE.match(capture_id):
+        return None
+    path = os.path.join(_profile_dir, capture_id + ".prof")
+    return path if os.path.isfile(path) else None
+
+
+def init_app(app):
+    global _profile_dir, _keep, _top_n
+    app.config.setdefault("PROFILER_ENABLED", True)
+    app.config.setdefault("PROFILE_DIR", "profiles")
+    app.config.setdefault("PROFILE_KEEP", DEFAULT_KEEP)
+    app.config.setdefault("PROFILE_TOP_N", DEFAULT_TOP_N)
+    _profile_dir = os.path.abspath(app.config["PROFILE_DIR"])
+    _keep = app.config["PROFILE_KEEP"]
+    _top_n = app.config["PROFILE_TOP_N"]
+
+    if app.config["PROFILER_ENABLED"]:
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+        app.teardown_request(_teardown_request)
@@ -0,0 +1,137 @@
+import time
+
+from database import get_db, run_write
+
+DEFAULT_LEASE_SECONDS = 15 * 60
+STATS_WINDOW_SECONDS = 7 * 24 * 3600
+
+_lease_seconds = DEFAULT_LEASE_SECONDS
+
+
+def claim_next(reviewer_email, lease_seconds=None, skip=None):
+    now = int(time.time())
+    lease_seconds = lease_seconds or _lease_seconds
+
+    def write(cursor):
+        # "Next" means the reviewer is done with whatever they held.
+        cursor.execute("DELETE FROM review_claims WHERE reviewer_email = ?", (reviewer_email,))
+        # Picking the candidate and claiming it is one statement, so two admins
+        # asking at the same moment can never be handed the same application.
+        cursor.execute("""
+            INSERT INTO review_claims (application_id, reviewer_email, claimed_ts, lease_until_ts)
+            SELECT d.application_id, ?, ?, ?
+            FROM documents d
+            WHERE d.status = 'Odoslaný'
+              AND d.application_id != ?
+              AND EXISTS (SELECT 1 FROM applications a WHERE a.id = d.application_id AND a.status = 'Podaná')
+              AND NOT EXISTS (
+                  SELECT 1 FROM review_claims c
+                  WHERE c.application_id = d.application_id AND c.lease_until_ts > ?
+              )
+            ORDER BY d.uploaded_ts, d.id
+            LIMIT 1
+            ON CONFLICT(application_id) DO UPDATE SET
+                reviewer_email = excluded.reviewer_email,
+                claimed_ts = excluded.claimed_ts,
+                lease_until_ts = excluded.lease_until_ts
+            RETURNING application_id
+        """, (reviewer_email, now, now + lease_seconds, skip or "", now))
+        row = cursor.fetchone()
+        return row["application_id"] if row else None
+
+    return run_write(write)
+
+
+def renew(cursor, application_id, reviewer_email, lease_seconds=None):
+    cursor.execute("""
+        UPDATE review_claims SET lease_until_ts = ?
+        WHERE application_id = ? AND reviewer_email = ?
+    """, (int(time.time()) + (lease_seconds or _lease_seconds), application_id, reviewer_email))
+
+
+def release(reviewer_email, application_id=None):
+    def write(cursor):
+        if application_id is None:
+            cursor.execute("DELETE FROM review_claims WHERE reviewer_email = ?", (reviewer_email,))
+        else:
+            cursor.execute("""
+                DELETE FROM review_claims WHERE reviewer_email = ? AND application_id = ?
+            """, (reviewer_email, application_id))
+        return cursor.rowcount
+
+    return run_write(write)
+
+
+def record(cursor, reviewer_email, application_id, action, document_id=None, done=False):
+    # Called inside the transaction of the review action itself.
+    cursor.execute("""
+        SELECT claimed_ts FROM review_claims WHERE application_id = ? AND reviewer_email = ?
+    """, (application_id, reviewer_email))
+    claim = cursor.fetchone()
+    cursor.execute("""
+        INSERT INTO review_log (reviewer_email, application_id, document_id, action, claimed_ts, reviewed_ts)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (reviewer_email, application_id, document_id, action, claim["claimed_ts"] if claim else None,
+          int(time.time())))
+    if done:
+        cursor.execute("DELETE FROM review_claims WHERE application_id = ?", (application_id,))
+    elif claim:
+        renew(cursor, application_id, reviewer_email)
+
+
+def get_claim(application_id):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT c.*, u.name AS reviewer_name
+        FROM review_claims c
+        LEFT JOIN users u ON u.email = c.reviewer_email
+        WHERE c.application_id = ? AND c.lease_until_ts > ?
+    """, (application_id, int(time.time())))
+    claim = cursor.fetchone()
+    conn.close()
+    return dict(claim) if claim else None
+
+
+def pending_count():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(DISTINCT application_id) AS applications, COUNT(*) AS documents
+        FROM documents WHERE status = 'Odoslaný'
+    """)
+    counts = dict(cursor.fetchone())
+    cursor.execute("SELECT COUNT(*) FROM review_claims WHERE lease_until_ts > ?", (int(time.time()),))
+    counts["claimed"] = cursor.fetchone()[0]
+    conn.close()
+    return counts
+
+
+def reviewer_stats(window_seconds=STATS_WINDOW_SECONDS, now=None):
+    now = int(now if now is not None else time.time())
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT l.reviewer_email,
+               MAX(u.name) AS reviewer_name,
+               SUM(l.document_id IS NOT NULL) AS documents,
+               SUM(l.document_id IS NULL) AS decisions,
+               COUNT(DISTINCT l.application_id) AS applications,
+               SUM(l.reviewed_ts >= ?) AS last_day,
+               SUM(l.reviewed_ts >= ?) AS last_hour,
+               CAST(AVG(l.reviewed_ts - l.claimed_ts) AS INTEGER) AS avg_seconds
+        FROM review_log l
+        LEFT JOIN users u ON u.email = l.reviewer_email
+        WHERE l.reviewed_ts >= ?
+        GROUP BY l.reviewer_email
+        ORDER BY COUNT(*) DESC
+    """, (now - 24 * 3600, now - 3600, now - window_seconds))
+    stats = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return stats
+
+
+def init_app(app):
+    global _lease_seconds
+    app.config.setdefault("REVIEW_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)
+    _lease_seconds = app.config["REVIEW_LEASE_SECONDS"]
@@ -0,0 +1,126 @@
+import argparse
+import socketserver
+import threading
+from email import message_from_bytes, policy
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self.reply("220 erasmus-hub smtp sink")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                self.reply("250-erasmus-hub")
+                self.reply("250-8BITMIME")
+                self.reply("250 SMTPUTF8")
+            elif verb == "HELO":
+                self.reply("250 erasmus-hub")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].split()[0].strip("<>"), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command.split(":", 1)[1].split()[0].strip("<>")
+                if recipient in sink.refuse:
+                    self.reply("550 mailbox unavailable")
+                    continue
+                recipients.append(recipient)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                with sink.lock:
+                    sink.messages.append({
+                        "sender": sender,
+                        "recipients": recipients,
+                        "message": message_from_bytes(b"".join(data), policy=policy.default),
+                    })
+                self.reply("250 OK")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SMTPSink:
+    # A minimal SMTP server that keeps every message in memory, so the SMTP
+    # backend can be exercised without a real mail server.
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.messages = []
+        self.connections = 0
+        self.refuse = set()
+        self.lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.sink = self
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink that prints received messages.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+    sink = SMTPSink(args.host, args.port)
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    printed = 0
+    try:
+        sink.start()
+        while sink.thread.is_alive():
+            sink.thread.join(1)
+            with sink.lock:
+                received = sink.messages[printed:]
+                printed = len(sink.messages)
+            for item in received:
+                message = item["message"]
+                print(f"--- {', '.join(item['recipients'])}: {message['Subject']}")
+                print(message.get_content())
+    except KeyboardInterrupt:
+        sink.stop()
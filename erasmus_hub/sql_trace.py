@@ -0,0 +1,162 @@
+import logging
+import re
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+import database
+
+logger = logging.getLogger("erasmus_hub.sql")
+slow_logger = logging.getLogger("erasmus_hub.sql.slow")
+
+DEFAULT_SLOW_QUERY_MS = 100
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_endpoint_stats = {}
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize(sql):
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(?+)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+class QueryLog:
+
+    def __init__(self):
+        self.queries = []
+
+    def add(self, trace):
+        self.queries.append(trace)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(trace["duration"] for trace in self.queries) * 1000
+
+    def repeated(self, threshold=2):
+        counts = {}
+        for trace in self.queries:
+            key = normalize(trace["sql"])
+            counts[key] = counts.get(key, 0) + 1
+        return {sql: count for sql, count in counts.items() if count >= threshold}
+
+    def slow(self, threshold_ms):
+        return [trace for trace in self.queries if trace["duration"] * 1000 >= threshold_ms]
+
+
+def _listener(trace):
+    for log in getattr(_local, "captures", ()):
+        log.add(trace)
+    if has_request_context():
+        log = g.get("sql_queries")
+        if log is not None:
+            log.add(trace)
+
+
+@contextmanager
+def capture():
+    log = QueryLog()
+    captures = getattr(_local, "captures", None)
+    if captures is None:
+        captures = _local.captures = []
+    captures.append(log)
+    try:
+        yield log
+    finally:
+        captures.remove(log)
+
+
+@contextmanager
+def query_budget(max_queries):
+    with capture() as log:
+        yield log
+    if log.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{log.count} queries executed, budget is {max_queries}: " + "; ".join(log.repeated(1))
+        )
+
+
+def endpoint_stats():
+    with _stats_lock:
+        return {endpoint: dict(stats) for endpoint, stats in _endpoint_stats.items()}
+
+
+def reset_endpoint_stats():
+    with _stats_lock:
+        _endpoint_stats.clear()
+
+
+def _before_request():
+    g.sql_queries = QueryLog()
+
+
+def _after_request(response):
+    from flask import current_app
+
+    log = g.pop("sql_queries", None)
+    if log is None:
+        return response
+    config = current_app.config
+    endpoint = request.endpoint or request.path
+
+    n_plus_one = log.repeated(config["SQL_N_PLUS_ONE_THRESHOLD"])
+    for sql, count in n_plus_one.items():
+        logger.warning("possible N+1 in %s: %d x %s", endpoint, count, sql)
+    for trace in log.slow(config["SQL_SLOW_QUERY_MS"]):
+        slow_logger.warning("%.1f ms %s %s", trace["duration"] * 1000, endpoint, normalize(trace["sql"]))
+
+    with _stats_lock:
+        stats = _endpoint_stats.setdefault(endpoint, {
+            "requests": 0, "queries": 0, "max_queries": 0, "total_ms": 0.0, "n_plus_one": 0,
+        })
+        stats["requests"] += 1
+        stats["queries"] += log.count
+        stats["max_queries"] = max(stats["max_queries"], log.count)
+        stats["total_ms"] += log.total_ms
+        stats["n_plus_one"] += len(n_plus_one)
+
+    if config["SQL_TRACE_HEADERS"]:
+        response.headers["X-SQL-Queries"] = str(log.count)
+        response.headers["X-SQL-Time-Ms"] = f"{log.total_ms:.1f}"
+
+    budget = config["SQL_QUERY_BUDGETS"].get(endpoint)
+    if budget is not None and log.count > budget:
+        message = f"{endpoint} executed {log.count} queries, budget is {budget}"
+        if current_app.testing:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def init_app(app):
+    app.config.setdefault("SQL_SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS)
+    app.config.setdefault("SQL_SLOW_QUERY_LOG", None)
+    app.config.setdefault("SQL_N_PLUS_ONE_THRESHOLD", DEFAULT_N_PLUS_ONE_THRESHOLD)
+    app.config.setdefault("SQL_QUERY_BUDGETS", {})
+    app.config.setdefault("SQL_TRACE_HEADERS", False)
+
+    if app.config["SQL_SLOW_QUERY_LOG"]:
+        handler = logging.FileHandler(app.config["SQL_SLOW_QUERY_LOG"], encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_logger.addHandler(handler)
+
+    database.add_query_listener(_listener)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
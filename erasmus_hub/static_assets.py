@@ -0,0 +1,168 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import request, send_file
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BUILD_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+SKIP_DIRS = {"uploads", BUILD_DIR}
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+FAR_FUTURE_MAX_AGE = 365 * 24 * 3600
+
+DEFAULT_COMPRESS_MIN_SIZE = 1024
+DEFAULT_COMPRESS_LEVEL = 6
+DEFAULT_COMPRESS_BROTLI_QUALITY = 4
+DEFAULT_COMPRESS_MIMETYPES = ["text/html", "application/json"]
+
+_manifest = {}
+_fingerprinted = set()
+
+
+def fingerprint(relative_path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = os.path.splitext(relative_path)
+    return f"{BUILD_DIR}/{root}.{digest}{ext}"
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def build(static_folder):
+    manifest = {}
+    report = {"files": 0, "gzip": 0, "brotli": 0}
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            relative_path = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                content = f.read()
+            if not content:
+                continue
+            target = fingerprint(relative_path, content)
+            target_path = os.path.join(static_folder, target)
+            _write(target_path, content)
+            manifest[relative_path] = target
+            report["files"] += 1
+
+            if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS:
+                _write(target_path + ".gz", gzip.compress(content, compresslevel=9, mtime=0))
+                report["gzip"] += 1
+                if brotli is not None:
+                    _write(target_path + ".br", brotli.compress(content, quality=11))
+                    report["brotli"] += 1
+
+    _write(os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME),
+           json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return report
+
+
+def load_manifest(static_folder):
+    global _manifest, _fingerprinted
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME), encoding="utf-8") as f:
+            _manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        _manifest = {}
+    _fingerprinted = set(_manifest.values())
+    return _manifest
+
+
+def _accepted_encodings():
+    accepted = []
+    if brotli is not None and request.accept_encodings["br"]:
+        accepted.append("br")
+    if request.accept_encodings["gzip"]:
+        accepted.append("gzip")
+    return accepted
+
+
+def _static_url_defaults(endpoint, values):
+    if endpoint == "static" and values.get("filename") in _manifest:
+        values["filename"] = _manifest[values["filename"]]
+
+
+def _serve_precompressed():
+    if request.endpoint != "static":
+        return None
+    filename = (request.view_args or {}).get("filename")
+    if filename not in _fingerprinted:
+        return None
+    from flask import current_app
+
+    path = safe_join(current_app.static_folder, filename)
+    for encoding in _accepted_encodings():
+        compressed = f"{path}.{'br' if encoding == 'br' else 'gz'}"
+        if os.path.isfile(compressed):
+            response = send_file(
+                compressed,
+                mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                conditional=True,
+            )
+            response.headers["Content-Encoding"] = encoding
+            response.vary.add("Accept-Encoding")
+            return response
+    return None
+
+
+def _after_request(response):
+    from flask import current_app
+
+    if request.endpoint == "static":
+        if (request.view_args or {}).get("filename") in _fingerprinted:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = FAR_FUTURE_MAX_AGE
+            response.cache_control.immutable = True
+            response.vary.add("Accept-Encoding")
+        return response
+
+    config = current_app.config
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in config["COMPRESS_MIMETYPES"]
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < config["COMPRESS_MIN_SIZE"]:
+        return response
+
+    accepted = _accepted_encodings()
+    if "br" in accepted:
+        response.set_data(brotli.compress(data, quality=config["COMPRESS_BROTLI_QUALITY"]))
+        response.headers["Content-Encoding"] = "br"
+    elif "gzip" in accepted:
+        response.set_data(gzip.compress(data, compresslevel=config["COMPRESS_LEVEL"]))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def init_app(app):
+    app.config.setdefault("COMPRESS_MIN_SIZE", DEFAULT_COMPRESS_MIN_SIZE)
+    app.config.setdefault("COMPRESS_LEVEL", DEFAULT_COMPRESS_LEVEL)
+    app.config.setdefault("COMPRESS_BROTLI_QUALITY", DEFAULT_COMPRESS_BROTLI_QUALITY)
+    app.config.setdefault("COMPRESS_MIMETYPES", list(DEFAULT_COMPRESS_MIMETYPES))
+
+    load_manifest(app.static_folder)
+    app.url_defaults(_static_url_defaults)
+    app.before_request(_serve_precompressed)
+    app.after_request(_after_request)
@@ -0,0 +1,48 @@
+from database import get_db, run_write, rebuild_student_summary
+
+COLUMNS = [
+    "applications_total", "applications_pending", "applications_approved", "applications_rejected",
+    "documents_total", "documents_pending", "documents_approved", "documents_rejected", "documents_required",
+    "latest_application_id", "last_activity_ts",
+]
+
+
+def empty(student_email):
+    summary = {column: 0 for column in COLUMNS}
+    summary.update(student_email=student_email, latest_application_id=None, last_activity_ts=None)
+    return summary
+
+
+def get(student_email):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM student_summary WHERE student_email = ?", (student_email,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else empty(student_email)
+
+
+def check(fix=False):
+    # Recomputes every row inside a savepoint and compares it with the stored
+    # one; the recomputed rows are only kept with fix=True.
+    def write(cursor):
+        cursor.execute("SAVEPOINT summary_check")
+        cursor.execute("SELECT * FROM student_summary ORDER BY student_email")
+        stored = {row["student_email"]: dict(row) for row in cursor.fetchall()}
+        rebuild_student_summary(cursor)
+        cursor.execute("SELECT * FROM student_summary ORDER BY student_email")
+        expected = {row["student_email"]: dict(row) for row in cursor.fetchall()}
+        if not fix:
+            cursor.execute("ROLLBACK TO summary_check")
+        cursor.execute("RELEASE summary_check")
+        mismatches = []
+        for email in sorted(set(stored) | set(expected)):
+            # A student without applications may keep an all-zero row.
+            want = expected.get(email, empty(email))
+            have = stored.get(email, empty(email))
+            diff = {column: (have[column], want[column]) for column in COLUMNS if have[column] != want[column]}
+            if diff:
+                mismatches.append({"student_email": email, "diff": diff})
+        return {"students": len(expected), "mismatches": mismatches, "fixed": fix and bool(mismatches)}
+
+    return run_write(write)
@@ -0,0 +1,133 @@
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+
+THROTTLE_DATABASE = os.environ.get("ERASMUS_THROTTLE_DB", "erasmus_hub_throttle.db")
+# Each rule is (burst capacity, period in seconds): a full bucket allows
+# `capacity` attempts at once and refills at capacity / period per second.
+# A whole faculty or dormitory can share one address behind NAT, so the
+# per-address rules only stop spraying; guessing one password is limited
+# per account.
+DEFAULT_LIMITS = {
+    "login_ip": (200, 60),
+    "login_account": (10, 300),
+    "register_ip": (50, 600),
+}
+PRUNE_PROBABILITY = 0.01
+
+_local = threading.local()
+_initialized = set()
+
+
+def _connect(path):
+    # Keyed by pid too: a connection must not be reused in a forked worker.
+    conn = getattr(_local, "connections", {}).get((os.getpid(), path))
+    if conn is not None:
+        return conn
+    # Buckets live in their own file so that a burst of attempts never waits
+    # on the main database's write lock, and every worker sees the same state.
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    if path not in _initialized:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        _initialized.add(path)
+    # Losing the last few bucket updates on a power cut is harmless.
+    conn.execute("PRAGMA synchronous = OFF")
+    if not hasattr(_local, "connections"):
+        _local.connections = {}
+    _local.connections[(os.getpid(), path)] = conn
+    return conn
+
+
+def take(rule, key, limits=None, path=None, now=None):
+    capacity, period = (limits or DEFAULT_LIMITS)[rule]
+    rate = capacity / period
+    now = time.time() if now is None else now
+    bucket_key = f"{rule}:{key}"
+    conn = _connect(path or THROTTLE_DATABASE)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (bucket_key,)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        conn.execute("""
+            INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+        """, (bucket_key, tokens, now))
+        conn.execute("""
+            INSERT INTO counters (name, value) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1
+        """, (f"{rule}.{'allowed' if allowed else 'limited'}",))
+        if random.random() < PRUNE_PROBABILITY:
+            # A bucket idle for a whole period is full again, so dropping it
+            # changes nothing.
+            longest = max(period for _, period in (limits or DEFAULT_LIMITS).values())
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - longest,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    retry_after = 0 if allowed else math.ceil((1 - tokens) / rate)
+    return allowed, retry_after
+
+
+def counters(path=None):
+    conn = _connect(path or THROTTLE_DATABASE)
+    rows = conn.execute("SELECT name, value FROM counters ORDER BY name").fetchall()
+    return {name: value for name, value in rows}
+
+
+def reset(path=None):
+    conn = _connect(path or THROTTLE_DATABASE)
+    conn.execute("DELETE FROM buckets")
+    conn.execute("DELETE FROM counters")
+
+
+def parse_limit(value):
+    capacity, period = value.split("/")
+    return int(capacity), float(period)
+
+
+def limits_from_env(environ=os.environ):
+    limits = dict(DEFAULT_LIMITS)
+    for rule in DEFAULT_LIMITS:
+        value = environ.get(f"ERASMUS_THROTTLE_{rule.upper()}")
+        if value:
+            limits[rule] = parse_limit(value)
+    return limits
+
+
+def check(rules):
+    from flask import current_app
+
+    config = current_app.config
+    if not config["THROTTLE_ENABLED"]:
+        return 0
+    for rule, key in rules:
+        allowed, retry_after = take(rule, key, limits=config["THROTTLE_LIMITS"], path=config["THROTTLE_DATABASE"])
+        if not allowed:
+            return retry_after
+    return 0
+
+
+def init_app(app):
+    app.config.setdefault("THROTTLE_ENABLED", True)
+    app.config.setdefault("THROTTLE_LIMITS", dict(DEFAULT_LIMITS))
+    app.config.setdefault("THROTTLE_DATABASE", THROTTLE_DATABASE)
@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from heapq import nsmallest
+
+from database import get_db
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+DEFAULT_REFRESH_SECONDS = 30
+# A short prefix such as "u" matches most entries, so ranked results are
+# cached per prefix until the index changes.
+MAX_CACHED_QUERIES = 1024
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def fold(value):
+    decomposed = unicodedata.normalize("NFKD", value or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(_SEPARATORS.sub(" ", stripped.casefold()).split())
+
+
+class UniversityIndex:
+
+    def __init__(self, partners=(), refresh_seconds=DEFAULT_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        # Sorted (token suffix, name key) pairs: every word start of a name is
+        # a prefix entry, so "wien" finds both "TU Wien" and "Universität Wien".
+        self.entries = []
+        self.names = {}
+        self.cache = {}
+        self.last_rowid = 0
+        self.refreshed_at = 0
+        for name in partners:
+            self._add(name, partner=True)
+
+    def _add(self, name, count=0, partner=False):
+        name = " ".join((name or "").split())
+        key = fold(name)
+        if not key:
+            return
+        self.cache.clear()
+        entry = self.names.get(key)
+        if entry is None:
+            entry = self.names[key] = {"key": key, "name": name, "count": 0, "partner": partner, "spellings": {}}
+            words = key.split(" ")
+            for i in range(len(words)):
+                insort(self.entries, (" ".join(words[i:]), key))
+        entry["count"] += count
+        entry["spellings"][name] = entry["spellings"].get(name, 0) + count
+        if partner:
+            entry["partner"] = True
+            entry["name"] = name
+        elif not entry["partner"]:
+            # The most common spelling becomes the displayed one.
+            entry["name"] = max(entry["spellings"].items(), key=lambda item: item[1])[0]
+
+    def add(self, name):
+        # Makes a new name suggestible right away; its count is picked up by
+        # the next refresh together with applications from other workers.
+        with self.lock:
+            self._add(name)
+
+    def refresh(self, full=False):
+        with self.lock:
+            now = time.time()
+            if not full and now - self.refreshed_at < self.refresh_seconds:
+                return
+            conn = get_db()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT u.name AS university, t.count, t.last_rowid
+                    FROM (
+                        SELECT university_id, COUNT(*) AS count, MAX(rowid) AS last_rowid
+                        FROM applications WHERE rowid > ?
+                        GROUP BY university_id
+                    ) t
+                    JOIN universities u ON u.id = t.university_id
+                """, (self.last_rowid,))
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            for row in rows:
+                self._add(row["university"], count=row["count"])
+                self.last_rowid = max(self.last_rowid, row["last_rowid"])
+            self.refreshed_at = now
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        prefix = fold(query)
+        if not prefix:
+            return []
+        with self.lock:
+            results = self.cache.get((prefix, limit))
+            if results is None:
+                # Every match is ranked: cutting the range short would keep
+                # the alphabetically first names, not the best ones.
+                start = bisect_left(self.entries, (prefix,))
+                end = bisect_left(self.entries, (prefix + "\U0010ffff",), start)
+                ranked = nsmallest(
+                    limit,
+                    (self.names[key] for key in {key for _, key in self.entries[start:end]}),
+                    key=lambda entry: (not entry["key"].startswith(prefix), not entry["partner"],
+                                       -entry["count"], entry["name"]),
+                )
+                results = [{"name": entry["name"], "count": entry["count"], "partner": entry["partner"]}
+                           for entry in ranked]
+                if len(self.cache) >= MAX_CACHED_QUERIES:
+                    self.cache.clear()
+                self.cache[(prefix, limit)] = results
+        return [dict(result) for result in results]
+
+    def canonical(self, name):
+        entry = self.names.get(fold(name))
+        return entry["name"] if entry else " ".join((name or "").split())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(partners=(), refresh_seconds=DEFAULT_REFRESH_SECONDS):
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = UniversityIndex(partners, refresh_seconds=refresh_seconds)
+    _index.refresh()
+    return _index
+
+
+def load_partners(path):
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
@@ -0,0 +1,114 @@
+import hashlib
+import os
+
+from werkzeug.utils import safe_join
+
+DEFAULT_MIGRATION_BATCH_SIZE = 500
+
+
+def shard_path(filename):
+    digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+    return os.path.join(digest[:2], digest[2:4], filename)
+
+
+def _candidates(upload_folder, filename):
+    sharded = safe_join(upload_folder, shard_path(filename))
+    flat = safe_join(upload_folder, filename)
+    # Checking the sharded path again after the flat one closes the window in
+    # which migrate_flat_files moves the file between the two lookups.
+    return [path for path in (sharded, flat, sharded) if path]
+
+
+def save(file_storage, upload_folder, filename):
+    path = os.path.join(upload_folder, shard_path(filename))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file_storage.save(path)
+    return path
+
+
+def resolve(upload_folder, filename):
+    for path in _candidates(upload_folder, filename):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def open_upload(upload_folder, filename):
+    for path in _candidates(upload_folder, filename):
+        try:
+            return open(path, "rb")
+        except (FileNotFoundError, IsADirectoryError):
+            continue
+    return None
+
+
+def remove(upload_folder, filename):
+    for path in _candidates(upload_folder, filename):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            continue
+    return False
+
+
+def iter_files(upload_folder):
+    for root, dirs, files in os.walk(upload_folder):
+        dirs.sort()
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), upload_folder)
+
+
+def iter_files_after(upload_folder, after=None, _prefix=""):
+    # Yields the same relative paths as sorted(iter_files(...)), starting
+    # after `after`, while only ever holding one directory listing: a
+    # directory sorts as "name/", which is where its files fall among the
+    # full paths, and directories entirely at or before `after` are skipped.
+    try:
+        with os.scandir(os.path.join(upload_folder, _prefix)) as entries:
+            listing = sorted((entry.name + os.sep if entry.is_dir() else entry.name) for entry in entries)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for name in listing:
+        path = _prefix + name
+        if name.endswith(os.sep):
+            if after is None or path > after or after.startswith(path):
+                yield from iter_files_after(upload_folder, after, path)
+        elif after is None or path > after:
+            yield path
+
+
+def migrate_flat_files(upload_folder, batch_size=DEFAULT_MIGRATION_BATCH_SIZE, max_batches=None):
+    report = {"batches": 0, "files_moved": 0, "bytes_moved": 0, "finished": False}
+    if not os.path.isdir(upload_folder):
+        report["finished"] = True
+        return report
+
+    while max_batches is None or report["batches"] < max_batches:
+        batch = []
+        with os.scandir(upload_folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    batch.append(entry.name)
+                    if len(batch) >= batch_size:
+                        break
+        if not batch:
+            report["finished"] = True
+            break
+
+        for name in batch:
+            source = os.path.join(upload_folder, name)
+            target = os.path.join(upload_folder, shard_path(name))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                size = os.path.getsize(source)
+                # os.replace is atomic within one filesystem, so a concurrent
+                # download always sees the file at one of its two locations.
+                os.replace(source, target)
+            except FileNotFoundError:
+                continue
+            report["files_moved"] += 1
+            report["bytes_moved"] += size
+        report["batches"] += 1
+
+    return report
@@ -0,0 +1,129 @@
+import os
+import time
+from datetime import datetime
+from itertools import islice
+
+from database import get_db
+import upload_store
+import archive
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_GRACE_SECONDS = 3600
+
+
+def _load_state(cursor):
+    cursor.execute("SELECT * FROM upload_gc_state WHERE id = 1")
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+def _referenced(cursor, names, archived=False):
+    placeholders = ", ".join("?" for _ in names)
+    cursor.execute(f"SELECT filename FROM main.documents WHERE filename IN ({placeholders})", names)
+    referenced = {row["filename"] for row in cursor.fetchall()}
+    if archived:
+        # Archived applications keep their files in the same upload folder.
+        cursor.execute(f"SELECT filename FROM archive.documents WHERE filename IN ({placeholders})", names)
+        referenced.update(row["filename"] for row in cursor.fetchall())
+    return referenced
+
+
+def collect_garbage(upload_folder, batch_size=DEFAULT_BATCH_SIZE, grace_seconds=DEFAULT_GRACE_SECONDS,
+                    dry_run=False, max_batches=None, restart=False):
+    conn = get_db()
+    archived = archive.attach_if_exists(conn)
+    cursor = conn.cursor()
+
+    state = None if dry_run else _load_state(cursor)
+    if restart or not state or state["cursor"] is None:
+        state = {"cursor": None}
+        if not dry_run:
+            cursor.execute("""
+                INSERT OR REPLACE INTO upload_gc_state (
+                    id, cursor, started_at, finished_at, files_scanned, files_deleted, bytes_reclaimed
+                ) VALUES (1, '', ?, NULL, 0, 0, 0)
+            """, (datetime.now(),))
+            conn.commit()
+
+    names = upload_store.iter_files_after(upload_folder, state["cursor"] or None)
+
+    report = {
+        "dry_run": dry_run,
+        "batches": 0,
+        "files_scanned": 0,
+        "files_deleted": 0,
+        "bytes_reclaimed": 0,
+        "skipped_recent": 0,
+        "orphans": [],
+        "finished": False,
+    }
+    cutoff = time.time() - grace_seconds
+
+    try:
+        while True:
+            batch = list(islice(names, batch_size))
+            if not batch:
+                report["finished"] = True
+                if not dry_run:
+                    cursor.execute("""
+                        UPDATE upload_gc_state SET cursor = NULL, finished_at = ? WHERE id = 1
+                    """, (datetime.now(),))
+                    conn.commit()
+                break
+            if max_batches is not None and report["batches"] >= max_batches:
+                break
+            referenced = _referenced(cursor, [os.path.basename(name) for name in batch], archived)
+            batch_deleted = 0
+            batch_bytes = 0
+
+            for name in batch:
+                if os.path.basename(name) in referenced:
+                    continue
+                path = os.path.join(upload_folder, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > cutoff:
+                    report["skipped_recent"] += 1
+                    continue
+                report["orphans"].append({"filename": name, "size": stat.st_size})
+                if dry_run:
+                    report["bytes_reclaimed"] += stat.st_size
+                    continue
+                # The grace period covers uploads saved before their row is committed,
+                # but re-check right before unlinking in case the file was attached meanwhile.
+                if _referenced(cursor, [os.path.basename(name)], archived):
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                batch_deleted += 1
+                batch_bytes += stat.st_size
+
+            report["batches"] += 1
+            report["files_scanned"] += len(batch)
+            report["files_deleted"] += batch_deleted
+            report["bytes_reclaimed"] += batch_bytes
+            if not dry_run:
+                cursor.execute("""
+                    UPDATE upload_gc_state
+                    SET cursor = ?,
+                        files_scanned = files_scanned + ?,
+                        files_deleted = files_deleted + ?,
+                        bytes_reclaimed = bytes_reclaimed + ?
+                    WHERE id = 1
+                """, (batch[-1], len(batch), batch_deleted, batch_bytes))
+                conn.commit()
+    finally:
+        conn.close()
+
+    return report
+
+
+def get_state():
+    conn = get_db()
+    state = _load_state(conn.cursor())
+    conn.close()
+    return state
@@ -0,0 +1,58 @@
+import os
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+from database import get_db
+
+HOT_TABLES = [
+    "users", "applications", "documents", "application_comments", "announcements",
+    "universities", "mobility_types", "document_types",
+]
+
+
+def init_bytecode_cache(app, directory):
+    os.makedirs(directory, exist_ok=True)
+    # Must run before app.jinja_env is first touched, the environment is created lazily.
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(directory)}
+
+
+def compile_templates(app):
+    names = [name for name in app.jinja_env.list_templates() if name.endswith(".html")]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
+
+
+def touch_tables():
+    # Each request opens its own connection, so SQLite's per-connection page
+    # cache cannot be shared; reading the tables and indexes once pulls the
+    # database file into the OS page cache that all connections use.
+    conn = get_db()
+    cursor = conn.cursor()
+    touched = []
+    for table in HOT_TABLES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table} NOT INDEXED")
+        cursor.fetchone()
+        touched.append(table)
+    cursor.execute("""
+        SELECT name, tbl_name FROM sqlite_master
+        WHERE type = 'index' AND tbl_name IN ({})
+    """.format(", ".join("?" for _ in HOT_TABLES)), HOT_TABLES)
+    for index in cursor.fetchall():
+        cursor.execute(f'SELECT COUNT(*) FROM {index["tbl_name"]} INDEXED BY "{index["name"]}"')
+        cursor.fetchone()
+        touched.append(index["name"])
+    conn.close()
+    return touched
+
+
+def warm_up(app):
+    started = time.perf_counter()
+    templates = compile_templates(app)
+    touched = touch_tables()
+    return {
+        "templates": len(templates),
+        "tables_and_indexes": len(touched),
+        "seconds": time.perf_counter() - started,
+    }